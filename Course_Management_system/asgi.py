@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Course_Management_system.settings')
 
 application = get_asgi_application()
+
+from apps.api.sse import CancelOnDisconnect  # noqa: E402 (needs the apps loaded above)
+
+application = CancelOnDisconnect(application)
@@ -54,10 +54,16 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Adds ETags so API clients can revalidate with If-None-Match (see course_client)
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Before anything that may query the database (see apps/Course/degraded.py)
+    'apps.Course.middleware.DegradedModeMiddleware',
+    'apps.Course.middleware.AdmissionControlMiddleware',
+    'apps.Course.middleware.ReadReplicaMiddleware',
     'apps.Course.middleware.UserRequestLogMiddleware',
 ]
 
@@ -117,16 +123,212 @@ DATABASES = {
     }
 }
 
+# SQLite production profile (see apps/Course/sqlite_profile.py): SQLITE_PROFILE=production
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'default')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+}
+
+# Read replicas: comma-separated hosts (or file names for SQLite), e.g. DB_REPLICAS=db-replica-1,db-replica-2.
+# Each becomes an alias 'replica1', 'replica2', ... with the primary's other settings.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = BASE_DIR / replica.strip()
+    else:
+        DATABASES[alias]['HOST'] = replica.strip()
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['apps.Course.db_router.ReplicaRouter']
+
+# Which views may read from a replica, and how long a user's reads stay on the primary after they write
+READ_REPLICA = {
+    'VIEW_MODULES': ['apps.Course.views', 'apps.api.'],
+    'STICKY_SECONDS': int(os.getenv('DB_REPLICA_STICKY_SECONDS', '5')),
+    # An unreachable replica is not tried again for this long
+    'RETRY_SECONDS': int(os.getenv('DB_REPLICA_RETRY_SECONDS', '30')),
+}
+
+# Redis behind a circuit breaker with a local fallback (see apps/Course/resilient_cache.py)
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "apps.Course.resilient_cache.ResilientCache",
         "LOCATION": f"redis://{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_PORT', '6379')}/{os.getenv('REDIS_DB', '1')}",
         "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "PRIMARY_BACKEND": "django_redis.cache.RedisCache",
+            "PRIMARY_OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "SOCKET_CONNECT_TIMEOUT": float(os.getenv('REDIS_CONNECT_TIMEOUT', '0.5')),
+                "SOCKET_TIMEOUT": float(os.getenv('REDIS_SOCKET_TIMEOUT', '0.5')),
+            },
+            "FAILURE_THRESHOLD": int(os.getenv('CACHE_FAILURE_THRESHOLD', '3')),
+            "RESET_TIMEOUT": int(os.getenv('CACHE_RESET_TIMEOUT', '10')),
+            "STALE_TIMEOUT": int(os.getenv('CACHE_STALE_TIMEOUT', '600')),
+            # Only these keep a local copy to serve during an outage: aggregates, reference tables, objects, query results
+            "STALE_KEY_PREFIXES": ("stats:", "ref:", "obj:", "qc:"),
+            "LOCAL_MAX_ENTRIES": 5000,
         }
     }
 }
 
+# Pub/sub channel feeding SSE notifications ('redis', or 'local' for a single process)
+PUBSUB = {
+    'BACKEND': os.getenv('PUBSUB_BACKEND', 'redis'),
+    'LOCATION': f"redis://{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_PORT', '6379')}/{os.getenv('REDIS_DB', '1')}",
+    'PREFIX': 'cms:',
+    # Publishing runs on the request path: short timeouts, and a circuit breaker while Redis is down
+    'PUBLISH_TIMEOUT': float(os.getenv('PUBSUB_PUBLISH_TIMEOUT', '0.5')),
+    'FAILURE_THRESHOLD': int(os.getenv('PUBSUB_FAILURE_THRESHOLD', '3')),
+    'RESET_TIMEOUT': int(os.getenv('PUBSUB_RESET_TIMEOUT', '10')),
+}
+
+# Server-Sent Events (apps/api/sse.py): per-process cap on open streams, which skip admission control.
+# Under WSGI every stream holds a worker thread, so keep MAX_SYNC_STREAMS well below the thread count.
+SSE = {
+    'MAX_STREAMS': int(os.getenv('SSE_MAX_STREAMS', '500')),
+    'MAX_SYNC_STREAMS': int(os.getenv('SSE_MAX_SYNC_STREAMS', '16')),
+    'HEARTBEAT_INTERVAL': 15,
+    'RETRY_AFTER': 30,
+}
+
+# Request coalescing for identical concurrent API reads (see apps/api/singleflight.py)
+SINGLE_FLIGHT = {
+    'LOCK_TIMEOUT': 10,
+    'RESULT_TIMEOUT': 1,
+    'WAIT_TIMEOUT': 5,
+    'POLL_INTERVAL': 0.05,
+}
+
+# Per-process concurrency budgets used by AdmissionControlMiddleware.
+# MAX_IN_FLIGHT should match the number of worker threads of one process.
+# A class is shed once the total in flight reaches its 'shed_above' share.
+ADMISSION_CONTROL = {
+    'ENABLED': os.getenv('ADMISSION_CONTROL_ENABLED', 'True') == 'True',
+    'MAX_IN_FLIGHT': int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '64')),
+    'RETRY_AFTER': 5,
+    'CLASSES': {
+        'admin': {'limit': 32, 'shed_above': 1.0, 'queue_timeout': 5.0},
+        'api_auth': {'limit': 24, 'shed_above': 0.9, 'queue_timeout': 1.0},
+        'search': {'limit': 8, 'shed_above': 0.75, 'queue_timeout': 0.5},
+        'api_anon': {'limit': 16, 'shed_above': 0.6, 'queue_timeout': 0},
+    },
+}
+
+# Per-view database time budgets in seconds (see apps/Course/query_budget.py)
+QUERY_BUDGET = {
+    'ENABLED': os.getenv('QUERY_BUDGET_ENABLED', 'True') == 'True',
+    'DEFAULT': None,
+    'VIEWS': {
+        'dashboard': float(os.getenv('QUERY_BUDGET_DASHBOARD', '5')),
+        'global_search': float(os.getenv('QUERY_BUDGET_SEARCH', '2')),
+    },
+    'FALLBACK_TIMEOUT': 3600,
+    'RETRY_AFTER': 5,
+}
+
+# Read-through per-object cache (apps/Course/object_cache.py); bump VERSION to drop every entry.
+OBJECT_CACHE = {
+    'TIMEOUT': int(os.getenv('OBJECT_CACHE_TIMEOUT', '300')),
+    'VERSION': 1,
+}
+
+# Two-tier cache for reference tables (apps/Course/reference_cache.py): a per-process LRU
+# in front of CACHES['default'], invalidated across workers over PUBSUB.
+REFERENCE_CACHE = {
+    'TIMEOUT': int(os.getenv('REFERENCE_CACHE_TIMEOUT', '3600')),
+    'LOCAL_TIMEOUT': int(os.getenv('REFERENCE_CACHE_LOCAL_TIMEOUT', '60')),
+    'LOCAL_MAX_ENTRIES': 256,
+    'VERSION': 1,
+}
+
+# Transactional outbox of model changes and its consumers (see apps/Course/outbox.py)
+OUTBOX = {
+    'CONSUMERS': [
+        'apps.Course.outbox.ObjectCacheConsumer',
+    ],
+    'BATCH_SIZE': int(os.getenv('OUTBOX_BATCH_SIZE', '200')),
+    'GAP_TIMEOUT': 60,
+    # Skipped ids are looked up again for this long (longer than any transaction), at most MAX_GAPS of them
+    'GAP_MAX_AGE': int(os.getenv('OUTBOX_GAP_MAX_AGE', '3600')),
+    'MAX_GAPS': 500,
+    'RETENTION_DAYS': int(os.getenv('OUTBOX_RETENTION_DAYS', '7')),
+}
+
+# Expensive aggregates (apps/Course/compute_cache.py): recomputed by one worker
+# at a time, served up to STALE_TTL seconds past their TTL meanwhile.
+COMPUTE_CACHE = {
+    'TTL': 60,
+    'STALE_TTL': int(os.getenv('COMPUTE_CACHE_STALE_TTL', '600')),
+    'BETA': 1.0,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 5,
+    'POLL_INTERVAL': 0.05,
+}
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', '60'))
+
+# Query-result cache (apps/Course/query_cache.py): every queryset of these
+# models is cached by its SQL and invalidated by writes to the tables it reads.
+QUERY_CACHE = {
+    'ENABLED': os.getenv('QUERY_CACHE_ENABLED', 'True') == 'True',
+    'MODELS': [
+        'Course.AcademicLevel',
+        'Course.Stream',
+        'Course.Subject',
+        'Course.PaymentMethod',
+    ],
+    'TIMEOUT': int(os.getenv('QUERY_CACHE_TIMEOUT', '300')),
+    # Larger results are not cached
+    'MAX_ROWS': 1000,
+    'VERSION': 1,
+}
+
+# Serialized API representations of videos and live classes, per row and
+# updated_at (apps/api/fragments.py)
+FRAGMENT_CACHE = {
+    'TIMEOUT': int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '3600')),
+    'VERSION': 1,
+}
+
+# Degraded mode while the database is unavailable (apps/Course/degraded.py):
+# last good copies of read-only pages are served stale, writes refused.
+DEGRADED_MODE = {
+    'ENABLED': os.getenv('DEGRADED_MODE_ENABLED', 'True') == 'True',
+    'NAMESPACES': ['dashboard', 'course', 'api'],
+    'FAILURE_THRESHOLD': 3,
+    'RESET_TIMEOUT': int(os.getenv('DEGRADED_MODE_RESET_TIMEOUT', '10')),
+    # How long a copy can be served, and how often it is refreshed
+    'STALE_TIMEOUT': int(os.getenv('DEGRADED_MODE_STALE_TIMEOUT', '86400')),
+    'REFRESH_INTERVAL': 60,
+    'MAX_BYTES': 1024 * 1024,
+}
+
+# Deploy-time cache warm-up (apps/Course/warmup.py, manage.py warm_caches)
+WARMUP = {
+    'WORKERS': int(os.getenv('WARMUP_WORKERS', '4')),
+    # Newest rows per model loaded into the per-object cache
+    'OBJECT_LIMIT': int(os.getenv('WARMUP_OBJECT_LIMIT', '1000')),
+}
+
+# Chunked background deletion of large cascades (see apps/Course/deletion.py)
+DELETION = {
+    'IN_BACKGROUND': os.getenv('DELETION_IN_BACKGROUND', 'True') == 'True',
+    'BATCH_SIZE': int(os.getenv('DELETION_BATCH_SIZE', '500')),
+    'PAUSE': 0.05,
+    'STALLED_AFTER': 300,
+}
+
+# Hot/cold archival (see apps/Course/archive.py and `manage.py archive_history`)
+ARCHIVE = {
+    'LIVE_CLASS_AFTER_DAYS': int(os.getenv('ARCHIVE_LIVE_CLASS_AFTER_DAYS', '180')),
+    'PAYMENT_AFTER_DAYS': int(os.getenv('ARCHIVE_PAYMENT_AFTER_DAYS', '730')),
+    'BATCH_SIZE': int(os.getenv('ARCHIVE_BATCH_SIZE', '500')),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -1,5 +1,12 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import HttpResponseRedirect
+
+from . import archive, deletion, events, waitlist
+from .counters import CapacityExceeded
+from .deletion import PendingDeletion
+from .enrollment import EnrollmentOutcome, enroll, unenroll
+from .forms import UserAdminChangeForm
 
 from .models import (
     User,
@@ -8,25 +15,63 @@ from .models import (
     Subject,
     LiveClass,
     Course,
+    Enrollment,
     Video,
     PaymentMethod,
     PaymentVerification,
+    WaitlistEntry,
+    DeletionJob,
+    OutboxEvent,
+    OutboxCheckpoint,
+    ArchivedLiveClass,
+    ArchivedPaymentVerification,
 )
 
 
+class CapacityErrorMixin:
+    """Report a save refused by a full parent (counters.py) or one being deleted, instead of failing with a 500."""
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except (CapacityExceeded, PendingDeletion) as exc:
+            # The admin's transaction was rolled back.
+            self.message_user(request, f"{exc}. Nothing was saved.", messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+
+class EnrollmentInline(admin.TabularInline):
+    """Read-only: enrollments change through EnrollmentAdmin, which goes through the enrollment service."""
+
+    model = Enrollment
+    extra = 0
+    fields = ["user", "course", "status", "enrolled_at", "ended_at"]
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(CapacityErrorMixin, BaseUserAdmin):
+    form = UserAdminChangeForm
+    inlines = [EnrollmentInline]
     list_display = [
         "username",
         "email",
         "role",
         "academic_level",
-        "course",
         "enrolled",
         "is_active",
         "date_joined",
     ]
-    list_filter = ["role", "is_active", "academic_level", "course"]
+    list_filter = ["role", "is_active", "academic_level"]
     search_fields = ["username", "email", "first_name", "last_name"]
     fieldsets = BaseUserAdmin.fieldsets + (
         (
@@ -38,15 +83,25 @@ class UserAdmin(BaseUserAdmin):
                     "bio",
                     "profile_picture",
                     "academic_level",
-                    "course",
                 )
             },
         ),
     )
 
 
+class BackgroundDeleteMixin:
+    """Hide the object and delete its cascade in batches (see deletion.py)."""
+
+    def delete_model(self, request, obj):
+        deletion.schedule(obj, request.user)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            deletion.schedule(obj, request.user)
+
+
 @admin.register(AcademicLevel)
-class AcademicLevelAdmin(admin.ModelAdmin):
+class AcademicLevelAdmin(BackgroundDeleteMixin, admin.ModelAdmin):
     list_display = ["name", "order", "allowed_streams", "capacity", "capacity_remaining"]
     list_filter = ["allowed_streams"]
     search_fields = ["name"]
@@ -70,8 +125,34 @@ class SubjectAdmin(admin.ModelAdmin):
     filter_horizontal = ["streams"]
 
 
+class ArchiveReadThroughMixin:
+    """Open archived rows from their old change URL, read-only."""
+
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is None and from_field is None:
+            obj = archive.get_archived(self.model, object_id)
+        return obj
+
+    def has_change_permission(self, request, obj=None):
+        return not getattr(obj, "archived", False) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not getattr(obj, "archived", False) and super().has_delete_permission(request, obj)
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Browse an archive table; rows only get there through `manage.py archive_history`."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(LiveClass)
-class LiveClassAdmin(admin.ModelAdmin):
+class LiveClassAdmin(ArchiveReadThroughMixin, admin.ModelAdmin):
     list_display = [
         "title",
         "level",
@@ -87,12 +168,17 @@ class LiveClassAdmin(admin.ModelAdmin):
 
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
-    list_display = ["title", "start_time", "end_time", "created_at"]
+class CourseAdmin(BackgroundDeleteMixin, admin.ModelAdmin):
+    list_display = ["title", "start_time", "end_time", "capacity", "enrolled_count", "created_at"]
     list_filter = ["start_time"]
     search_fields = ["title", "description"]
     date_hierarchy = "start_time"
-    filter_horizontal = ["participants"]
+    inlines = [EnrollmentInline]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "capacity" in form.changed_data:
+            waitlist.offer_seats_on_commit(obj)
 
 
 @admin.register(Video)
@@ -142,7 +228,7 @@ class PaymentMethodAdmin(admin.ModelAdmin):
 
 
 @admin.register(PaymentVerification)
-class PaymentVerificationAdmin(admin.ModelAdmin):
+class PaymentVerificationAdmin(ArchiveReadThroughMixin, admin.ModelAdmin):
     list_display = [
         "user",
         "course",
@@ -175,12 +261,132 @@ class PaymentVerificationAdmin(admin.ModelAdmin):
     )
 
     def save_model(self, request, obj, form, change):
-        if change and obj.verified and not obj.verified_by:
+        newly_verified = change and obj.verified and not obj.verified_by
+        if newly_verified:
             obj.verified_by = request.user
             if not obj.verified_at:
                 from django.utils import timezone
 
                 obj.verified_at = timezone.now()
-            obj.user.course = obj.course
-            obj.user.save()
+            outcome = enroll(obj.user, obj.course)
+            if outcome in (EnrollmentOutcome.FULL, EnrollmentOutcome.UNAVAILABLE):
+                obj.verified, obj.verified_by, obj.verified_at = False, None, None
+                newly_verified = False
+                reason = "is full" if outcome == EnrollmentOutcome.FULL else "is being deleted"
+                self.message_user(request, f'"{obj.course}" {reason}. Payment remains unverified.', messages.ERROR)
         super().save_model(request, obj, form, change)
+        if newly_verified:
+            events.payment_verified(obj)
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ["user", "course", "ticket", "status", "created_at", "offered_at"]
+    list_filter = ["status", "course"]
+    search_fields = ["user__username", "course__title"]
+    readonly_fields = ["ticket", "created_at", "offered_at"]
+
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(CapacityErrorMixin, admin.ModelAdmin):
+    """
+    Adds and unenrollments go through the enrollment service (capacity,
+    waitlist, seat offers). Only an active enrollment can be changed, and
+    only by ending it; ended rows are history.
+    """
+
+    list_display = ["user", "course", "status", "enrolled_at", "ended_at"]
+    list_filter = ["status", "course"]
+    search_fields = ["user__username", "course__title"]
+    autocomplete_fields = ["user", "course"]
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ["user", "course"]
+        return ["user", "course", "status", "enrolled_at", "ended_at", "updated_at"]
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return []
+        return ["user", "course", "enrolled_at", "ended_at", "updated_at"]
+
+    def has_change_permission(self, request, obj=None):
+        active = obj is None or obj.status == Enrollment.Status.ACTIVE
+        return active and super().has_change_permission(request, obj)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            outcome = enroll(obj.user, obj.course)
+            if outcome == EnrollmentOutcome.FULL:
+                raise CapacityExceeded(Course, obj.course_id)
+            if outcome == EnrollmentOutcome.UNAVAILABLE:
+                raise PendingDeletion(Course, obj.course_id)
+            if outcome == EnrollmentOutcome.ALREADY_ENROLLED:
+                self.message_user(request, f"{obj.user} was already enrolled in \"{obj.course}\".", messages.WARNING)
+            obj.pk = Enrollment.objects.active().get(user=obj.user, course=obj.course).pk
+        elif "status" in form.changed_data:
+            unenroll(obj.user, obj.course, status=obj.status)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        waitlist.offer_seats_on_commit(obj.course)
+
+    def delete_queryset(self, request, queryset):
+        courses = {enrollment.course for enrollment in queryset.select_related("course")}
+        super().delete_queryset(request, queryset)
+        for course in courses:
+            waitlist.offer_seats_on_commit(course)
+
+
+@admin.register(ArchivedLiveClass)
+class ArchivedLiveClassAdmin(ArchiveAdmin):
+    list_display = ["id", "title", "course", "subject", "start_time", "archived_at"]
+    list_filter = ["subject", "start_time"]
+    search_fields = ["title"]
+    date_hierarchy = "start_time"
+
+
+@admin.register(ArchivedPaymentVerification)
+class ArchivedPaymentVerificationAdmin(ArchiveAdmin):
+    list_display = ["id", "user", "course", "amount", "created_at", "verified_at", "archived_at"]
+    list_filter = ["payment_method", "created_at"]
+    search_fields = ["user__username", "course__title", "transaction_id"]
+    date_hierarchy = "created_at"
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ["object_repr", "model", "status", "deleted", "total", "progress", "requested_by", "created_at", "finished_at"]
+    list_filter = ["status", "model"]
+    readonly_fields = [field.name for field in DeletionJob._meta.fields]
+    actions = ["retry"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected failed deletions")
+    def retry(self, request, queryset):
+        failed = list(queryset.filter(status=DeletionJob.Status.FAILED).values_list("pk", flat=True))
+        DeletionJob.objects.filter(pk__in=failed).update(status=DeletionJob.Status.PENDING, error="")
+        for pk in failed:
+            deletion.start(pk)
+        self.message_user(request, f"Restarted {len(failed)} deletion(s).", messages.SUCCESS)
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ["id", "model", "object_pk", "action", "fields", "created_at"]
+    list_filter = ["action", "model"]
+    search_fields = ["object_pk"]
+    readonly_fields = [field.name for field in OutboxEvent._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxCheckpoint)
+class OutboxCheckpointAdmin(admin.ModelAdmin):
+    list_display = ["name", "position", "updated_at"]
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CourseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.Course'
+
+    def ready(self):
+        from . import signals, sqlite_profile  # noqa: F401
+        from . import outbox, query_cache
+        from .object_cache import install_cached_foreign_keys
+
+        signals.connect()
+        install_cached_foreign_keys(self)
+        outbox.install(self)
+        query_cache.install(self)
@@ -0,0 +1,124 @@
+"""
+Hot/cold archival of LiveClass and PaymentVerification.
+
+Past live classes and old verified payments are moved, in batches, from the
+hot tables into ArchivedLiveClass / ArchivedPaymentVerification (same
+columns, same primary keys). Each batch copies and deletes its rows in one
+transaction, so `manage.py archive_history` can be stopped at any point and
+simply run again: whatever was not moved yet is still in the hot table.
+
+Deleting from the hot table runs the usual signals, so the denormalized
+counters (Subject/teacher live_class_count) count hot rows only.
+
+`get_archived()` reads an archived row back as an unsaved-looking instance of
+the hot model (`instance.archived` is True), so detail views and the admin
+can show it without knowing where it lives. Such instances are read-only.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.http import Http404
+from django.utils import timezone
+
+from . import object_cache
+from .models import ArchivedLiveClass, ArchivedPaymentVerification, LiveClass, PaymentVerification
+
+ARCHIVES = {
+    LiveClass: ArchivedLiveClass,
+    PaymentVerification: ArchivedPaymentVerification,
+}
+
+
+def horizon(model):
+    """Rows older than this many days are archived."""
+    key = 'LIVE_CLASS_AFTER_DAYS' if model is LiveClass else 'PAYMENT_AFTER_DAYS'
+    return settings.ARCHIVE[key]
+
+
+def cutoff_for(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(model, cutoff):
+    """Hot rows of `model` that are old enough to move to the archive."""
+    if model is LiveClass:
+        return LiveClass.objects.filter(end_time__lt=cutoff)
+    # Only settled payments: pending ones are still on the admin's queue.
+    return PaymentVerification.objects.filter(verified=True, created_at__lt=cutoff)
+
+
+def _copy(instance, to_model):
+    values = {}
+    for field in to_model._meta.concrete_fields:
+        if hasattr(instance, field.attname):
+            value = getattr(instance, field.attname)
+            values[field.attname] = value.name if isinstance(value, FieldFile) else value
+    return to_model(**values)
+
+
+def archive_batch(model, cutoff, batch_size):
+    """Move up to `batch_size` archivable rows; returns how many were moved."""
+    archive_model = ARCHIVES[model]
+    with transaction.atomic():
+        rows = list(archivable(model, cutoff).order_by('pk')[:batch_size])
+        if not rows:
+            return 0
+        pks = [row.pk for row in rows]
+        # A stale copy of the same row (e.g. restored by hand since) is replaced.
+        archive_model.objects.filter(pk__in=pks).delete()
+        archive_model.objects.bulk_create([_copy(row, archive_model) for row in rows])
+        model.objects.filter(pk__in=pks).delete()
+    return len(rows)
+
+
+def archive(model, days=None, batch_size=None, pause=0, max_batches=None, stdout=None):
+    """Archive everything older than the horizon, batch by batch; returns the number of rows moved."""
+    days = horizon(model) if days is None else days
+    batch_size = batch_size or settings.ARCHIVE['BATCH_SIZE']
+    cutoff = cutoff_for(days)
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(model, cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if stdout is not None:
+            stdout.write(f'  {model.__name__}: {moved} archived')
+        if pause:
+            # Let other writers in between batches.
+            time.sleep(pause)
+    return moved
+
+
+def get_archived(model, pk):
+    """The archived row with primary key `pk` as a read-only `model` instance, or None."""
+    archive_model = ARCHIVES.get(model)
+    if archive_model is None:
+        return None
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+    row = archive_model.objects.filter(pk=pk).first()
+    if row is None:
+        return None
+    instance = _copy(row, model)
+    instance._state.adding = False
+    instance.archived = True
+    return instance
+
+
+def get_or_404(model, pk, fresh=False):
+    """Like object_cache.get_or_404(model, pk), falling back to the archive."""
+    try:
+        return object_cache.get_or_404(model, pk, fresh=fresh)
+    except Http404:
+        instance = get_archived(model, pk)
+    if instance is None:
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+    return instance
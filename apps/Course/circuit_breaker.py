@@ -0,0 +1,71 @@
+"""
+Circuit breaker for calls to a dependency that can go away (Redis, the
+database).
+
+    breaker = CircuitBreaker('cache', failure_threshold=5, reset_timeout=30)
+    if breaker.allow():
+        try:
+            value = call_dependency()
+        except Exception:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+closed:    calls go through; `failure_threshold` failures in a row open it.
+open:      calls are refused for `reset_timeout` seconds, so callers fall back
+           at once instead of waiting on timeouts.
+half-open: after that, one caller is let through as a probe; its success
+           closes the breaker, its failure opens it for another period.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """May the caller use the dependency now?"""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """Returns True if this success closed an open breaker."""
+        if self.state == CLOSED and not self.failures:
+            return False
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state, self.failures, self.opened_at = CLOSED, 0, None
+        if recovered:
+            logger.warning(f'{self.name} recovered, circuit closed')
+        return recovered
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state, self.opened_at = OPEN, time.monotonic()
+                logger.error(f'{self.name} is failing, circuit open for {self.reset_timeout}s')
+
+    def status(self):
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0)
+        return {'name': self.name, 'state': self.state, 'failures': self.failures, 'retry_in': retry_in}
@@ -0,0 +1,111 @@
+"""
+Cache-or-compute for expensive aggregates, without stampedes.
+
+    @cached_computation('stats:revenue')
+    def revenue_stats():
+        return {...}            # heavy queries
+
+    revenue_stats()             # cached value, recomputed by one worker at a time
+
+When a plain cached value expires, every request that arrives before it is
+recomputed runs the same heavy queries. Here:
+
+- Entries carry their soft expiry and how long they took to compute. Each
+  read may refresh early, with a probability that rises as the expiry nears
+  and with the compute time ("XFetch"), so a busy key is usually recomputed
+  before it expires at all.
+- Only the worker that takes the per-key lock (cache.add) recomputes.
+  Everybody else keeps getting the current value, even past its soft expiry
+  (stale-while-revalidate): entries live STALE_TTL seconds longer in the
+  cache for that.
+- With nothing cached yet, the others wait for the lock holder's result for
+  up to WAIT_TIMEOUT seconds before computing it themselves.
+- If a recomputation fails, the previous value is served.
+
+Defaults come from settings.COMPUTE_CACHE.
+"""
+import logging
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _config(name, value=None):
+    return settings.COMPUTE_CACHE[name] if value is None else value
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def compute(key, func, ttl=None, stale_ttl=None):
+    """Run `func` and cache its result under `key` now, whatever is cached."""
+    ttl, stale_ttl = _config('TTL', ttl), _config('STALE_TTL', stale_ttl)
+    started = time.monotonic()
+    value = func()
+    duration = time.monotonic() - started
+    cache.set(key, {'value': value, 'expires': time.time() + ttl, 'duration': duration}, ttl + stale_ttl)
+    return value
+
+
+def expire(key, stale_ttl=None):
+    """Make the next read recompute `key` while the old value can still be served."""
+    entry = cache.get(key)
+    if entry is not None:
+        cache.set(key, {**entry, 'expires': 0}, _config('STALE_TTL', stale_ttl))
+
+
+def _wants_refresh(entry, beta):
+    # -log(u) for u in (0, 1] is exponentially distributed: mostly small, occasionally large.
+    return time.time() - entry['duration'] * beta * math.log(1 - random.random()) >= entry['expires']
+
+
+def cache_or_compute(key, func, ttl=None, stale_ttl=None, beta=None):
+    """Return the cached value of `key`, computing it with `func` when needed (see module docstring)."""
+    entry = cache.get(key)
+    if entry is not None and not _wants_refresh(entry, _config('BETA', beta)):
+        return entry['value']
+
+    lock = _lock_key(key)
+    if cache.add(lock, 1, _config('LOCK_TIMEOUT')):
+        try:
+            return compute(key, func, ttl, stale_ttl)
+        except Exception:
+            if entry is None:
+                raise
+            logger.exception(f'Recomputing {key} failed, serving the previous value')
+            return entry['value']
+        finally:
+            cache.delete(lock)
+
+    if entry is not None:
+        # Another worker is refreshing it.
+        return entry['value']
+    deadline = time.monotonic() + _config('WAIT_TIMEOUT')
+    while time.monotonic() < deadline:
+        time.sleep(_config('POLL_INTERVAL'))
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+    logger.warning(f'Gave up waiting for {key}, computing it here')
+    return compute(key, func, ttl, stale_ttl)
+
+
+def cached_computation(key, ttl=None, stale_ttl=None, beta=None):
+    """Decorate an argument-less function whose result is served through cache_or_compute()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            return cache_or_compute(key, func, ttl, stale_ttl, beta)
+
+        wrapper.key = key
+        wrapper.refresh = lambda: compute(key, func, ttl, stale_ttl)
+        wrapper.expire = lambda: expire(key, stale_ttl)
+        return wrapper
+    return decorator
@@ -0,0 +1,189 @@
+"""
+Denormalized counters kept on parent rows (Course.enrolled_count,
+Subject.video_count, AcademicLevel.student_count, teacher video counts, ...).
+
+A child model lists the foreign keys it is counted through in
+`counted_relations`; CountedRelationsMixin then adjusts the parent counters
+with F() updates in the same transaction as the child's save, and the
+post_delete handler in signals.py does the same when a child is deleted
+(cascades included). Writes that skip save() (queryset.update, bulk_create)
+are not tracked; `manage.py verify_counters --fix` recomputes and repairs
+any drift. Both evict the parent from the per-object cache.
+
+A model may also set `counted_filter` (e.g. {'status': 'active'}): only rows
+matching it count, so changing one of those fields moves the row in or out
+of its parents' counters.
+
+A relation may also name a capacity field on the parent. The increment is
+then a single guarded UPDATE (counter < capacity), so concurrent writers can
+never push the parent past its capacity; the loser gets CapacityExceeded and
+its save is rolled back.
+
+Parents use MaintainedFieldsMixin: a save() of an existing row never writes
+its counters (nor the other `maintained_fields`, e.g. the waitlist tickets
+on Course) back. A full save of an instance loaded before a concurrent F()
+update would otherwise rewind the counter and let the capacity guard admit
+more rows than the capacity allows.
+"""
+import functools
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from . import object_cache
+
+
+class CapacityExceeded(Exception):
+    def __init__(self, model, pk):
+        super().__init__(f'{model._meta.verbose_name} #{pk} is full')
+        self.model = model
+        self.pk = pk
+
+
+def adjust_counter(model, pk, field, delta, capacity_field=None):
+    """Apply `delta` to a counter; return False if a guarded increment found no free capacity."""
+    if pk is None or not delta:
+        return True
+    queryset = model._base_manager.filter(pk=pk)
+    if delta < 0:
+        # Never go below zero, even if the counter had already drifted.
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    elif capacity_field:
+        queryset = queryset.filter(
+            Q(**{f'{capacity_field}__isnull': True}) | Q(**{f'{field}__lte': F(capacity_field) - delta})
+        )
+    updated = queryset.update(**{field: F(field) + delta})
+    if updated:
+        object_cache.invalidate(model, pk)
+    return updated > 0 or delta < 0 or not capacity_field
+
+
+class CountedRelationsMixin:
+    """Keep parent counters in step with this row's foreign keys."""
+
+    # (foreign key name, counter field on the related model[, capacity field]) tuples
+    counted_relations = ()
+    # field -> value conditions a row must meet to be counted at all
+    counted_filter = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_counted_values()
+        return instance
+
+    def _counted_attnames(self):
+        attnames = [self._meta.get_field(relation[0]).attname for relation in self.counted_relations]
+        return attnames + [self._meta.get_field(name).attname for name in self.counted_filter]
+
+    def _is_counted(self, values):
+        return all(values.get(self._meta.get_field(name).attname) == value for name, value in self.counted_filter.items())
+
+    def snapshot_counted_values(self):
+        """Record the foreign key values currently stored in the database."""
+        self._counted_values = {
+            attname: self.__dict__[attname]
+            for attname in self._counted_attnames()
+            if attname in self.__dict__
+        }
+
+    def _counted_values_in_db(self):
+        if self._state.adding:
+            return {}
+        snapshot = getattr(self, '_counted_values', {})
+        attnames = self._counted_attnames()
+        if all(attname in snapshot for attname in attnames):
+            return snapshot
+        return type(self)._base_manager.filter(pk=self.pk).values(*attnames).first() or {}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic(using=kwargs.get('using')):
+            previous = self._counted_values_in_db()
+            created = self._state.adding
+            super().save(*args, **kwargs)
+            was_counted = not created and self._is_counted(previous)
+            is_counted = self._is_counted(self.__dict__)
+            filter_changed = update_fields is None or any(name in update_fields for name in self.counted_filter)
+            for fk_name, counter, *capacity in self.counted_relations:
+                field = self._meta.get_field(fk_name)
+                if not filter_changed and fk_name not in update_fields and field.attname not in update_fields:
+                    continue
+                old = previous.get(field.attname) if was_counted else None
+                new = getattr(self, field.attname) if is_counted else None
+                if old != new:
+                    adjust_counter(field.related_model, old, counter, -1)
+                    if not adjust_counter(field.related_model, new, counter, 1, *capacity):
+                        raise CapacityExceeded(field.related_model, new)
+        self.snapshot_counted_values()
+
+    def release_counted_relations(self):
+        """Called on post_delete: this row no longer counts towards its parents."""
+        if not self._is_counted(self.__dict__):
+            return
+        for fk_name, counter, *_ in self.counted_relations:
+            field = self._meta.get_field(fk_name)
+            adjust_counter(field.related_model, getattr(self, field.attname), counter, -1)
+
+
+class MaintainedFieldsMixin:
+    """Parent side: save() of an existing row leaves the counters alone (see module docstring)."""
+
+    # Other fields only ever changed through F() updates
+    maintained_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            skipped = maintained_fields(type(self))
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+def counted_relations():
+    """Yield (child model, foreign key field, counter field) for every tracked counter."""
+    for model in apps.get_app_config('Course').get_models():
+        for fk_name, counter, *_ in getattr(model, 'counted_relations', ()):
+            yield model, model._meta.get_field(fk_name), counter
+
+
+@functools.lru_cache(maxsize=None)
+def maintained_fields(model):
+    """The fields of `model` written only through F() updates: its counters and its `maintained_fields`."""
+    counters = {counter for _, field, counter in counted_relations() if field.related_model is model}
+    return frozenset(counters) | frozenset(getattr(model, 'maintained_fields', ()))
+
+
+def counted_rows(child):
+    """The rows of `child` that count towards its parents."""
+    return child._base_manager.filter(**getattr(child, 'counted_filter', {}))
+
+
+def find_drift(fix=False):
+    """
+    Recompute every counter from the child tables.
+
+    Returns a list of (parent model, pk, counter, stored, actual) for rows that
+    drifted, fixing them on the way when `fix` is true.
+    """
+    drift = []
+    for child, field, counter in counted_relations():
+        parent = field.related_model
+        actual_counts = dict(
+            counted_rows(child).filter(**{f'{field.attname}__isnull': False})
+            .values_list(field.attname)
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        for pk, stored in parent._base_manager.values_list('pk', counter).iterator():
+            actual = actual_counts.get(pk, 0)
+            if stored != actual:
+                drift.append((parent, pk, counter, stored, actual))
+                if fix:
+                    parent._base_manager.filter(pk=pk).update(**{counter: actual})
+                    object_cache.invalidate(parent, pk)
+    return drift
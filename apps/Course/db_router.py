@@ -0,0 +1,149 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Replica aliases are the DATABASES entries listed in settings.DATABASE_REPLICAS.
+Reads only go to a replica while ReadReplicaMiddleware has marked the current
+request as eligible: a GET/HEAD/OPTIONS request served by one of the views in
+settings.READ_REPLICA['VIEW_MODULES']. Everything else (the admin, management
+commands, background workers) keeps reading from the primary.
+
+Replicas lag behind the primary, so a user who just wrote something must not
+read it back from a replica. A write pins the rest of the request to the
+primary, and the middleware then pins the user (by id in the cache, and with a
+cookie for anonymous clients) for READ_REPLICA['STICKY_SECONDS'].
+
+Reads inside a transaction on the primary also stay on the primary, so
+`select_for_update()` and read-modify-write code see their own changes.
+
+A replica that cannot be connected to is skipped: the request reads from
+the primary, and the replica is not tried again for
+READ_REPLICA['RETRY_SECONDS'] (a circuit breaker per replica).
+
+The state is kept in a ContextVar, so it follows the request into
+sync_to_async/async_to_sync calls.
+"""
+import contextvars
+import logging
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_primary'
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+def pin_key(user_pk):
+    return f'db:pin:{user_pk}'
+
+
+class RoutingState:
+    """Per-request routing decision, created by ReadReplicaMiddleware."""
+
+    def __init__(self, request, replica):
+        self.request = request
+        self.replica = replica
+        self.pinned = request.COOKIES.get(PIN_COOKIE) == '1'
+        self.wrote = False
+        self._checked_user = None
+        self._replica_available = None
+
+    def use_replica(self):
+        if self.pinned:
+            return False
+        if self._replica_available is None:
+            self._replica_available = replica_available(self.replica)
+        if not self._replica_available:
+            return False
+        # The user may only be known once DRF has authenticated the request.
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated and self._checked_user != user.pk:
+            self._checked_user = user.pk
+            self.pinned = bool(cache.get(pin_key(user.pk)))
+        return not self.pinned
+
+
+def replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if alias in settings.DATABASES]
+
+
+_breakers = {}
+
+
+def _breaker(alias):
+    if alias not in _breakers:
+        _breakers[alias] = CircuitBreaker(
+            f'replica {alias}', failure_threshold=1, reset_timeout=settings.READ_REPLICA['RETRY_SECONDS'],
+        )
+    return _breakers[alias]
+
+
+def replica_available(alias):
+    """Can `alias` be read from? Connects if needed; a failure skips the replica for a while."""
+    breaker = _breaker(alias)
+    if not breaker.allow():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError as exc:
+        logger.warning(f'Replica {alias} unavailable, reading from the primary: {exc}')
+        breaker.record_failure()
+        return False
+    breaker.record_success()
+    return True
+
+
+def start_request(request):
+    """Make the current request eligible for replica reads; returns a token for end_request()."""
+    aliases = replicas()
+    state = RoutingState(request, random.choice(aliases)) if aliases else None
+    return _state.set(state)
+
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def pin_to_primary(request, response):
+    """After a write, keep the user's reads on the primary for the sticky window."""
+    seconds = settings.READ_REPLICA['STICKY_SECONDS']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(pin_key(user.pk), 1, seconds)
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or not state.use_replica():
+            # Explicit, or Django would follow the `instance` hint of a replica-loaded object.
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in replicas() else None
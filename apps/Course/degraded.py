@@ -0,0 +1,134 @@
+"""
+Degraded mode while the database is unavailable.
+
+When the database stalls (a long migration, a disk hiccup), every dashboard
+page and API request used to fail or hang. DegradedModeMiddleware
+(middleware.py) runs the requests of the namespaces in
+settings.DEGRADED_MODE['NAMESPACES'] through a per-process circuit breaker:
+
+- a request failing with an OperationalError or InterfaceError counts as a
+  failure only if the database then fails a `SELECT 1` too: a lock timeout
+  ("database is locked" under SQLite write contention) or a cancelled
+  statement is the request's problem, not an outage. FAILURE_THRESHOLD
+  failures in a row open the circuit for RESET_TIMEOUT seconds;
+- then one request is let through as the probe. The circuit closes only on
+  a `SELECT 1` that reaches the database after it: the probe request itself
+  may well have been served from caches without any query;
+- successful GET responses are copied to CACHES['default'], per path and
+  per session / Authorization header, at most every REFRESH_INTERVAL seconds;
+- while the circuit is open, and for the failing requests themselves, reads
+  get the last good copy marked with `Warning: 110 - "Response is stale"`,
+  or a 503 when there is none; writes are refused with 503 right away
+  instead of waiting on the database.
+
+The copies are keyed without touching the database, since looking up the
+session user is exactly what cannot be done.
+"""
+import hashlib
+import logging
+import sys
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import got_request_exception
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError, connections
+from django.dispatch import receiver
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+
+from .circuit_breaker import CLOSED, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+breaker = CircuitBreaker(
+    'database',
+    failure_threshold=settings.DEGRADED_MODE['FAILURE_THRESHOLD'],
+    reset_timeout=settings.DEGRADED_MODE['RESET_TIMEOUT'],
+)
+
+
+def database_reachable():
+    """One round trip to the database (connecting first if needed)."""
+    try:
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return False
+    return True
+
+
+@receiver(got_request_exception)
+def note_database_failure(sender, request=None, **kwargs):
+    # Sent while the exception is being handled, wherever it was raised in the middleware chain.
+    if request is not None and isinstance(sys.exc_info()[1], (OperationalError, InterfaceError)):
+        request.database_unavailable = not database_reachable()
+
+
+def covered(request):
+    try:
+        namespaces = resolve(request.path_info).namespaces
+    except Resolver404:
+        return False
+    return bool(namespaces) and namespaces[0] in settings.DEGRADED_MODE['NAMESPACES']
+
+
+def copy_key(request):
+    audience = '|'.join([
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+        request.META.get('HTTP_AUTHORIZATION', ''),
+    ])
+    raw = f'{audience}|{request.get_full_path()}'
+    return 'degraded:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def remember(request, response):
+    """Keep a copy of a good read-only response to serve while the database is down."""
+    config = settings.DEGRADED_MODE
+    if (
+        request.method != 'GET' or response.status_code != 200 or getattr(response, 'streaming', False)
+        or response.has_header('Warning') or len(response.content) > config['MAX_BYTES']
+    ):
+        return
+    key = copy_key(request)
+    if cache.add(f'{key}:fresh', 1, config['REFRESH_INTERVAL']):
+        cache.set(key, (response.content, response['Content-Type']), config['STALE_TIMEOUT'])
+
+
+def _unavailable(request, message):
+    if request.path.startswith('/api/'):
+        response = JsonResponse({'detail': message}, status=503)
+    else:
+        response = HttpResponse(message, status=503)
+    retry_in = breaker.status()['retry_in']
+    response['Retry-After'] = str(int(retry_in) + 1 if retry_in is not None else settings.DEGRADED_MODE['RESET_TIMEOUT'])
+    return response
+
+
+def fallback(request):
+    """The response to `request` while the database cannot be used."""
+    if request.method not in SAFE_METHODS:
+        return _unavailable(request, 'The database is unavailable, changes cannot be saved right now. Please retry shortly.')
+    cached = cache.get(copy_key(request))
+    if cached is None:
+        return _unavailable(request, 'The database is unavailable, please retry shortly.')
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response['Warning'] = '110 - "Response is stale"'
+    return response
+
+
+def settle(request, response):
+    """Record how the request went; replace the response if the database failed it."""
+    if getattr(request, 'database_unavailable', False):
+        breaker.record_failure()
+        logger.warning(f'Database unavailable for {request.method} {request.path}, serving degraded response')
+        return fallback(request)
+    if breaker.state != CLOSED and not database_reachable():
+        # The probe request got by without the database.
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    remember(request, response)
+    return response
@@ -0,0 +1,228 @@
+"""
+Chunked background deletion for objects with large cascades (courses and
+academic levels).
+
+`obj.delete()` makes Django's collector load every related row into memory
+and delete them all in one long transaction, which blocks every other writer
+on SQLite. `schedule()` instead:
+
+1. hides the object at once (pending_deletion_at is set, and the default
+   managers of Course and AcademicLevel skip such rows),
+2. records a DeletionJob and starts it on a background thread after commit.
+
+The job walks the object's reverse relations and, for each one, removes the
+related rows in batches of settings.DELETION['BATCH_SIZE'], one short
+transaction per batch: CASCADE children are deleted (through the ORM, so
+their own cascades and signals run, counters included), SET_NULL/SET_DEFAULT
+children are updated, updated_at included. Only then is the object itself
+deleted, with little left for the collector to do. Progress is written to the job after every
+batch.
+
+If the process dies, `manage.py process_deletions` picks up pending and
+stalled jobs; batches already committed are simply not found again.
+"""
+import functools
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.deletion import ProtectedError, get_candidate_relations_to_delete
+from django.utils import timezone
+
+from . import object_cache
+from .models import DeletionJob
+
+logger = logging.getLogger(__name__)
+
+Status = DeletionJob.Status
+
+
+class PendingDeletion(Exception):
+    """The object is hidden and being deleted in the background."""
+
+    def __init__(self, model, pk):
+        super().__init__(f'{model._meta.verbose_name} #{pk} is being deleted')
+        self.model = model
+        self.pk = pk
+
+
+def _relations(model):
+    """Reverse one-to-many / one-to-one relations of `model`, as (related model, field)."""
+    for relation in get_candidate_relations_to_delete(model._meta):
+        yield relation.related_model, relation.field
+
+
+def _related_rows(model, pk, field):
+    return field.model._base_manager.filter(**{field.attname: pk})
+
+
+def count_related(model, pk):
+    return sum(_related_rows(model, pk, field).count() for _, field in _relations(model))
+
+
+def delete_in_batches(queryset, batch_size=None, pause=None, on_batch=None):
+    """Delete the rows of `queryset` a batch at a time; returns how many were deleted."""
+    batch_size = batch_size or settings.DELETION['BATCH_SIZE']
+    pause = settings.DELETION['PAUSE'] if pause is None else pause
+    manager = queryset.model._base_manager
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            manager.filter(pk__in=pks).delete()
+        deleted += len(pks)
+        if on_batch is not None:
+            on_batch(len(pks))
+        if pause:
+            # Give other writers the lock between batches.
+            time.sleep(pause)
+
+
+def _has_updated_at(model):
+    return any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+
+
+@functools.lru_cache(maxsize=None)
+def detached_relations(model):
+    """Relations whose rows the collector updates when a `model` row is deleted, for models with updated_at."""
+    return tuple(
+        (related_model, field) for related_model, field in _relations(model)
+        if field.remote_field.on_delete in (models.SET_NULL, models.SET_DEFAULT) and _has_updated_at(related_model)
+    )
+
+
+def touch_detached_rows(instance):
+    """
+    Bump updated_at on the rows the collector is about to detach from `instance`.
+
+    The collector clears their foreign key with a plain UPDATE, which would
+    leave their cached API representations (apps/api/fragments.py) and
+    cached objects in place.
+    """
+    now = timezone.now()
+    for related_model, field in detached_relations(type(instance)):
+        rows = _related_rows(type(instance), instance.pk, field)
+        pks = list(rows.values_list('pk', flat=True))
+        if pks:
+            related_model._base_manager.filter(pk__in=pks).update(updated_at=now)
+            object_cache.invalidate_many(related_model, pks)
+
+
+def _detach_in_batches(queryset, field, value, batch_size, on_batch):
+    manager = queryset.model._base_manager
+    values = {field.attname: value}
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        if _has_updated_at(queryset.model):
+            values['updated_at'] = timezone.now()
+        with transaction.atomic():
+            manager.filter(pk__in=pks).update(**values)
+            object_cache.invalidate_many(queryset.model, pks)
+        on_batch(len(pks))
+
+
+def schedule(obj, requested_by=None):
+    """Hide `obj` now and delete it with its cascade in the background; returns the DeletionJob."""
+    model = type(obj)
+    with transaction.atomic():
+        model._base_manager.filter(pk=obj.pk).update(pending_deletion_at=timezone.now())
+        object_cache.invalidate(model, obj.pk)
+        job = DeletionJob.objects.create(
+            model=model._meta.label,
+            object_pk=obj.pk,
+            object_repr=str(obj)[:200],
+            requested_by=requested_by,
+        )
+        if settings.DELETION['IN_BACKGROUND']:
+            transaction.on_commit(lambda: start(job.pk))
+    if not settings.DELETION['IN_BACKGROUND']:
+        run(job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def start(job_pk):
+    thread = threading.Thread(target=_run_in_thread, args=(job_pk,), name=f'deletion-{job_pk}', daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_in_thread(job_pk):
+    try:
+        run(job_pk)
+    finally:
+        connection.close()
+
+
+def _claim(job_pk):
+    """Mark the job as running unless another worker holds it; returns the job or None."""
+    stalled = timezone.now() - timedelta(seconds=settings.DELETION['STALLED_AFTER'])
+    claimed = DeletionJob.objects.filter(
+        models.Q(status=Status.PENDING) | models.Q(status=Status.RUNNING, updated_at__lt=stalled),
+        pk=job_pk,
+    ).update(status=Status.RUNNING, updated_at=timezone.now())
+    return DeletionJob.objects.get(pk=job_pk) if claimed else None
+
+
+def run(job_pk):
+    """Run (or resume) a deletion job to completion."""
+    job = _claim(job_pk)
+    if job is None:
+        return None
+    model = apps.get_model(job.model)
+    batch_size = settings.DELETION['BATCH_SIZE']
+    try:
+        if not job.total:
+            job.total = count_related(model, job.object_pk)
+            job.save(update_fields=['total', 'updated_at'])
+
+        def on_batch(count):
+            job.deleted += count
+            job.save(update_fields=['deleted', 'updated_at'])
+
+        # Refuse before removing anything, like the collector would.
+        for related_model, field in _relations(model):
+            rows = _related_rows(model, job.object_pk, field)
+            if field.remote_field.on_delete in (models.PROTECT, models.RESTRICT) and rows.exists():
+                raise ProtectedError(f'{related_model._meta.verbose_name_plural} still reference {job.object_repr}', set(rows[:10]))
+
+        for related_model, field in _relations(model):
+            rows = _related_rows(model, job.object_pk, field)
+            on_delete = field.remote_field.on_delete
+            if on_delete is models.CASCADE:
+                delete_in_batches(rows, batch_size, on_batch=on_batch)
+            elif on_delete is models.SET_NULL:
+                _detach_in_batches(rows, field, None, batch_size, on_batch)
+            elif on_delete is models.SET_DEFAULT:
+                _detach_in_batches(rows, field, field.get_default(), batch_size, on_batch)
+            # DO_NOTHING and custom handlers are left to the final delete.
+
+        with transaction.atomic():
+            model._base_manager.filter(pk=job.object_pk).delete()
+    except Exception as exc:
+        logger.exception(f'Deletion of {job.model} #{job.object_pk} failed')
+        job.status, job.error = Status.FAILED, str(exc)
+        DeletionJob.objects.filter(pk=job.pk).update(status=job.status, error=job.error, updated_at=timezone.now())
+        # The object stays hidden until the job is retried.
+        return job
+    job.status = Status.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    logger.info(f'Deleted {job.object_repr} ({job.model} #{job.object_pk}) and {job.deleted} related row(s)')
+    return job
+
+
+def resumable_jobs():
+    """Jobs nobody is working on: never started, or running without progress for STALLED_AFTER seconds."""
+    stalled = timezone.now() - timedelta(seconds=settings.DELETION['STALLED_AFTER'])
+    return DeletionJob.objects.filter(
+        models.Q(status=Status.PENDING) | models.Q(status=Status.RUNNING, updated_at__lt=stalled)
+    ).order_by('created_at')
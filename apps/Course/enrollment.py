@@ -0,0 +1,77 @@
+"""
+Enrollment service: the one place that enrolls and unenrolls students.
+
+Enrollments live in the Enrollment table only. A seat is reserved by the
+guarded increment of Course.enrolled_count made when an active Enrollment is
+saved (see counters.py), so concurrent enrollers can never oversubscribe a
+course. Calls are idempotent: enrolling a student who is already in the
+course is reported as ALREADY_ENROLLED and changes nothing; a course being
+deleted in the background (deletion.py) is UNAVAILABLE. A freed seat is
+offered to the course's waitlist (see waitlist.py). Under the SQLite
+production profile both calls go through the single-writer queue.
+"""
+import enum
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import waitlist
+from .counters import CapacityExceeded
+from .models import Course, Enrollment, WaitlistEntry
+from .sqlite_profile import serialized_write
+
+
+class EnrollmentOutcome(enum.Enum):
+    ENROLLED = 'enrolled'
+    ALREADY_ENROLLED = 'already_enrolled'
+    FULL = 'full'
+    UNAVAILABLE = 'unavailable'
+
+
+@serialized_write
+def enroll(user, course):
+    """Enroll `user` in `course`, reserving a seat atomically."""
+    if Enrollment.objects.active().filter(user=user, course=course).exists():
+        return EnrollmentOutcome.ALREADY_ENROLLED
+    try:
+        with transaction.atomic():
+            if Course._base_manager.filter(pk=course.pk, pending_deletion_at__isnull=False).exists():
+                return EnrollmentOutcome.UNAVAILABLE
+            Enrollment.objects.create(user=user, course=course)
+    except CapacityExceeded:
+        return EnrollmentOutcome.FULL
+    except IntegrityError:
+        # A concurrent call enrolled the same student first.
+        return EnrollmentOutcome.ALREADY_ENROLLED
+
+    waitlist.leave_course(user, course, WaitlistEntry.Status.ENROLLED)
+    return EnrollmentOutcome.ENROLLED
+
+
+@serialized_write
+def unenroll(user, course=None, status=Enrollment.Status.CANCELLED):
+    """End `user`'s active enrollments (only in `course`, if given), releasing the seats; returns the courses."""
+    enrollments = Enrollment.objects.active().filter(user=user).select_related('course')
+    if course is not None:
+        enrollments = enrollments.filter(course=course)
+    courses = []
+    with transaction.atomic():
+        for enrollment in enrollments.select_for_update(of=('self',)):
+            enrollment.status = status
+            enrollment.ended_at = timezone.now()
+            enrollment.save(update_fields=['status', 'ended_at', 'updated_at'])
+            waitlist.offer_seats_on_commit(enrollment.course)
+            courses.append(enrollment.course)
+    return courses
+
+
+def sync_course_students(course, students):
+    """Make `students` exactly the active students of `course`; returns those turned away because it is full."""
+    students = set(students)
+    current = {enrollment.user for enrollment in course.enrollments.active().select_related('user')}
+    for student in current - students:
+        unenroll(student, course)
+    return [
+        student for student in sorted(students - current, key=lambda s: s.username)
+        if enroll(student, course) == EnrollmentOutcome.FULL
+    ]
@@ -0,0 +1,83 @@
+"""
+Push notifications for students, delivered over the pub/sub channel.
+
+Each event is published on the narrowest channel that covers its audience:
+- user:<id>    events for one user (payment_verified, waitlist_offered)
+- course:<id>  live classes attached to a course
+- level:<id>   live classes attached to an academic level only
+- public       live classes with neither
+"""
+from .pubsub import publish, publish_on_commit
+
+PAYMENT_VERIFIED = 'payment_verified'
+WAITLIST_OFFERED = 'waitlist_offered'
+LIVE_CLASS_STARTING = 'live_class_starting'
+LIVE_CLASS_STARTED = 'live_class_started'
+
+PUBLIC_CHANNEL = 'public'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def course_channel(course_id):
+    return f'course:{course_id}'
+
+
+def level_channel(level_id):
+    return f'level:{level_id}'
+
+
+def channels_for_user(user):
+    """Channels a signed-in user should listen on."""
+    channels = [user_channel(user.pk), PUBLIC_CHANNEL]
+    channels.extend(course_channel(course_id) for course_id in user.enrolled_course_ids().values_list('course', flat=True))
+    if user.academic_level_id:
+        channels.append(level_channel(user.academic_level_id))
+    return channels
+
+
+def live_class_channel(live_class):
+    if live_class.course_id:
+        return course_channel(live_class.course_id)
+    if live_class.level_id:
+        return level_channel(live_class.level_id)
+    return PUBLIC_CHANNEL
+
+
+def payment_verified(payment):
+    publish_on_commit(user_channel(payment.user_id), {
+        'event': PAYMENT_VERIFIED,
+        'data': {
+            'payment_id': payment.pk,
+            'course_id': payment.course_id,
+            'course_title': payment.course.title,
+            'verified_at': payment.verified_at.isoformat() if payment.verified_at else None,
+        },
+    })
+
+
+def waitlist_offered(entry):
+    publish_on_commit(user_channel(entry.user_id), {
+        'event': WAITLIST_OFFERED,
+        'data': {
+            'waitlist_entry_id': entry.pk,
+            'payment_id': entry.payment_id,
+            'course_id': entry.course_id,
+            'course_title': entry.course.title,
+        },
+    })
+
+
+def live_class_event(event, live_class):
+    publish(live_class_channel(live_class), {
+        'event': event,
+        'data': {
+            'live_class_id': live_class.pk,
+            'title': live_class.title,
+            'course_id': live_class.course_id,
+            'start_time': live_class.start_time.isoformat(),
+            'end_time': live_class.end_time.isoformat(),
+        },
+    })
@@ -1,10 +1,92 @@
 
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import UserChangeForm, UserCreationForm
+from django.db import transaction
 from django.forms import inlineformset_factory
-from .models import User, AcademicLevel, Stream, Subject, LiveClass, Course, Video, PaymentMethod, PaymentVerification
+from django.forms.models import ModelChoiceIterator
+from . import waitlist
+from .counters import CapacityExceeded
+from .deletion import PendingDeletion
+from .enrollment import EnrollmentOutcome, enroll, sync_course_students
+from .models import User, AcademicLevel, Stream, Subject, LiveClass, Course, Enrollment, Video, PaymentMethod, PaymentVerification
+from .reference_cache import ReferenceManager
+
+
+def _whole_reference_table(queryset):
+    model = queryset.model
+    if not isinstance(getattr(model, 'cached', None), ReferenceManager) or queryset.query.is_empty():
+        return False
+    return str(queryset.query) == str(model._default_manager.all().query)
+
+
+class ReferenceChoiceIterator(ModelChoiceIterator):
+    """Choices listing a whole reference table come from the in-process cache (reference_cache.py)."""
+
+    def rows(self):
+        return self.queryset.model.cached.cached_all() if _whole_reference_table(self.queryset) else None
+
+    def __iter__(self):
+        rows = self.rows()
+        if rows is None:
+            yield from super().__iter__()
+            return
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in rows:
+            yield self.choice(obj)
+
+    def __len__(self):
+        rows = self.rows()
+        if rows is None:
+            return super().__len__()
+        return len(rows) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        rows = self.rows()
+        if rows is None:
+            return super().__bool__()
+        return self.field.empty_label is not None or bool(rows)
+
+
+class ReferenceChoicesMixin:
+    """Render the choices of academic levels, streams, subjects and payment methods without a query."""
 
-class UserForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            if isinstance(field, forms.ModelChoiceField):
+                # Decided when the choices are rendered, after any narrowing of the queryset.
+                field.iterator = ReferenceChoiceIterator
+                field.widget.choices = field.choices
+
+class LevelCapacityFormMixin:
+    """
+    User forms with an academic_level field: a full level is a form error.
+
+    clean() gives the friendly message; the counters enforce capacity
+    race-free on save (counters.py), and save_within_capacity() turns a lost
+    race into the same form error instead of a CapacityExceeded 500.
+    """
+
+    def clean(self):
+        cleaned_data = super().clean()
+        level = cleaned_data.get('academic_level')
+        changed = level and self.instance.academic_level_id != level.pk
+        if changed and level.capacity is not None and level.capacity <= level.student_count:
+            self.add_error('academic_level', f'"{level}" is full.')
+        return cleaned_data
+
+    def save_within_capacity(self, commit=True):
+        """save(), or None with an academic_level error if the level filled up meanwhile."""
+        try:
+            with transaction.atomic():
+                return self.save(commit)
+        except CapacityExceeded:
+            self.add_error('academic_level', f'"{self.cleaned_data["academic_level"]}" is full.')
+            return None
+
+
+class UserForm(ReferenceChoicesMixin, LevelCapacityFormMixin, forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput(attrs={
         'class': 'form-control',
         'placeholder': 'Enter password'
@@ -16,7 +98,7 @@ class UserForm(forms.ModelForm):
     
     class Meta:
         model = User
-        fields = ['username', 'first_name', 'last_name', 'email', 'phone', 'role', 'academic_level', 'course', 'bio', 'profile_picture']
+        fields = ['username', 'first_name', 'last_name', 'email', 'phone', 'role', 'academic_level', 'bio', 'profile_picture']
         widgets = {
             'username': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter username'}),
             'first_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter first name'}),
@@ -25,7 +107,6 @@ class UserForm(forms.ModelForm):
             'phone': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter phone number'}),
             'role': forms.Select(attrs={'class': 'form-select'}),
             'academic_level': forms.Select(attrs={'class': 'form-select'}),
-            'course': forms.Select(attrs={'class': 'form-select'}),
             'bio': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Enter bio'}),
             'profile_picture': forms.FileInput(attrs={'class': 'form-control'}),
         }
@@ -79,7 +160,7 @@ class AcademicLevelForm(forms.ModelForm):
         }
 
 
-class StreamForm(forms.ModelForm):
+class StreamForm(ReferenceChoicesMixin, forms.ModelForm):
     class Meta:
         model = Stream
         fields = ['name', 'slug', 'level']
@@ -93,7 +174,7 @@ class StreamForm(forms.ModelForm):
         }
 
 
-class SubjectForm(forms.ModelForm):
+class SubjectForm(ReferenceChoicesMixin, forms.ModelForm):
     class Meta:
         model = Subject
         fields = ['name', 'description', 'levels', 'streams']
@@ -111,10 +192,10 @@ class SubjectForm(forms.ModelForm):
 class EnrollmentForm(forms.Form):
     """Form to enroll a student into a Course"""
     student = forms.ModelChoiceField(
-        queryset=User.objects.filter(role=User.Role.STUDENT, course__isnull=True),
+        queryset=User.objects.filter(role=User.Role.STUDENT),
         widget=forms.Select(attrs={'class': 'form-select'}),
         label='Student',
-        help_text='Select a student to enroll (only students not already enrolled)'
+        help_text='Select a student to enroll'
     )
     course = forms.ModelChoiceField(
         queryset=Course.objects.all(),
@@ -123,16 +204,28 @@ class EnrollmentForm(forms.Form):
         help_text='Select the course to enroll the student into'
     )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        student, course = cleaned_data.get('student'), cleaned_data.get('course')
+        if student and course and Enrollment.objects.active().filter(user=student, course=course).exists():
+            self.add_error('student', f'{student.username} is already enrolled in "{course.title}".')
+        return cleaned_data
+
     def save(self):
-        """Assign course to student"""
+        """Enroll the student; returns None (with a form error) when the course is full"""
         student = self.cleaned_data['student']
         course = self.cleaned_data['course']
-        student.course = course
-        student.save()
+        outcome = enroll(student, course)
+        if outcome == EnrollmentOutcome.FULL:
+            self.add_error('course', f'"{course.title}" is full.')
+            return None
+        if outcome == EnrollmentOutcome.UNAVAILABLE:
+            self.add_error('course', f'"{course.title}" is being deleted.')
+            return None
         return student
 
             
-class LiveClassForm(forms.ModelForm):
+class LiveClassForm(ReferenceChoicesMixin, forms.ModelForm):
     class Meta:
         model = LiveClass
         fields = ['title', 'course' ,'level', 'subject', 'hosts', 'start_time', 'end_time', 'meeting_url', 'description', 'is_recorded', 'recording_url']
@@ -155,19 +248,39 @@ class LiveClassForm(forms.ModelForm):
 
 
 class CourseForm(forms.ModelForm):
+    participants = forms.ModelMultipleChoiceField(
+        queryset=User.objects.filter(role=User.Role.STUDENT),
+        required=False,
+        widget=forms.SelectMultiple(attrs={'class': 'form-select', 'size': '5'}),
+        help_text='Students enrolled in this course'
+    )
+
     class Meta:
         model = Course
-        fields = ['title', 'description', 'participants', 'start_time', 'end_time', 'image']
+        fields = ['title', 'description', 'participants', 'capacity', 'start_time', 'end_time', 'image']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter course title'}),
+            'capacity': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Enter capacity (optional)'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Enter description'}),
-            'participants': forms.SelectMultiple(attrs={'class': 'form-select', 'size': '5'}),
             'start_time': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
             'end_time': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
         }
 
-class VideoUploadForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.turned_away = []
+        if self.instance.pk:
+            self.fields['participants'].initial = self.instance.students
+
+    def save(self, commit=True):
+        """Save the course and sync its enrollments; students that did not fit are left in `turned_away`"""
+        course = super().save(commit=commit)
+        if commit:
+            self.turned_away = sync_course_students(course, self.cleaned_data['participants'])
+        return course
+
+class VideoUploadForm(ReferenceChoicesMixin, forms.ModelForm):
     labels = {
             'level': 'Class', 
         }
@@ -286,14 +399,34 @@ class PaymentVerificationForm(forms.ModelForm):
         self.fields['payment_method'].queryset = PaymentMethod.objects.filter(is_active=True)
         # Only show courses the user hasn't enrolled in
         if self.user:
-            self.fields['course'].queryset = Course.objects.exclude(enrolled_students=self.user)
-    
+            self.fields['course'].queryset = Course.objects.exclude(
+                pk__in=Enrollment.objects.active().filter(user=self.user).values('course')
+            )
+
+    def clean_course(self):
+        course = self.cleaned_data['course']
+        if self.user and waitlist.active_entry(self.user, course):
+            raise forms.ValidationError('You are already on the waitlist for this course.')
+        return course
+
     def save(self, commit=True):
+        """Save the payment; for a course with a capacity it queues for a seat on the course's waitlist.
+
+        Returns None (with a form error) when the course started being deleted after validation.
+        """
         instance = super().save(commit=False)
         if self.user:
             instance.user = self.user
         if commit:
-            instance.save()
+            try:
+                with transaction.atomic():
+                    instance.save()
+                    if instance.course.capacity is not None:
+                        waitlist.join(instance.user, instance.course, payment=instance)
+                        waitlist.offer_free_seats(instance.course)
+            except PendingDeletion:
+                self.add_error('course', 'This course is no longer available.')
+                return None
         return instance
 
 
@@ -338,7 +471,7 @@ class UserLoginForm(forms.Form):
     password = forms.CharField(widget=forms.PasswordInput(attrs={'placeholder': 'Password'}))
 
 
-class UserCreateForm(UserCreationForm):
+class UserCreateForm(ReferenceChoicesMixin, LevelCapacityFormMixin, UserCreationForm):
     class Meta:
         model = User
         fields = ['username', 'first_name', 'last_name', 'email', 'password1', 'password2', 'role', 'phone', 'profile_picture', 'academic_level']
@@ -349,6 +482,12 @@ class UserCreateForm(UserCreationForm):
         self.fields['password2'].widget.attrs.update({'class': 'form-control'})
 
 
+class UserAdminChangeForm(ReferenceChoicesMixin, LevelCapacityFormMixin, UserChangeForm):
+    """The admin's user change form, refusing a full academic level."""
+    class Meta(UserChangeForm.Meta):
+        model = User
+
+
 # Provide a VideoForm alias for compatibility with older imports
 class VideoForm(VideoUploadForm):
     """Alias/wrapper around VideoUploadForm kept for compatibility."""
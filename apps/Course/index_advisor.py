@@ -0,0 +1,307 @@
+"""
+Index advisor: find the queries our pages run without a usable index.
+
+`capture_queries()` drives the dashboard, list, search and API views with the
+test client and records every SELECT they issue. `explain()` runs SQLite's
+EXPLAIN QUERY PLAN on each one and flags full table scans and temporary
+B-tree sorts. `recommend()` then turns the flagged queries into composite
+indexes: equality columns first, then the ORDER BY columns (or the first
+range column), skipping anything an existing index already covers.
+
+The column extraction is a heuristic over Django's generated SQL, so the
+result is a proposal to review, not something to apply blindly.
+"""
+import re
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .models import (
+    AcademicLevel, Course, Enrollment, LiveClass, PaymentMethod, PaymentVerification, Stream, Subject, User, Video,
+)
+
+MAX_INDEX_COLUMNS = 3
+
+COLUMN = r'(?:"(?P<table>\w+)"|(?P<alias>T\d+))\."(?P<column>\w+)"'
+EQUALITY = re.compile(COLUMN + r' (?:=|IN \(|IS NULL|IS NOT NULL)')
+RANGE = re.compile(COLUMN + r' (?:>=?|<=?|BETWEEN) ')
+ORDER = re.compile(COLUMN + r' (?:ASC|DESC)')
+ALIAS = re.compile(r'"(\w+)" (T\d+)\b')
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)')
+
+
+@dataclass
+class Query:
+    sql: str
+    params: tuple
+    urls: list = field(default_factory=list)
+    count: int = 0
+    plan: list = field(default_factory=list)
+    scans: list = field(default_factory=list)
+    temp_btrees: list = field(default_factory=list)
+
+    @property
+    def flagged(self):
+        return bool(self.scans or self.temp_btrees)
+
+
+@dataclass
+class Recommendation:
+    model: type
+    fields: list
+    queries: list = field(default_factory=list)
+
+    def index(self):
+        index = models.Index(fields=self.fields)
+        index.set_name_with_model(self.model)
+        return index
+
+
+def dashboard_urls():
+    """Pages to drive, as (url, role) pairs; role picks which user requests it."""
+    urls = [(reverse(f'dashboard:{name}'), 'admin') for name in (
+        'index', 'course_home', 'subject_home', 'student_home', 'teacher_home', 'stream_home',
+        'enrollment_home', 'live_classes', 'video_home', 'payment_method_list',
+        'payment_verification_list', 'subject_list',
+    )]
+    for model, name in (
+        (User, 'user_detail'), (AcademicLevel, 'level_detail'), (Stream, 'stream_detail'),
+        (Subject, 'subject_detail'), (LiveClass, 'liveclass_detail'), (Course, 'activity_detail'),
+        (Video, 'video_detail'), (PaymentMethod, 'payment_method_detail'),
+        (PaymentVerification, 'payment_verification_detail'),
+    ):
+        pk = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+        if pk is not None:
+            urls.append((reverse(f'dashboard:{name}', args=[pk]), 'admin'))
+    level = AcademicLevel.objects.order_by('order').first()
+    if level is not None:
+        urls.append((reverse('dashboard:class_level', args=[level.slug]), 'admin'))
+
+    search = reverse('dashboard:global_search')
+    for term in ('a', 'student:a', 'course:a', 'video:a', 'live:a', 'enrollment:a'):
+        urls.append((f'{search}?q={term}', 'admin'))
+    urls.append((reverse('dashboard:my_payment_verifications'), 'student'))
+
+    for path in ('courses', 'classes', 'streams', 'liveclasses', 'videos', 'payment-methods', 'users', 'waitlist'):
+        urls.append((f'/api/{path}/', 'student'))
+        urls.append((f'/api/{path}/', 'anonymous'))
+    for path in ('courses', 'classes', 'liveclasses', 'videos'):
+        urls.append((f'/api/async/{path}/', 'student'))
+    return urls
+
+
+def _clients():
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    admin = User.objects.filter(is_superuser=True).first() or User.objects.create_superuser(
+        'index-advisor', password=None, role=User.Role.ADMIN
+    )
+    student = (
+        User.objects.filter(role=User.Role.STUDENT, pk__in=Enrollment.objects.active().values('user')).first()
+        or User.objects.filter(role=User.Role.STUDENT).first()
+        or User.objects.create_user('index-advisor-student', password=None, role=User.Role.STUDENT)
+    )
+    admin_client = Client(raise_request_exception=False)
+    admin_client.force_login(admin)
+    student_client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Token {AccessToken.for_user(student)}')
+    student_client.force_login(student)
+    return {'admin': admin_client, 'student': student_client, 'anonymous': Client(raise_request_exception=False)}
+
+
+def capture_queries(urls=None, stdout=None):
+    """
+    Request every page and collect the distinct SELECT statements they run.
+
+    Everything happens inside a transaction that is rolled back, so sessions
+    and any helper users created for the run leave no trace.
+    """
+    queries = OrderedDict()
+    current_url = [None]
+
+    def record(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            query = queries.setdefault(sql, Query(sql, tuple(params or ())))
+            query.count += 1
+            if current_url[0] not in query.urls:
+                query.urls.append(current_url[0])
+        return execute(sql, params, many, context)
+
+    with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*']):
+        clients = _clients()
+        urls = list(urls or dashboard_urls())
+        with connection.execute_wrapper(record):
+            for url, role in urls:
+                current_url[0] = url
+                response = clients[role].get(url)
+                if stdout is not None:
+                    stdout.write(f'  {response.status_code} {url} ({role})')
+        transaction.set_rollback(True)
+    return list(queries.values())
+
+
+def _aliases(sql):
+    return {alias: table for table, alias in ALIAS.findall(sql)}
+
+
+def _columns(pattern, text, aliases):
+    found = []
+    for match in pattern.finditer(text):
+        table = match.group('table') or aliases.get(match.group('alias'))
+        if table and (table, match.group('column')) not in found:
+            found.append((table, match.group('column')))
+    return found
+
+
+def _split(sql):
+    """Return the (WHERE, ORDER BY) text of the outermost query."""
+    where = order = ''
+    depth = 0
+    marks = {}
+    for i, char in enumerate(sql):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            for keyword in (' WHERE ', ' GROUP BY ', ' ORDER BY ', ' LIMIT '):
+                if sql.startswith(keyword, i):
+                    marks[keyword] = i
+    if ' WHERE ' in marks:
+        end = min([pos for key, pos in marks.items() if pos > marks[' WHERE ']] or [len(sql)])
+        where = sql[marks[' WHERE ']:end]
+    if ' ORDER BY ' in marks:
+        end = marks.get(' LIMIT ', len(sql))
+        order = sql[marks[' ORDER BY ']:end]
+    return where, order
+
+
+def explain(queries):
+    """Attach the SQLite query plan to each query and flag scans and temp B-tree sorts."""
+    with connection.cursor() as cursor:
+        for query in queries:
+            try:
+                cursor.execute(f'EXPLAIN QUERY PLAN {query.sql}', query.params)
+            except Exception as exc:  # e.g. statements that only make sense inside their request
+                query.plan = [f'(could not explain: {exc})']
+                continue
+            aliases = _aliases(query.sql)
+            query.plan = [row[-1] for row in cursor.fetchall()]
+            for detail in query.plan:
+                scan = SCAN.match(detail)
+                if scan and 'INDEX' not in scan.group(2) and not scan.group(1).startswith('CONSTANT'):
+                    query.scans.append(aliases.get(scan.group(1), scan.group(1)))
+                sort = TEMP_BTREE.search(detail)
+                if sort:
+                    query.temp_btrees.append(sort.group(1))
+    return queries
+
+
+def _model_tables(app_label):
+    return {model._meta.db_table: model for model in apps.get_app_config(app_label).get_models()}
+
+
+def _existing_indexes(model):
+    """Column lists of the indexes the model already has."""
+    meta = model._meta
+    existing = [[meta.pk.column]]
+    for model_field in meta.local_fields:
+        if model_field.unique or model_field.db_index:
+            existing.append([model_field.column])
+    for index in meta.indexes:
+        existing.append([meta.get_field(name.lstrip('-')).column for name in index.fields])
+    for constraint in meta.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields and constraint.condition is None:
+            existing.append([meta.get_field(name).column for name in constraint.fields])
+    for fields in meta.unique_together:
+        existing.append([meta.get_field(name).column for name in fields])
+    return existing
+
+
+def _covered(columns, indexes):
+    return any(index[:len(columns)] == columns for index in indexes)
+
+
+def recommend(queries, app_label='Course'):
+    """Turn flagged queries into one composite index proposal per (model, columns)."""
+    tables = _model_tables(app_label)
+    proposals = OrderedDict()
+    for query in queries:
+        if not query.flagged:
+            continue
+        aliases = _aliases(query.sql)
+        where, order = _split(query.sql)
+        equality = _columns(EQUALITY, where, aliases)
+        ranges = _columns(RANGE, where, aliases)
+        ordering = _columns(ORDER, order, aliases)
+        flagged_tables = set(query.scans)
+        if query.temp_btrees:
+            flagged_tables.update(table for table, _ in ordering)
+        for table in flagged_tables:
+            model = tables.get(table)
+            if model is None:
+                continue
+            columns = [column for t, column in equality if t == table]
+            sort_columns = [column for t, column in ordering if t == table]
+            range_columns = [column for t, column in ranges if t == table]
+            if sort_columns and len(sort_columns) == len(ordering):
+                # The index can only replace the sort if it covers every ORDER BY column.
+                columns += sort_columns
+            elif range_columns:
+                columns.append(range_columns[0])
+            columns = list(OrderedDict.fromkeys(columns))[:MAX_INDEX_COLUMNS]
+            if not columns or columns == [model._meta.pk.column]:
+                continue
+            if _covered(columns, _existing_indexes(model)):
+                continue
+            by_column = {f.column: f.name for f in model._meta.local_fields}
+            fields = [by_column[column] for column in columns if column in by_column]
+            if len(fields) != len(columns):
+                continue
+            proposal = proposals.setdefault((model, tuple(fields)), Recommendation(model, fields))
+            proposal.queries.append(query)
+
+    # Drop proposals that are a leading prefix of a longer one on the same model.
+    result = []
+    for (model, fields), proposal in proposals.items():
+        longer = any(
+            other_model is model and len(other_fields) > len(fields) and other_fields[:len(fields)] == fields
+            for other_model, other_fields in proposals
+        )
+        if not longer:
+            result.append(proposal)
+    return result
+
+
+def migration_source(recommendations, app_label='Course', name='advised_indexes'):
+    """Render a migration adding every recommended index; returns (file name, source)."""
+    from django.db import migrations
+    from django.db.migrations.loader import MigrationLoader
+    from django.db.migrations.writer import MigrationWriter
+
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    leaf = loader.graph.leaf_nodes(app_label)
+    number = int(leaf[0][1].split('_')[0]) + 1 if leaf else 1
+    migration = type('Migration', (migrations.Migration,), {
+        'dependencies': leaf,
+        'operations': [
+            migrations.AddIndex(model_name=rec.model._meta.model_name, index=rec.index())
+            for rec in recommendations
+        ],
+    })(f'{number:04d}_{name}', app_label)
+    writer = MigrationWriter(migration)
+    return writer.path, writer.as_string()
+
+
+def meta_snippets(recommendations):
+    """The `Meta.indexes` entries to add to each model so makemigrations stays in sync."""
+    by_model = defaultdict(list)
+    for rec in recommendations:
+        index = rec.index()
+        by_model[rec.model.__name__].append(f"models.Index(fields={rec.fields!r}, name={index.name!r}),")
+    return by_model
@@ -0,0 +1,133 @@
+"""
+Cross-process invalidation bus.
+
+Caches kept inside a worker process (the reference-table LRU, the local
+copies of the resilient cache backend) cannot see writes made by other
+workers or servers. Every change to a row of a cached model
+(object_cache.is_cached) is therefore announced as a `model:pk` event:
+
+- signals.py calls `changed()` on post_save/post_delete,
+- object_cache.invalidate() calls it for writes that bypass signals
+  (queryset.update(), counter increments).
+
+`changed()` runs the local handlers at once (and again after commit) and
+publishes the event on the pub/sub channel once the transaction commits.
+Every process that keeps local entries runs one listener thread (started by
+`listen()` the first time such a cache is used), which passes the events of
+other processes to the same handlers:
+
+    @invalidation.subscribe
+    def evict(model, pks):
+        ...
+
+A listener that loses its subscription cannot know what it missed, so on
+every (re)subscribe the `on_reset()` callbacks clear the local entries.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.db import transaction
+
+from . import pubsub
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'invalidate'
+
+_token = uuid.uuid4().hex[:8]
+_handlers = []
+_reset_callbacks = []
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def origin():
+    # The pid keeps forked workers apart even though they share the token.
+    return f'{os.getpid()}:{_token}'
+
+
+def subscribe(handler):
+    """Register `handler(model, pks)` for every change, local or remote."""
+    _handlers.append(handler)
+    return handler
+
+
+def on_reset(callback):
+    """Register `callback()`, run when events may have been missed."""
+    _reset_callbacks.append(callback)
+    return callback
+
+
+def _dispatch(model, pks):
+    for handler in _handlers:
+        try:
+            handler(model, pks)
+        except Exception:
+            logger.exception(f'Invalidation handler {handler.__qualname__} failed for {model._meta.label} {pks}')
+
+
+def changed(model, pks):
+    """Announce that rows `pks` of `model` changed."""
+    pks = [pk for pk in pks if pk is not None]
+    if not pks:
+        return
+    _dispatch(model, pks)
+    if transaction.get_connection().in_atomic_block:
+        # Readers may have cached the old row again before the commit.
+        transaction.on_commit(lambda: _dispatch(model, pks))
+    pubsub.publish_on_commit(CHANNEL, {'model': model._meta.label_lower, 'pks': pks, 'origin': origin()})
+
+
+def listen():
+    """Start this process' listener thread unless it is running."""
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name='invalidation-listener', daemon=True)
+            _listener.start()
+
+
+def _reset():
+    for callback in _reset_callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception(f'Invalidation reset {callback.__qualname__} failed')
+
+
+def _receive(message):
+    if message.get('origin') == origin():
+        return
+    try:
+        model = apps.get_model(message['model'])
+    except (KeyError, LookupError):
+        logger.warning(f'Ignoring invalidation for unknown model {message.get("model")!r}')
+        return
+    _dispatch(model, message.get('pks', []))
+
+
+def _listen():
+    while True:
+        try:
+            subscription = pubsub.subscribe(CHANNEL)
+        except Exception:
+            logger.exception('Cannot subscribe to cache invalidations, retrying')
+            time.sleep(5)
+            continue
+        _reset()
+        try:
+            while True:
+                received = subscription.get_message(timeout=5)
+                if received is not None:
+                    _receive(received[1])
+        except Exception:
+            logger.exception('Lost the cache invalidation subscription, resubscribing')
+            time.sleep(1)
+        finally:
+            subscription.close()
@@ -0,0 +1,60 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.Course import index_advisor
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the dashboard, list, search and API views, EXPLAIN every query they run, "
+        "flag full scans and temp B-tree sorts, and propose composite indexes as a migration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--write", action="store_true", help="Write the proposed migration into apps/Course/migrations")
+        parser.add_argument("--name", default="advised_indexes", help="Name suffix for the generated migration")
+        parser.add_argument("--all", action="store_true", help="List every captured query, not only flagged ones")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("advise_indexes reads SQLite's EXPLAIN QUERY PLAN; point DB_ENGINE at a SQLite copy of the data.")
+
+        self.stdout.write("Requesting pages...")
+        queries = index_advisor.explain(index_advisor.capture_queries(stdout=self.stdout))
+        flagged = [query for query in queries if query.flagged]
+        self.stdout.write(f"\nCaptured {len(queries)} distinct queries, {len(flagged)} with full scans or temp B-tree sorts.\n")
+
+        for query in queries if options["all"] else flagged:
+            flags = [f"SCAN {table}" for table in query.scans] + [f"TEMP B-TREE ({kind})" for kind in query.temp_btrees]
+            self.stdout.write(self.style.WARNING(", ".join(flags)) if flags else "ok")
+            self.stdout.write(f"  ran {query.count}x from {', '.join(query.urls[:3])}{' ...' if len(query.urls) > 3 else ''}")
+            self.stdout.write(f"  {query.sql[:300]}{'...' if len(query.sql) > 300 else ''}")
+            for detail in query.plan:
+                self.stdout.write(f"    | {detail}")
+
+        recommendations = index_advisor.recommend(queries)
+        if not recommendations:
+            self.stdout.write(self.style.SUCCESS("\nNo new indexes recommended."))
+            return
+
+        self.stdout.write("\nRecommended indexes:")
+        for rec in recommendations:
+            self.stdout.write(f"  {rec.model.__name__}({', '.join(rec.fields)})  - helps {len(rec.queries)} quer{'y' if len(rec.queries) == 1 else 'ies'}")
+
+        self.stdout.write("\nAdd to each model's Meta.indexes so makemigrations stays in sync:")
+        for model_name, lines in index_advisor.meta_snippets(recommendations).items():
+            self.stdout.write(f"  {model_name}:")
+            for line in lines:
+                self.stdout.write(f"    {line}")
+
+        path, source = index_advisor.migration_source(recommendations, name=options["name"])
+        if options["write"]:
+            if os.path.exists(path):
+                raise CommandError(f"{path} already exists.")
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(source)
+            self.stdout.write(self.style.SUCCESS(f"\nWrote {path}"))
+        else:
+            self.stdout.write(f"\n# {os.path.relpath(path)}\n{source}")
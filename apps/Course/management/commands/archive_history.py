@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from apps.Course import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move past live classes and old verified payments into their archive tables in batches. "
+        "Safe to interrupt and re-run: every batch is its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", choices=["liveclasses", "payments"], help="Archive only one of the two tables")
+        parser.add_argument("--days", type=int, help="Override the horizon (settings.ARCHIVE) for both tables")
+        parser.add_argument("--batch-size", type=int, help="Rows moved per transaction (default: settings.ARCHIVE['BATCH_SIZE'])")
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep between batches")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches per table")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived")
+
+    def handle(self, *args, **options):
+        models = {"liveclasses": archive.LiveClass, "payments": archive.PaymentVerification}
+        if options["only"]:
+            models = {options["only"]: models[options["only"]]}
+
+        for model in models.values():
+            days = archive.horizon(model) if options["days"] is None else options["days"]
+            name = model.__name__
+            if options["dry_run"]:
+                count = archive.archivable(model, archive.cutoff_for(days)).count()
+                self.stdout.write(f"{name}: {count} row(s) older than {days} days would be archived")
+                continue
+
+            self.stdout.write(f"Archiving {name} older than {days} days...")
+            moved = archive.archive(
+                model,
+                days=days,
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+                max_batches=options["max_batches"],
+                stdout=self.stdout,
+            )
+            self.stdout.write(self.style.SUCCESS(f"{name}: {moved} row(s) archived"))
@@ -0,0 +1,128 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.Course.sqlite_profile import WriteQueue, apply_pragmas
+
+ROWS = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent SQLite reads and writes on a scratch database, "
+        "with the default settings and with the production profile (pragmas + single-writer queue)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent worker threads")
+        parser.add_argument("--seconds", type=float, default=5, help="Duration of each run")
+        parser.add_argument("--write-ratio", type=float, default=0.2, help="Share of operations that write")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['threads']} threads, {options['seconds']}s per run, "
+            f"{options['write_ratio']:.0%} writes (read-then-update transactions)"
+        )
+        for profile in ("default", "production"):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "bench.sqlite3")
+                self.setup(path)
+                result = self.run(path, profile == "production", options)
+            self.report(profile, result, options["seconds"])
+
+    def setup(self, path):
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, counter INTEGER NOT NULL, payload TEXT)")
+        conn.execute("CREATE TABLE event (id INTEGER PRIMARY KEY, item_id INTEGER, created REAL)")
+        conn.executemany("INSERT INTO item (id, counter, payload) VALUES (?, 0, ?)", ((i, "x" * 200) for i in range(1, ROWS + 1)))
+        conn.commit()
+        conn.close()
+
+    def connect(self, path, production):
+        # timeout=5 matches Django's default busy wait for SQLite.
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        if production:
+            apply_pragmas(conn.cursor(), settings.SQLITE_PRAGMAS)
+        return conn
+
+    @staticmethod
+    def write(conn, item_id):
+        conn.execute("BEGIN")
+        try:
+            counter = conn.execute("SELECT counter FROM item WHERE id = ?", (item_id,)).fetchone()[0]
+            conn.execute("UPDATE item SET counter = ? WHERE id = ?", (counter + 1, item_id))
+            conn.execute("INSERT INTO event (item_id, created) VALUES (?, ?)", (item_id, time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def read(conn, item_id):
+        conn.execute("SELECT SUM(counter), COUNT(payload) FROM item WHERE id BETWEEN ? AND ?", (item_id, item_id + 200)).fetchone()
+
+    def run(self, path, production, options):
+        stats = {"reads": 0, "writes": 0, "errors": 0, "write_latency": []}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+        writer = None
+        if production:
+            writer_conn = {}
+
+            def queued_write(item_id):
+                # Runs on the writer thread, which owns one connection.
+                if "conn" not in writer_conn:
+                    writer_conn["conn"] = self.connect(path, True)
+                self.write(writer_conn["conn"], item_id)
+
+            writer = WriteQueue(name="bench-writer", atomic=None)
+
+        def worker():
+            conn = self.connect(path, production)
+            local = {"reads": 0, "writes": 0, "errors": 0, "write_latency": []}
+            while time.monotonic() < deadline:
+                item_id = random.randint(1, ROWS)
+                try:
+                    if random.random() < options["write_ratio"]:
+                        started = time.perf_counter()
+                        if writer is not None:
+                            writer.submit(queued_write, item_id).result()
+                        else:
+                            self.write(conn, item_id)
+                        local["write_latency"].append(time.perf_counter() - started)
+                        local["writes"] += 1
+                    else:
+                        self.read(conn, item_id)
+                        local["reads"] += 1
+                except sqlite3.OperationalError:
+                    local["errors"] += 1
+            conn.close()
+            with lock:
+                for key in ("reads", "writes", "errors"):
+                    stats[key] += local[key]
+                stats["write_latency"] += local["write_latency"]
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if writer is not None:
+            writer.submit(lambda: writer_conn.pop("conn").close() if "conn" in writer_conn else None).result()
+            writer.stop()
+        return stats
+
+    def report(self, profile, stats, seconds):
+        latencies = sorted(stats["write_latency"])
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        line = (
+            f"{profile:>10}: {stats['reads'] / seconds:8.0f} reads/s {stats['writes'] / seconds:7.0f} writes/s "
+            f"p95 write {p95:7.1f} ms, {stats['errors']} lock errors"
+        )
+        self.stdout.write(self.style.ERROR(line) if stats["errors"] else self.style.SUCCESS(line))
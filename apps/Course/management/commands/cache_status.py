@@ -0,0 +1,35 @@
+import time
+import uuid
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Show the circuit breaker state of a resilient cache and time a set/get round trip."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alias", default="default", help="CACHES alias to check")
+
+    def handle(self, *args, **options):
+        cache = caches[options["alias"]]
+        key = f"cache-status:{uuid.uuid4().hex}"
+        started = time.monotonic()
+        cache.set(key, 1, 10)
+        value = cache.get(key)
+        cache.delete(key)
+        elapsed = (time.monotonic() - started) * 1000
+
+        status = cache.status() if hasattr(cache, "status") else None
+        if status is None:
+            self.stdout.write(f"{type(cache).__name__} has no circuit breaker.")
+        elif status["state"] == "closed":
+            self.stdout.write(self.style.SUCCESS(f"{status['name']}: circuit closed"))
+        else:
+            retry = f", retrying in {status['retry_in']:.0f}s" if status["retry_in"] is not None else ""
+            self.stdout.write(self.style.ERROR(
+                f"{status['name']}: circuit {status['state']} after {status['failures']} failure(s){retry}, "
+                f"{status['pending_deletes']} key(s) to delete on recovery"
+            ))
+        style = self.style.SUCCESS if value == 1 else self.style.ERROR
+        self.stdout.write(style(f"Round trip {'ok' if value == 1 else 'failed'} in {elapsed:.1f}ms"))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.Course import outbox
+
+
+class Command(BaseCommand):
+    help = "Feed new outbox events to the configured consumers (settings.OUTBOX['CONSUMERS']); run as a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", action="append", help="Only run this consumer (repeatable)")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds to sleep once every consumer caught up")
+        parser.add_argument("--once", action="store_true", help="Catch up once and exit")
+        parser.add_argument("--prune", action="store_true", help="Also delete events every consumer has handled")
+
+    def handle(self, *args, **options):
+        consumers = outbox.consumers()
+        if options["consumer"]:
+            unknown = set(options["consumer"]) - {consumer.name for consumer in consumers}
+            if unknown:
+                raise CommandError(f"Unknown consumer(s): {', '.join(sorted(unknown))}")
+            consumers = [consumer for consumer in consumers if consumer.name in options["consumer"]]
+        while True:
+            for consumer in consumers:
+                handled = outbox.run_consumer(consumer)
+                if handled:
+                    self.stdout.write(f"{consumer.name}: {handled} event(s)")
+            if options["prune"]:
+                pruned = outbox.prune()
+                if pruned:
+                    self.stdout.write(f"Pruned {pruned} event(s).")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
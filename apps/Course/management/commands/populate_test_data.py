@@ -10,6 +10,7 @@ from decimal import Decimal
 import io
 from PIL import Image
 
+from apps.Course.enrollment import enroll
 from apps.Course.models import (
     AcademicLevel,
     Stream,
@@ -220,10 +221,6 @@ class Command(BaseCommand):
                     "end_time": end,
                 },
             )
-            # add participants
-            if students:
-                participants = random.sample(students, k=min(len(students), random.randint(0, 5)))
-                activity.participants.set(participants)
             activities.append(activity)
         
         # Assign courses to some students (enroll them)
@@ -232,11 +229,7 @@ class Command(BaseCommand):
             # Enroll about 70% of students into random courses
             students_to_enroll = random.sample(students, k=int(len(students) * 0.7))
             for student in students_to_enroll:
-                try:
-                    student.course = random.choice(activities)
-                    student.save()
-                except Exception:
-                    pass
+                enroll(student, random.choice(activities))
 
         # Videos
         for i in range(videos_count):
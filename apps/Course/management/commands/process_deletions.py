@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.Course import deletion
+from apps.Course.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Resume background deletions that are pending or stalled (e.g. after a restart); run periodically or as a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=60, help="Seconds between sweeps")
+        parser.add_argument("--once", action="store_true", help="Run a single sweep and exit")
+        parser.add_argument("--retry-failed", action="store_true", help="Also retry jobs that failed")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            retried = DeletionJob.objects.filter(status=DeletionJob.Status.FAILED).update(status=DeletionJob.Status.PENDING, error="")
+            self.stdout.write(f"Retrying {retried} failed job(s).")
+        while True:
+            for job in deletion.resumable_jobs():
+                self.stdout.write(f"Deleting {job.object_repr} ({job.model} #{job.object_pk})...")
+                job = deletion.run(job.pk)
+                if job is not None:
+                    self.stdout.write(f"  {job.get_status_display()}: {job.deleted}/{job.total} related row(s) {job.error}")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.Course import waitlist
+from apps.Course.models import Course, WaitlistEntry
+
+
+class Command(BaseCommand):
+    help = "Offer free seats to waitlisted students, e.g. after capacity changes or deletions (run periodically or as a worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=60, help="Seconds between sweeps")
+        parser.add_argument("--once", action="store_true", help="Run a single sweep and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            offered = self.sweep()
+            if offered:
+                self.stdout.write(f"Offered {offered} seat(s).")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+    def sweep(self):
+        courses = Course.objects.filter(waitlist_entries__status=WaitlistEntry.Status.WAITING).distinct()
+        return sum(len(waitlist.offer_free_seats(course)) for course in courses)
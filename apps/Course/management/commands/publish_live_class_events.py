@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.Course import events
+from apps.Course.models import LiveClass
+
+
+class Command(BaseCommand):
+    help = "Publish live_class_starting / live_class_started events for subscribed clients (run as a long-lived worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=15, help="Seconds between checks")
+        parser.add_argument("--lead-minutes", type=int, default=15, help="How long before start to send live_class_starting")
+        parser.add_argument("--once", action="store_true", help="Run a single check and exit")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Publishing live class events...")
+        while True:
+            sent = self.publish_due_events(options["lead_minutes"])
+            if sent:
+                self.stdout.write(f"Published {sent} live class event(s).")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+    def publish_due_events(self, lead_minutes):
+        now = timezone.now()
+        starting = LiveClass.objects.filter(start_time__gt=now, start_time__lte=now + timedelta(minutes=lead_minutes))
+        started = LiveClass.objects.filter(start_time__lte=now, end_time__gte=now)
+        sent = 0
+        for event, live_classes in ((events.LIVE_CLASS_STARTING, starting), (events.LIVE_CLASS_STARTED, started)):
+            for live_class in live_classes:
+                # cache.add is atomic, so several publisher processes never send the same event twice.
+                ttl = max(int((live_class.end_time - now).total_seconds()), 60)
+                if cache.add(f"live-class-event:{event}:{live_class.pk}", 1, timeout=ttl):
+                    events.live_class_event(event, live_class)
+                    sent += 1
+        return sent
@@ -0,0 +1,70 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from apps.Course.counters import find_drift
+from apps.Course.enrollment import EnrollmentOutcome, enroll
+from apps.Course.models import Course, User
+
+
+class Command(BaseCommand):
+    help = "Enroll many students into one small course concurrently and check that capacity is never exceeded."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=50, help="Number of concurrent enrollers")
+        parser.add_argument("--capacity", type=int, default=10, help="Seats in the test course")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated course and students")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        course = Course.objects.create(title=f"Stress test {tag}", capacity=options["capacity"])
+        students = [
+            User.objects.create(username=f"stress-{tag}-{i}", role="student")
+            for i in range(options["students"])
+        ]
+        outcomes = []
+        retries = []
+        barrier = threading.Barrier(len(students))
+
+        def worker(student):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        outcomes.append(enroll(student, course))
+                        return
+                    except OperationalError:
+                        # SQLite reports "database is locked" to competing writers;
+                        # enroll() is atomic, so simply try again.
+                        retries.append(student.pk)
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(student,)) for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        course.refresh_from_db()
+        enrolled = course.enrollments.active().count()
+        accepted = outcomes.count(EnrollmentOutcome.ENROLLED)
+        self.stdout.write(
+            f"{len(students)} enrollers, capacity {course.capacity}: "
+            f"{accepted} enrolled, {outcomes.count(EnrollmentOutcome.FULL)} turned away, "
+            f"{len(retries)} lock retries"
+        )
+        self.stdout.write(f"Students in course: {enrolled}, enrolled_count: {course.enrolled_count}")
+
+        ok = enrolled == accepted == course.enrolled_count <= course.capacity
+        if not options["keep"]:
+            User.objects.filter(username__startswith=f"stress-{tag}-").delete()
+            course.delete()
+        if ok and not find_drift():
+            self.stdout.write(self.style.SUCCESS("No oversubscription."))
+        else:
+            self.stdout.write(self.style.ERROR("Capacity was exceeded or counters drifted."))
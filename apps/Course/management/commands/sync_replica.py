@@ -0,0 +1,37 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.Course.db_router import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the replica files (DB_REPLICAS). "
+        "SQLite has no replication of its own; this stands in for it in development and tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alias", action="append", help="Only refresh this replica alias (repeatable)")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != "sqlite":
+            raise CommandError("Only SQLite replicas are refreshed here; other backends replicate on their own.")
+        aliases = options["alias"] or replicas()
+        if not aliases:
+            raise CommandError("No replicas configured. Set DB_REPLICAS, e.g. DB_REPLICAS=db.replica.sqlite3")
+
+        primary.ensure_connection()
+        for alias in aliases:
+            if alias not in replicas():
+                raise CommandError(f"{alias!r} is not a configured replica.")
+            connections[alias].close()
+            target = sqlite3.connect(str(connections[alias].settings_dict["NAME"]))
+            try:
+                # The online backup API copies a consistent snapshot even while the primary is in use.
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f"{alias}: refreshed from {primary.settings_dict['NAME']}"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.Course.counters import find_drift
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized counters (enrolled, student, video and live class counts) and report or fix drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Write the recomputed values back")
+
+    def handle(self, *args, **options):
+        drift = find_drift(fix=options["fix"])
+        for model, pk, counter, stored, actual in drift:
+            self.stdout.write(self.style.WARNING(
+                f"{model.__name__} #{pk} {counter}: stored {stored}, actual {actual}"
+            ))
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All counters are consistent."))
+        elif options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted counter(s)."))
+        else:
+            self.stdout.write(self.style.ERROR(f"{len(drift)} drifted counter(s). Re-run with --fix to repair."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.Course import warmup
+
+
+class Command(BaseCommand):
+    help = "Precompute every registered cacheable artifact in parallel; run after a deploy, before switching traffic."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", action="append", help="Only warm this artifact (repeatable)")
+        parser.add_argument("--workers", type=int, help="Parallel workers (default: settings.WARMUP['WORKERS'])")
+        parser.add_argument("--list", action="store_true", help="List the registered artifacts and exit")
+
+    def handle(self, *args, **options):
+        names = sorted(warmup.artifacts())
+        if options["list"]:
+            for name in names:
+                self.stdout.write(name)
+            return
+        if options["only"]:
+            unknown = set(options["only"]) - set(names)
+            if unknown:
+                raise CommandError(f"Unknown artifact(s): {', '.join(sorted(unknown))}")
+
+        results = warmup.warm(options["only"], options["workers"])
+        for result in results:
+            if result.error:
+                self.stdout.write(self.style.ERROR(f"{result.name}: failed after {result.seconds:.2f}s ({result.error})"))
+            else:
+                detail = f", {result.detail}" if result.detail else ""
+                self.stdout.write(self.style.SUCCESS(f"{result.name}: {result.seconds:.2f}s{detail}"))
+        failed = [result.name for result in results if result.error]
+        if failed:
+            raise CommandError(f"{len(failed)} artifact(s) failed to warm: {', '.join(failed)}")
@@ -1,14 +1,48 @@
+import asyncio
 import logging
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import db_router, degraded
 
 logger = logging.getLogger(__name__)
 
+# The shape of the keys DRF generates (20 random bytes, hex)
+TOKEN_KEY = re.compile(r'[0-9a-f]{40}')
+
 class UserRequestLogMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         response = self.get_response(request)
-        
+        self.log(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        await sync_to_async(self.log)(request, response)
+        return response
+
+    def log(self, request, response):
         # Log user info after response
         if hasattr(request, 'user') and request.user.is_authenticated:
             logger.info(
@@ -16,5 +50,296 @@ class UserRequestLogMiddleware:
                 f'{request.method} {request.path} | '
                 f'Status: {response.status_code}'
             )
-        
-        return response
\ No newline at end of file
+
+
+class AdmissionControlMiddleware:
+    """
+    Per-class concurrency budgets with priority load shedding.
+
+    Every request is put in one of the classes configured in
+    settings.ADMISSION_CONTROL['CLASSES'] (admin dashboard, authenticated API,
+    anonymous API, search). A class is admitted while both hold:
+    - its own in-flight count is below its 'limit'
+    - the total in-flight count is below its 'shed_above' share of MAX_IN_FLIGHT
+
+    Low-priority classes get a smaller share, so they are shed first as the
+    worker fills up and the last slots stay free for admins. Requests that
+    cannot be admitted wait up to 'queue_timeout' seconds and are then
+    rejected with 503 and a Retry-After header.
+
+    Counters are kept per process, which is what matters for protecting that
+    process' worker threads. Under ASGI, queued requests wait on an
+    asyncio.Condition, holding no thread while they wait.
+
+    Classifying costs no query for API clients: a JWT is checked by its
+    signature, and an API token is only looked up once its request has been
+    admitted; an unknown one is then moved down to the anonymous class.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        config = getattr(settings, 'ADMISSION_CONTROL', {})
+        self.enabled = config.get('ENABLED', True)
+        self.max_in_flight = config.get('MAX_IN_FLIGHT', 64)
+        self.retry_after = config.get('RETRY_AFTER', 5)
+        self.classes = config.get('CLASSES', {})
+        self.in_flight = {name: 0 for name in self.classes}
+        self.total_in_flight = 0
+        self.condition = threading.Condition()
+        self._async_loop = self._async_condition = None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_class = self.classify(request) if self.enabled else None
+        if request_class is None:
+            return self.get_response(request)
+
+        if not self.acquire(request_class):
+            return self.reject(request, request_class)
+        if not self.token_is_valid(request):
+            self.release(request_class)
+            request_class = 'api_anon'
+            if not self.acquire(request_class):
+                return self.reject(request, request_class)
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request_class)
+
+    async def __acall__(self, request):
+        request_class = await sync_to_async(self.classify)(request) if self.enabled else None
+        if request_class is None:
+            return await self.get_response(request)
+
+        if not await self.aacquire(request_class):
+            return self.reject(request, request_class)
+        if not await sync_to_async(self.token_is_valid)(request):
+            await self.arelease(request_class)
+            request_class = 'api_anon'
+            if not await self.aacquire(request_class):
+                return self.reject(request, request_class)
+        try:
+            return await self.get_response(request)
+        finally:
+            await self.arelease(request_class)
+
+    def classify(self, request):
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            url_name = None
+        if url_name == 'event-stream':
+            # Long-lived SSE connections would pin their budget slot forever; sse.py caps them instead.
+            return None
+        if url_name == 'global_search' and 'search' in self.classes:
+            return 'search'
+        if request.path.startswith('/api/'):
+            authenticated = request.user.is_authenticated or self.has_credentials(request)
+            return 'api_auth' if authenticated else 'api_anon'
+        if request.user.is_authenticated and request.user.is_staff:
+            return 'admin'
+        return None
+
+    def has_credentials(self, request):
+        """
+        Does the Authorization header carry a valid JWT, or what looks like an
+        API token? A junk header gets no priority. Tokens are checked against
+        the database by `token_is_valid`, after admission.
+        """
+        parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(parts) != 2:
+            return False
+        keyword, credentials = parts
+        if keyword in jwt_settings.AUTH_HEADER_TYPES:
+            try:
+                AccessToken(credentials)  # signature and expiry, no database
+                return True
+            except TokenError:
+                pass
+        # JWTs and DRF tokens may share the keyword (SIMPLE_JWT['AUTH_HEADER_TYPES']).
+        if keyword == 'Token' and TOKEN_KEY.fullmatch(credentials):
+            request.admission_token = credentials
+            return True
+        return False
+
+    def token_is_valid(self, request):
+        key = getattr(request, 'admission_token', None)
+        return key is None or Token.objects.filter(key=key).exists()
+
+    def can_admit(self, request_class):
+        budget = self.classes[request_class]
+        share = int(self.max_in_flight * budget.get('shed_above', 1.0))
+        return (
+            self.in_flight[request_class] < budget['limit']
+            and self.total_in_flight < share
+        )
+
+    def acquire(self, request_class):
+        deadline = time.monotonic() + self.classes[request_class].get('queue_timeout', 0)
+        with self.condition:
+            while not self.can_admit(request_class):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight[request_class] += 1
+            self.total_in_flight += 1
+            return True
+
+    def release(self, request_class):
+        with self.condition:
+            self.in_flight[request_class] -= 1
+            self.total_in_flight -= 1
+            self.condition.notify_all()
+
+    @property
+    def async_condition(self):
+        # asyncio primitives belong to one event loop (tests run several)
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop, self._async_condition = loop, asyncio.Condition()
+        return self._async_condition
+
+    async def aacquire(self, request_class):
+        deadline = time.monotonic() + self.classes[request_class].get('queue_timeout', 0)
+        async with self.async_condition:
+            while not self.can_admit(request_class):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self.async_condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+            self.in_flight[request_class] += 1
+            self.total_in_flight += 1
+            return True
+
+    async def arelease(self, request_class):
+        async with self.async_condition:
+            self.in_flight[request_class] -= 1
+            self.total_in_flight -= 1
+            self.async_condition.notify_all()
+
+    def reject(self, request, request_class):
+        logger.warning(
+            f'Shedding {request_class} request {request.method} {request.path} | '
+            f'in flight: {self.total_in_flight}/{self.max_in_flight}'
+        )
+        message = 'Server is busy, please retry shortly.'
+        if request.path.startswith('/api/'):
+            response = JsonResponse({'detail': message}, status=503)
+        else:
+            response = HttpResponse(message, status=503)
+        response['Retry-After'] = str(self.retry_after)
+        return response
+
+
+class ReadReplicaMiddleware:
+    """
+    Let safe requests to the dashboard and API views read from a replica.
+
+    Routing itself happens in db_router.ReplicaRouter; this only marks which
+    requests may use a replica and, after a write, pins the user to the
+    primary for settings.READ_REPLICA['STICKY_SECONDS'].
+    """
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.view_modules = tuple(settings.READ_REPLICA['VIEW_MODULES'])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.eligible(request):
+            response = self.get_response(request)
+            self.finish(request, None, response)
+            return response
+        token = db_router.start_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = db_router.end_request(token)
+        self.finish(request, state, response)
+        return response
+
+    async def __acall__(self, request):
+        if not await sync_to_async(self.eligible)(request):
+            response = await self.get_response(request)
+            await sync_to_async(self.finish)(request, None, response)
+            return response
+        token = db_router.start_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = db_router.end_request(token)
+        await sync_to_async(self.finish)(request, state, response)
+        return response
+
+    def eligible(self, request):
+        if request.method not in self.safe_methods or not db_router.replicas():
+            return False
+        try:
+            module = resolve(request.path_info).func.__module__
+        except Resolver404:
+            return False
+        if not module.startswith(self.view_modules):
+            return False
+        # Resolve the session user now, against the primary, before routing kicks in.
+        request.user.is_authenticated
+        return True
+
+    def finish(self, request, state, response):
+        wrote = state.wrote if state is not None else request.method not in self.safe_methods
+        if wrote and db_router.replicas():
+            db_router.pin_to_primary(request, response)
+
+
+class DegradedModeMiddleware:
+    """
+    Keep read-only pages and API responses available while the database is
+    down, serving their last good copy marked stale, and refuse writes at
+    once instead of letting workers pile up on the database (see degraded.py).
+
+    Sits ahead of every middleware that may query the database (session
+    user lookups in admission control, replica routing, request logging).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.enabled = settings.DEGRADED_MODE['ENABLED']
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled or not degraded.covered(request):
+            return self.get_response(request)
+        if not degraded.breaker.allow():
+            return degraded.fallback(request)
+        response = self.get_response(request)
+        return degraded.settle(request, response)
+
+    async def __acall__(self, request):
+        if not self.enabled or not degraded.covered(request):
+            return await self.get_response(request)
+        if not degraded.breaker.allow():
+            return await sync_to_async(degraded.fallback)(request)
+        response = await self.get_response(request)
+        return await sync_to_async(degraded.settle)(request, response)
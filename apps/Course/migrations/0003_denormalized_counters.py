@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:22
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+COUNTERS = [
+    # (child model, foreign key attname, parent model, counter field)
+    ('User', 'course_id', 'Course', 'enrolled_count'),
+    ('User', 'academic_level_id', 'AcademicLevel', 'student_count'),
+    ('Video', 'subject_id', 'Subject', 'video_count'),
+    ('Video', 'teacher_id', 'User', 'video_count'),
+    ('LiveClass', 'subject_id', 'Subject', 'live_class_count'),
+    ('LiveClass', 'hosts_id', 'User', 'live_class_count'),
+]
+
+
+def backfill_counters(apps, schema_editor):
+    for child_name, attname, parent_name, counter in COUNTERS:
+        child = apps.get_model('Course', child_name)
+        parent = apps.get_model('Course', parent_name)
+        totals = (
+            child.objects.filter(**{f'{attname}__isnull': False})
+            .values_list(attname)
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        for pk, total in totals:
+            parent.objects.filter(pk=pk).update(**{counter: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0002_alter_course_end_time_alter_course_start_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='academiclevel',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of users in this level (maintained automatically).'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of users enrolled (maintained automatically).'),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='live_class_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='video_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='live_class_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='video_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
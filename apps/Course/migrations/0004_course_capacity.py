@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0003_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum number of students allowed in this course (optional).', null=True),
+        ),
+    ]
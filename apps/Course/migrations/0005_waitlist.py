@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0004_course_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='waitlist_head',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='waitlist_tail',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket', models.PositiveIntegerField(editable=False)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Seat offered'), ('enrolled', 'Enrolled'), ('cancelled', 'Cancelled')], default='waiting', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('offered_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='Course.course')),
+                ('payment', models.OneToOneField(blank=True, help_text='Payment submitted while the course was full', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='Course.paymentverification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Waitlist Entry',
+                'verbose_name_plural': 'Waitlist Entries',
+                'ordering': ['course', 'ticket'],
+                'indexes': [models.Index(fields=['course', 'status', 'ticket'], name='waitlist_course_queue_idx'), models.Index(fields=['user', 'status'], name='waitlist_user_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='waitlistentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['waiting', 'offered'])), fields=('course', 'user'), name='unique_active_waitlist_entry'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:32
+
+import apps.Course.counters
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Count
+
+
+def backfill_enrollments(apps, schema_editor):
+    """Merge User.course and Course.participants into active Enrollment rows."""
+    User = apps.get_model('Course', 'User')
+    Course = apps.get_model('Course', 'Course')
+    Enrollment = apps.get_model('Course', 'Enrollment')
+
+    pairs = {}
+    for user_id, course_id, joined in User.objects.filter(course__isnull=False).values_list('pk', 'course_id', 'date_joined'):
+        pairs[(user_id, course_id)] = joined
+    for user_id, course_id, joined in Course.participants.through.objects.values_list('user_id', 'course_id', 'user__date_joined'):
+        pairs.setdefault((user_id, course_id), joined)
+    Enrollment.objects.bulk_create(
+        [Enrollment(user_id=user_id, course_id=course_id, enrolled_at=joined) for (user_id, course_id), joined in pairs.items()],
+        batch_size=500,
+    )
+
+    Course.objects.update(enrolled_count=0)
+    totals = Enrollment.objects.values_list('course_id').annotate(total=Count('pk')).order_by()
+    for course_id, total in totals:
+        Course.objects.filter(pk=course_id).update(enrolled_count=total)
+
+
+def restore_enrollment_fields(apps, schema_editor):
+    User = apps.get_model('Course', 'User')
+    Course = apps.get_model('Course', 'Course')
+    Enrollment = apps.get_model('Course', 'Enrollment')
+    active = Enrollment.objects.filter(status='active').order_by('enrolled_at')
+    Course.participants.through.objects.bulk_create(
+        [Course.participants.through(user_id=user_id, course_id=course_id) for user_id, course_id in active.values_list('user_id', 'course_id')],
+        ignore_conflicts=True,
+    )
+    for user_id, course_id in active.values_list('user_id', 'course_id'):
+        User.objects.filter(pk=user_id).update(course_id=course_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0005_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='active', max_length=20)),
+                ('enrolled_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='Course.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-enrolled_at'],
+                'indexes': [models.Index(fields=['course', 'status', 'user'], name='enrollment_course_status_idx'), models.Index(fields=['user', 'status', 'course'], name='enrollment_user_status_idx')],
+            },
+            bases=(apps.Course.counters.CountedRelationsMixin, models.Model),
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('user', 'course'), name='unique_active_enrollment'),
+        ),
+        migrations.RunPython(backfill_enrollments, restore_enrollment_fields),
+        migrations.RemoveField(
+            model_name='course',
+            name='participants',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='course',
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0006_enrollment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='academiclevel',
+            index=models.Index(fields=['order'], name='level_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['start_time', 'created_at'], name='course_start_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['created_at'], name='course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['status', 'enrolled_at'], name='enrollment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='liveclass',
+            index=models.Index(fields=['start_time'], name='liveclass_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='liveclass',
+            index=models.Index(fields=['course', 'start_time'], name='liveclass_course_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentmethod',
+            index=models.Index(fields=['display_order', 'name'], name='payment_method_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentverification',
+            index=models.Index(fields=['created_at'], name='payment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentverification',
+            index=models.Index(fields=['user', 'created_at'], name='payment_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['uploaded_at'], name='video_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['user', 'created_at'], name='waitlist_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0007_advised_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPaymentVerification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('transaction_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('payment_proof', models.ImageField(blank=True, null=True, upload_to='payment_proofs/')),
+                ('remarks', models.TextField(blank=True)),
+                ('verified', models.BooleanField(default=False)),
+                ('verification_notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Course.course')),
+                ('payment_method', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='Course.paymentmethod')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('verified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Payment Verification',
+                'verbose_name_plural': 'Archived Payment Verifications',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='archived_payment_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedLiveClass',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('meeting_url', models.URLField(blank=True, max_length=500, null=True)),
+                ('description', models.TextField(blank=True)),
+                ('is_recorded', models.BooleanField(default=False)),
+                ('recording_url', models.URLField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('extra', models.JSONField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Course.course')),
+                ('hosts', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Course.academiclevel')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Course.subject')),
+            ],
+            options={
+                'verbose_name': 'Archived Live Class',
+                'verbose_name_plural': 'Archived Live Classes',
+                'ordering': ('-start_time',),
+                'indexes': [models.Index(fields=['start_time'], name='archived_liveclass_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Course', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxcheckpoint',
+            name='skipped',
+            field=models.JSONField(blank=True, default=dict, help_text='Missing ids behind the position, looked up again until they expire'),
+        ),
+    ]
@@ -1,12 +1,18 @@
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from . import events
+from .counters import CountedRelationsMixin, MaintainedFieldsMixin
+from .object_cache import CachedManager
+from .outbox import OutboxMixin
+from .reference_cache import ReferenceManager
 
-class User(AbstractUser):
+
+class User(OutboxMixin, CountedRelationsMixin, MaintainedFieldsMixin, AbstractUser):
 
     class Role(models.TextChoices):
         ADMIN = "admin", "Admin"
@@ -23,19 +29,30 @@ class User(AbstractUser):
         null=True,
         related_name='students'
     )
-    course = models.ForeignKey(
-        'Course',
-        on_delete=models.SET_NULL,
-        blank=True,
-        null=True,
-        related_name='enrolled_students',
-        help_text='The course this user is enrolled in'
-    )
+    # Denormalized counters for teachers, maintained by Video/LiveClass saves and deletes
+    video_count = models.PositiveIntegerField(default=0, editable=False)
+    live_class_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Level capacity is enforced by the guarded counter increment (course capacity: see Enrollment)
+    counted_relations = (('academic_level', 'student_count', 'capacity'),)
+
+    class Meta(AbstractUser.Meta):
+        # Indexes below came out of `manage.py advise_indexes` (see index_advisor.py)
+        indexes = [
+            models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx'),
+        ]
 
     @property
     def enrolled(self):
-        """Returns True if user has a course assigned, False otherwise"""
-        return self.course is not None
+        """Returns True if user is actively enrolled in a course, False otherwise"""
+        return self.enrollments.active().exists()
+
+    def enrolled_course_ids(self):
+        """Ids of the courses this user is actively enrolled in, as a subquery"""
+        return self.enrollments.active().values('course')
+
+    def is_enrolled_in(self, course_id):
+        return course_id is not None and self.enrollments.active().filter(course=course_id).exists()
 
     def save(self, *args, **kwargs):
         if self.is_superuser and not self.role:
@@ -83,25 +100,41 @@ class User(AbstractUser):
  ###############################
  # academic level refers to classes
  ################################       
-class AcademicLevel(models.Model): # for representing grades/years 1 for class one and 2 for class two
+class VisibleManager(models.Manager):
+    """Hides rows that are being deleted in the background (see deletion.py)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(pending_deletion_at__isnull=True)
+
+
+class AcademicLevel(MaintainedFieldsMixin, models.Model): # for representing grades/years 1 for class one and 2 for class two
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True) # for URL use like 'grade-10', 'bachelor', etc. for easy referencing
     order = models.IntegerField(help_text="Sorting order (smaller -> earlier in schooling).")
     # Optional: marks whether this level can have streams (like +2)
     allowed_streams = models.BooleanField(default=False)
     capacity = models.PositiveIntegerField(blank=True, null=True, help_text="Maximum number of students allowed in this level (optional).")
+    student_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of users in this level (maintained automatically).")
+    # Set when a background deletion starts; the level is hidden from then on
+    pending_deletion_at = models.DateTimeField(blank=True, null=True, editable=False)
     # all students from this academic level can be accessed by related_name 'students' from User model
 
+    objects = VisibleManager()
+    all_objects = models.Manager()
+    cached = ReferenceManager()
+
     class Meta: 
         ordering = ("order",)
         verbose_name = "Academic Level"
         verbose_name_plural = "Academic Levels"
+        indexes = [
+            models.Index(fields=['order'], name='level_order_idx'),
+        ]
     
     def capacity_remaining(self):
         if self.capacity is None:
             return "Not set"  # Unlimited capacity
-        enrolled_count = self.students.count()
-        return self.capacity - enrolled_count
+        return self.capacity - self.student_count
 
     def __str__(self):
         return self.name
@@ -119,6 +152,9 @@ class Stream(models.Model):
     slug = models.SlugField(max_length=50)
     level = models.ForeignKey(AcademicLevel, related_name="streams", on_delete=models.CASCADE)
 
+    objects = models.Manager()
+    cached = ReferenceManager()
+
     class Meta:
         unique_together = ("name", 'level')
 
@@ -130,11 +166,16 @@ class Stream(models.Model):
         return f"{self.level.name} — {self.name}"
 
 
-class Subject(models.Model):
+class Subject(MaintainedFieldsMixin, models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     levels = models.ForeignKey(AcademicLevel, related_name="subjects", on_delete=models.SET_NULL, blank=True, null=True)
     streams = models.ManyToManyField(Stream, related_name="subjects", default=None, blank=True)
+    video_count = models.PositiveIntegerField(default=0, editable=False)
+    live_class_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = models.Manager()
+    cached = ReferenceManager()
 
     def unique_together(self):
         return ("name", "levels")
@@ -147,23 +188,39 @@ class Subject(models.Model):
 
 
 # Courses (previously called ExtraCurricularActivity)
-class Course(models.Model):
+class Course(OutboxMixin, MaintainedFieldsMixin, models.Model):
     '''
     Represents a course or extra-curricular activity (renamed from ExtraCurricularActivity).
     '''
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="courses", blank=True)
     cost = models.DecimalField(max_digits=8, decimal_places=2, default=0, help_text="Cost to participate in the activity (0 for free)")
     start_time = models.DateTimeField(blank=True, null=True)
     end_time = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to='activity_images/', blank=True, null=True)
+    capacity = models.PositiveIntegerField(blank=True, null=True, help_text="Maximum number of students allowed in this course (optional).")
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of users enrolled (maintained automatically).")
+    # Waitlist tickets: the last ticket handed out and the last one that left the queue (see waitlist.py)
+    waitlist_tail = models.PositiveIntegerField(default=0, editable=False)
+    waitlist_head = models.PositiveIntegerField(default=0, editable=False)
+    # Set when a background deletion starts; the course is hidden from then on
+    pending_deletion_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    maintained_fields = ('waitlist_tail', 'waitlist_head')
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+    cached = CachedManager()
 
     class Meta:
         ordering = ("-start_time",)
         # Keep the original DB table name so migrations and existing DB remain valid
         db_table = 'Course_extracurricularactivity'
+        indexes = [
+            models.Index(fields=['start_time', 'created_at'], name='course_start_created_idx'),
+            models.Index(fields=['created_at'], name='course_created_idx'),
+        ]
 
     def clean(self):
         # Check if both start_time and end_time are provided before comparing
@@ -171,12 +228,70 @@ class Course(models.Model):
             if self.end_time <= self.start_time:
                 raise ValidationError("end_time must be after start_time")
 
+    @property
+    def is_full(self):
+        return self.capacity is not None and self.enrolled_count >= self.capacity
+
+    @property
+    def students(self):
+        """Users actively enrolled in this course"""
+        return User.objects.filter(enrollments__course=self, enrollments__status=Enrollment.Status.ACTIVE)
+
     def __str__(self):
         return self.title
-    
-    
 
-class LiveClass(models.Model):
+
+class EnrollmentQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(status=Enrollment.Status.ACTIVE)
+
+
+class Enrollment(CountedRelationsMixin, models.Model):
+    '''
+    The single record of a student taking a course.
+
+    Rows are never deleted on unenrollment; the status changes instead so the
+    history (and its timestamps) is kept. Only active rows count towards
+    Course.enrolled_count, and that increment enforces Course.capacity.
+    '''
+    class Status(models.TextChoices):
+        ACTIVE = 'active', 'Active'
+        COMPLETED = 'completed', 'Completed'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="enrollments")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="enrollments")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
+    enrolled_at = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = EnrollmentQuerySet.as_manager()
+
+    counted_relations = (('course', 'enrolled_count', 'capacity'),)
+    counted_filter = {'status': Status.ACTIVE}
+
+    class Meta:
+        ordering = ['-enrolled_at']
+        # Both lookups ("students of a course", "courses of a student") are answered from the index alone
+        indexes = [
+            models.Index(fields=['course', 'status', 'user'], name='enrollment_course_status_idx'),
+            models.Index(fields=['user', 'status', 'course'], name='enrollment_user_status_idx'),
+            models.Index(fields=['status', 'enrolled_at'], name='enrollment_status_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'course'],
+                condition=models.Q(status='active'),
+                name='unique_active_enrollment',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.course.title} - {self.get_status_display()}"
+
+
+class LiveClass(OutboxMixin, CountedRelationsMixin, models.Model):
     """
     Represents a scheduled live class (online lecture).
     - host: teacher who created/hosts the class (optional multiple hosts via ManyToMany below)
@@ -198,10 +313,20 @@ class LiveClass(models.Model):
     is_recorded = models.BooleanField(default=False)
     recording_url = models.URLField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     extra = models.JSONField(blank=True, null=True, help_text="Optional metadata (platform, meeting_id, dial-in info, etc.)")
 
+    counted_relations = (('subject', 'live_class_count'), ('hosts', 'live_class_count'))
+
+    objects = models.Manager()
+    cached = CachedManager()
+
     class Meta:
         ordering = ("-start_time",)
+        indexes = [
+            models.Index(fields=['start_time'], name='liveclass_start_idx'),
+            models.Index(fields=['course', 'start_time'], name='liveclass_course_start_idx'),
+        ]
 
     def clean(self):
         # Check if both start_time and end_time are provided before comparing
@@ -227,7 +352,7 @@ class LiveClass(models.Model):
 
 
 
-class Video(models.Model):
+class Video(OutboxMixin, CountedRelationsMixin, models.Model):
     '''
     Represents stored videos related to courses or activities.
     '''
@@ -241,8 +366,18 @@ class Video(models.Model):
     teacher = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="uploaded_videos", limit_choices_to={"role": User.Role.TEACHER}, blank=True, null=True, help_text="Must be a teacher")
     cost = models.DecimalField(max_digits=8, decimal_places=2, default=0, help_text="Cost to access the video (0.00 for free)")
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to='video_thumbnails/', blank=True, null=True)
 
+    counted_relations = (('subject', 'video_count'), ('teacher', 'video_count'))
+
+    objects = models.Manager()
+    cached = CachedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at'], name='video_uploaded_idx'),
+        ]
 
     # if the cost is negative, raise validation error
     def clean(self):
@@ -291,15 +426,21 @@ class PaymentMethod(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = models.Manager()
+    cached = ReferenceManager()
+
     class Meta:
         ordering = ['display_order', 'name']
         verbose_name = 'Payment Method'
         verbose_name_plural = 'Payment Methods'
+        indexes = [
+            models.Index(fields=['display_order', 'name'], name='payment_method_order_idx'),
+        ]
 
     def __str__(self):
         return self.name
     
-class PaymentVerification(models.Model):
+class PaymentVerification(OutboxMixin, models.Model):
     '''
     Represents a payment verification request when a user buys a course.
     User uploads payment proof and admin verifies it.
@@ -370,19 +511,241 @@ class PaymentVerification(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Payment Verification'
         verbose_name_plural = 'Payment Verifications'
+        indexes = [
+            models.Index(fields=['created_at'], name='payment_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='payment_user_created_idx'),
+        ]
 
     def __str__(self):
         status = "Verified" if self.verified else "Pending"
         return f"{self.user.username} - {self.course.title} - {status}"
     
     def verify(self, admin_user, notes=""):
-        """Mark payment as verified"""
+        """Mark payment as verified and enroll the user; returns the EnrollmentOutcome.
+
+        Nothing is changed when the course is full or being deleted, so the payment stays pending.
+        """
         from django.utils import timezone
-        self.verified = True
-        self.verified_by = admin_user
-        self.verified_at = timezone.now()
-        self.verification_notes = notes
-        # Assign course to user
-        self.user.course = self.course
-        self.user.save()
-        self.save()
\ No newline at end of file
+        from .enrollment import EnrollmentOutcome, enroll
+        with transaction.atomic():
+            # Assign course to user (reserves a seat atomically)
+            outcome = enroll(self.user, self.course)
+            if outcome in (EnrollmentOutcome.FULL, EnrollmentOutcome.UNAVAILABLE):
+                return outcome
+            self.verified = True
+            self.verified_by = admin_user
+            self.verified_at = timezone.now()
+            self.verification_notes = notes
+            self.save()
+        events.payment_verified(self)
+        return outcome
+
+
+class DeletionJob(models.Model):
+    """A large cascade being deleted in batches by deletion.py."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    model = models.CharField(max_length=100, help_text="app_label.ModelName of the deleted object")
+    object_pk = models.PositiveBigIntegerField()
+    object_repr = models.CharField(max_length=200)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    total = models.PositiveIntegerField(default=0, help_text="Related rows to remove (estimated when the job starts)")
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Deletion Job'
+        verbose_name_plural = 'Deletion Jobs'
+
+    def __str__(self):
+        return f"{self.object_repr} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Percentage of the related rows removed so far."""
+        if self.status == self.Status.DONE:
+            return 100
+        if not self.total:
+            return 0
+        return min(round(self.deleted * 100 / self.total), 99)
+
+
+class OutboxEvent(models.Model):
+    """One change to a tracked model, written in the same transaction (see outbox.py)."""
+
+    class Action(models.TextChoices):
+        CREATED = "created", "Created"
+        UPDATED = "updated", "Updated"
+        DELETED = "deleted", "Deleted"
+
+    model = models.CharField(max_length=100, help_text="app_label.ModelName of the changed row")
+    object_pk = models.CharField(max_length=64)
+    action = models.CharField(max_length=10, choices=Action.choices)
+    fields = models.JSONField(blank=True, null=True, help_text="Changed fields, when known")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        indexes = [
+            models.Index(fields=['created_at'], name='outbox_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.model} {self.object_pk} {self.action}"
+
+
+class OutboxCheckpoint(models.Model):
+    """How far an outbox consumer has read."""
+
+    name = models.CharField(max_length=100, unique=True)
+    position = models.PositiveBigIntegerField(default=0, help_text="Id of the last event handled")
+    skipped = models.JSONField(default=dict, blank=True, help_text="Missing ids behind the position, looked up again until they expire")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class WaitlistEntry(models.Model):
+    '''
+    A student's place in the queue for a full course.
+
+    Waiting entries hold consecutive tickets starting just after
+    Course.waitlist_head, so an entry's queue position is a subtraction.
+    '''
+    class Status(models.TextChoices):
+        WAITING = 'waiting', 'Waiting'
+        OFFERED = 'offered', 'Seat offered'
+        ENROLLED = 'enrolled', 'Enrolled'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    ACTIVE_STATUSES = (Status.WAITING, Status.OFFERED)
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="waitlist_entries")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="waitlist_entries")
+    payment = models.OneToOneField(
+        PaymentVerification,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="waitlist_entry",
+        help_text="Payment submitted while the course was full"
+    )
+    ticket = models.PositiveIntegerField(editable=False)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    offered_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['course', 'ticket']
+        verbose_name = 'Waitlist Entry'
+        verbose_name_plural = 'Waitlist Entries'
+        indexes = [
+            models.Index(fields=['course', 'status', 'ticket'], name='waitlist_course_queue_idx'),
+            models.Index(fields=['user', 'status'], name='waitlist_user_status_idx'),
+            models.Index(fields=['user', 'created_at'], name='waitlist_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'user'],
+                condition=models.Q(status__in=['waiting', 'offered']),
+                name='unique_active_waitlist_entry',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.course.title} - {self.get_status_display()}"
+
+    @property
+    def position(self):
+        """1 for the next student to be offered a seat, None once out of the queue."""
+        if self.status != self.Status.WAITING:
+            return None
+        return self.ticket - self.course.waitlist_head
+
+
+
+ ###############################
+ # archive (cold) tables: same columns as LiveClass / PaymentVerification, see archive.py
+ ################################
+class ArchivedLiveClass(models.Model):
+    """
+    A live class moved out of the hot table by `manage.py archive_history`.
+    Keeps the primary key it had in LiveClass; relations have no reverse accessor.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    course = models.ForeignKey(Course, related_name="+", on_delete=models.CASCADE, blank=True, null=True)
+    level = models.ForeignKey(AcademicLevel, related_name="+", on_delete=models.CASCADE, blank=True, null=True)
+    subject = models.ForeignKey(Subject, related_name="+", on_delete=models.SET_NULL, null=True, blank=True)
+    hosts = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", blank=True, null=True)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    meeting_url = models.URLField(max_length=500, blank=True, null=True)
+    description = models.TextField(blank=True)
+    is_recorded = models.BooleanField(default=False)
+    recording_url = models.URLField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(blank=True, null=True)
+    extra = models.JSONField(blank=True, null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    hot_model = LiveClass
+
+    class Meta:
+        ordering = ("-start_time",)
+        verbose_name = "Archived Live Class"
+        verbose_name_plural = "Archived Live Classes"
+        indexes = [
+            models.Index(fields=['start_time'], name='archived_liveclass_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.start_time:%Y-%m-%d %H:%M})"
+
+
+class ArchivedPaymentVerification(models.Model):
+    """
+    A verified payment moved out of the hot table by `manage.py archive_history`.
+    Keeps the primary key it had in PaymentVerification.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.PROTECT, related_name="+")
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    transaction_id = models.CharField(max_length=200, blank=True, null=True)
+    payment_proof = models.ImageField(upload_to='payment_proofs/', blank=True, null=True)
+    remarks = models.TextField(blank=True)
+    verified = models.BooleanField(default=False)
+    verified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    verification_notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    verified_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    hot_model = PaymentVerification
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archived Payment Verification'
+        verbose_name_plural = 'Archived Payment Verifications'
+        indexes = [
+            models.Index(fields=['created_at'], name='archived_payment_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.course.title} (archived)"
@@ -0,0 +1,149 @@
+"""
+Read-through per-object cache for hot models, backed by CACHES['default'].
+
+A model opts in with a `cached = CachedManager()` manager (declared after
+`objects`, which stays the default manager):
+
+    Course.cached.get(pk=3)          # one cache hit, or one query then cached
+    Course.cached.get_many([3, 5])   # {pk: instance}, one query for all misses
+
+Rows are loaded through the model's default manager, so anything it hides
+(e.g. courses being deleted) is not served either. Entries are invalidated
+on post_save/post_delete (signals.py) and once more after the transaction
+commits, so a concurrent reader cannot re-cache the old row. Writes that
+bypass signals (queryset.update(), counter increments) must call
+`invalidate()`; settings.OBJECT_CACHE['TIMEOUT'] bounds what slips through.
+
+Every invalidation is also announced on the invalidation bus
+(invalidation.py), so caches kept inside other worker processes drop their
+copies too.
+
+Foreign keys pointing at a cached model read the related object through the
+cache as well (`live_class.course`, `payment.course`, ...), see
+`install_cached_foreign_keys()`.
+
+Cached instances are copies: fine for display and serializers, but load the
+row from the database before editing it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.http import Http404
+
+from . import invalidation
+
+
+def cache_key(model, pk):
+    return f"obj:v{settings.OBJECT_CACHE['VERSION']}:{model._meta.label_lower}:{pk}"
+
+
+def is_cached(model):
+    return isinstance(getattr(model, 'cached', None), CachedManager)
+
+
+def _store(instance):
+    # Drop related objects and prefetches picked up on the way; they have their own entries.
+    instance._state.fields_cache = {}
+    instance.__dict__.pop('_prefetched_objects_cache', None)
+    cache.set(cache_key(type(instance), instance.pk), instance, settings.OBJECT_CACHE['TIMEOUT'])
+
+
+def invalidate(model, pk):
+    """Forget the cached copy of `model` #pk, now and again when the current transaction commits."""
+    invalidate_many(model, [pk])
+
+
+def invalidate_many(model, pks):
+    """Forget the cached copies of `model` rows `pks`, here and (over the invalidation bus) everywhere else."""
+    pks = [pk for pk in pks if pk is not None]
+    if not pks or not is_cached(model):
+        return
+    model.cached.invalidate_many(pks)
+    invalidation.changed(model, pks)
+
+
+@invalidation.subscribe
+def forget_local_copies(model, pks):
+    # The resilient cache backend keeps copies to serve during a Redis outage.
+    if is_cached(model) and hasattr(cache, 'forget_local'):
+        cache.forget_local([cache_key(model, pk) for pk in pks])
+
+
+def delete_now_and_on_commit(delete, keys):
+    delete(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: delete(keys))
+
+
+class CachedManager(models.Manager):
+    """Primary-key lookups served from the cache (see module docstring)."""
+
+    def get(self, *args, **kwargs):
+        pk = kwargs.get('pk', kwargs.get(self.model._meta.pk.attname))
+        if args or len(kwargs) != 1 or pk is None:
+            return self.model._default_manager.get(*args, **kwargs)
+        return self.get_cached(self.model._meta.pk.to_python(pk))
+
+    def get_cached(self, pk):
+        invalidation.listen()
+        instance = cache.get(cache_key(self.model, pk))
+        if instance is None:
+            instance = self.model._default_manager.get(pk=pk)
+            _store(instance)
+        return instance
+
+    def get_many(self, pks):
+        """Return {pk: instance} for the given primary keys; missing rows are left out."""
+        pks = {self.model._meta.pk.to_python(pk) for pk in pks if pk is not None}
+        keys = {cache_key(self.model, pk): pk for pk in pks}
+        found = {keys[key]: instance for key, instance in cache.get_many(list(keys)).items()}
+        missing = pks - found.keys()
+        if missing:
+            for pk, instance in self.model._default_manager.in_bulk(missing).items():
+                _store(instance)
+                found[pk] = instance
+        return found
+
+    def warm(self, limit=None):
+        """Cache the newest `limit` rows (all by default) ahead of the first request; returns how many."""
+        queryset = self.model._default_manager.order_by('-pk')
+        count = 0
+        for instance in (queryset[:limit] if limit else queryset).iterator():
+            _store(instance)
+            count += 1
+        return count
+
+    def invalidate_many(self, pks):
+        keys = [cache_key(self.model, pk) for pk in pks]
+        delete_now_and_on_commit(cache.delete_many, keys)
+
+
+def get_or_404(model, pk, fresh=False):
+    """get_object_or_404() through the cache; `fresh` reads the database (e.g. before an edit)."""
+    try:
+        if fresh or not is_cached(model):
+            return model._default_manager.get(pk=pk)
+        return model.cached.get(pk=pk)
+    except (model.DoesNotExist, ValidationError, ValueError):
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+
+
+class CachedForwardManyToOneDescriptor(ForwardManyToOneDescriptor):
+    """`obj.fk` loads the related object through its model's cache."""
+
+    def get_object(self, instance):
+        try:
+            return self.field.related_model.cached.get(pk=getattr(instance, self.field.attname))
+        except self.field.related_model.DoesNotExist:
+            # Hidden from the default manager; plain FK access still reaches it.
+            return super().get_object(instance)
+
+
+def install_cached_foreign_keys(app_config):
+    """Route every foreign key of the app that targets a cached model's primary key through the cache."""
+    for model in app_config.get_models():
+        for field in model._meta.local_fields:
+            if field.many_to_one and is_cached(field.related_model) and field.target_field.primary_key:
+                setattr(model, field.name, CachedForwardManyToOneDescriptor(field))
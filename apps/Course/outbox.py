@@ -0,0 +1,251 @@
+"""
+Transactional outbox: a change log of the tracked models, written in the
+same transaction as the change itself, for consumers that keep derived data
+(search indexes, caches, sync feeds) up to date asynchronously.
+
+A model is tracked by mixing in OutboxMixin. Every write then adds an
+OutboxEvent row (model, pk, created/updated/deleted, changed fields):
+
+- save() runs in a transaction together with its event,
+- deletes, cascades included, are recorded by the post_delete handler in
+  signals.py, inside the deletion transaction,
+- queryset.update() and bulk_create() go through OutboxQuerySet (installed
+  on every manager of a tracked model by `install()`), which records one
+  event per affected row; bulk_update() is built on update(). Updates of
+  nothing but denormalized counters and other maintained fields (counters.py)
+  are not recorded: they happen on every enrollment or upload and say nothing
+  about the row.
+
+Event ids only grow, so a consumer is a position in the log. `run_consumer()`
+reads the events after its checkpoint in batches and calls `handle(events)`;
+the checkpoint moves in the same transaction, so projections written to this
+database are updated exactly once, others at least once.
+
+An id is taken when the row is inserted but becomes visible at commit, so a
+slow transaction can leave a temporary gap behind the checkpoint. A batch
+stops at a gap until it is OUTBOX['GAP_TIMEOUT'] seconds old, then moves on
+but keeps the missing ids in the checkpoint: every later batch looks them up
+again and hands over the events of transactions that committed since (out
+of order). Ids still missing after OUTBOX['GAP_MAX_AGE'] seconds were rolled
+back and are forgotten.
+
+Consumers are listed in settings.OUTBOX['CONSUMERS'] and run by
+`manage.py consume_outbox`.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+
+# Rows per UPDATE when a queryset update has to be split up by primary key.
+UPDATE_CHUNK = 500
+
+
+def is_tracked(model):
+    return issubclass(model, OutboxMixin)
+
+
+def record(model, pks, action, fields=None):
+    """Add an event per primary key; call inside the transaction making the change."""
+    OutboxEvent = apps.get_model('Course', 'OutboxEvent')
+    fields = sorted(fields) if fields else None
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(model=model._meta.label, object_pk=str(pk), action=action, fields=fields)
+        for pk in pks if pk is not None
+    ])
+
+
+class OutboxMixin:
+    """Record an OutboxEvent with every save() of this model (see module docstring)."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            created = self._state.adding
+            super().save(*args, **kwargs)
+            record(type(self), [self.pk], CREATED if created else UPDATED, kwargs.get('update_fields'))
+
+
+class OutboxQuerySetMixin:
+    """Bulk writes of a tracked model that record their events."""
+
+    def update(self, **kwargs):
+        from .counters import maintained_fields
+
+        if set(kwargs) <= maintained_fields(self.model):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            updated = 0
+            for start in range(0, len(pks), UPDATE_CHUNK):
+                # Still filtered by self: rows that stopped matching meanwhile are left alone.
+                chunk = self.filter(pk__in=pks[start:start + UPDATE_CHUNK])
+                updated += models.QuerySet.update(chunk, **kwargs)
+            record(self.model, pks, UPDATED, kwargs)
+        return updated
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            # Backends that cannot return primary keys (MySQL) leave them unset.
+            record(self.model, [obj.pk for obj in objs], CREATED)
+        return objs
+
+
+class OutboxQuerySet(OutboxQuerySetMixin, models.QuerySet):
+    pass
+
+
+def _outbox_queryset_class(queryset_class):
+    if issubclass(queryset_class, OutboxQuerySetMixin):
+        return queryset_class
+    if queryset_class is models.QuerySet:
+        return OutboxQuerySet
+    return type(f'Outbox{queryset_class.__name__}', (OutboxQuerySetMixin, queryset_class), {})
+
+
+def install(app_config):
+    """Give every manager of the app's tracked models (the base manager too) an outbox-recording queryset."""
+    for model in app_config.get_models():
+        if is_tracked(model):
+            for manager in [*model._meta.managers, model._base_manager]:
+                manager._queryset_class = _outbox_queryset_class(manager._queryset_class)
+
+
+class Consumer:
+    """
+    Base class for outbox consumers.
+
+    Subclasses set `name` (the checkpoint), optionally `models` (labels such
+    as 'Course.Course' to receive; all tracked models by default) and
+    implement `handle(events)`. An exception leaves the checkpoint where it
+    was, so the batch is retried.
+    """
+
+    name = None
+    models = ()
+    batch_size = None
+
+    def handle(self, events):
+        raise NotImplementedError
+
+
+def consumers():
+    """The consumers configured in settings.OUTBOX['CONSUMERS']."""
+    return [import_string(path)() for path in settings.OUTBOX['CONSUMERS']]
+
+
+def _contiguous(events, position, gap_timeout):
+    """The leading events with no recent gap before them, and the ids of the older gaps they skip."""
+    ready, skipped = [], []
+    # A new consumer starts wherever the (possibly pruned) log starts.
+    expected = position + 1 if position or not events else events[0].pk
+    horizon = timezone.now() - timedelta(seconds=gap_timeout)
+    for event in events:
+        if event.pk != expected:
+            if event.created_at > horizon:
+                break
+            skipped.extend(range(expected, event.pk))
+        ready.append(event)
+        expected = event.pk + 1
+    return ready, skipped
+
+
+def _pending_gaps(checkpoint, skipped, found):
+    """The checkpoint's gaps still worth looking up: minus those `found`, plus the new `skipped` ones."""
+    now = time.time()
+    gaps = {int(pk): since for pk, since in checkpoint.skipped.items()}
+    for event in found:
+        gaps.pop(event.pk, None)
+    gaps.update((pk, now) for pk in skipped)
+    oldest = now - settings.OUTBOX['GAP_MAX_AGE']
+    gaps = {pk: since for pk, since in gaps.items() if since >= oldest}
+    if len(gaps) > settings.OUTBOX['MAX_GAPS']:
+        logger.warning(f'Outbox consumer {checkpoint.name} has {len(gaps)} open gaps, forgetting the oldest')
+        gaps = dict(sorted(gaps.items())[-settings.OUTBOX['MAX_GAPS']:])
+    return {str(pk): since for pk, since in gaps.items()}
+
+
+def consume_batch(consumer):
+    """Hand the next batch of events to `consumer`; returns how many were handled."""
+    OutboxEvent = apps.get_model('Course', 'OutboxEvent')
+    OutboxCheckpoint = apps.get_model('Course', 'OutboxCheckpoint')
+    batch_size = consumer.batch_size or settings.OUTBOX['BATCH_SIZE']
+    with transaction.atomic():
+        checkpoint, _ = OutboxCheckpoint.objects.get_or_create(name=consumer.name)
+        checkpoint = OutboxCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        # Events of long transactions that committed after their id was skipped.
+        late = list(OutboxEvent.objects.filter(pk__in=[int(pk) for pk in checkpoint.skipped]).order_by('pk'))
+        events = list(OutboxEvent.objects.filter(pk__gt=checkpoint.position).order_by('pk')[:batch_size])
+        events, skipped = _contiguous(events, checkpoint.position, settings.OUTBOX['GAP_TIMEOUT'])
+        gaps = _pending_gaps(checkpoint, skipped, late)
+        batch = late + events
+        if not batch and gaps == checkpoint.skipped:
+            return 0
+        wanted = [event for event in batch if not consumer.models or event.model in consumer.models]
+        if wanted:
+            consumer.handle(wanted)
+        if events:
+            checkpoint.position = events[-1].pk
+        checkpoint.skipped = gaps
+        checkpoint.save(update_fields=['position', 'skipped', 'updated_at'])
+    return len(batch)
+
+
+def run_consumer(consumer, max_batches=None):
+    """Consume until the consumer has caught up (or `max_batches` ran); returns the number of events."""
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        try:
+            handled = consume_batch(consumer)
+        except Exception:
+            logger.exception(f'Outbox consumer {consumer.name} failed, the batch will be retried')
+            break
+        if not handled:
+            break
+        total += handled
+        batches += 1
+    return total
+
+
+def prune(days=None):
+    """Delete events every consumer has seen and that are older than OUTBOX['RETENTION_DAYS']."""
+    OutboxEvent = apps.get_model('Course', 'OutboxEvent')
+    OutboxCheckpoint = apps.get_model('Course', 'OutboxCheckpoint')
+    names = [consumer.name for consumer in consumers()]
+    positions = dict(OutboxCheckpoint.objects.filter(name__in=names).values_list('name', 'position'))
+    if not names or len(positions) < len(names):
+        # A consumer that never ran still needs everything.
+        return 0
+    days = settings.OUTBOX['RETENTION_DAYS'] if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    # One short transaction per batch (fast deletes: the model has no delete receivers), like deletion.py.
+    from .deletion import delete_in_batches
+
+    return delete_in_batches(OutboxEvent.objects.filter(pk__lte=min(positions.values()), created_at__lt=cutoff).order_by('pk'))
+
+
+class ObjectCacheConsumer(Consumer):
+    """Evict the per-object cache for every change, including writes that skipped signals and invalidate()."""
+
+    name = 'object-cache'
+
+    def handle(self, events):
+        from . import object_cache
+
+        changed = {}
+        for event in events:
+            changed.setdefault(event.model, set()).add(event.object_pk)
+        for label, pks in changed.items():
+            model = apps.get_model(label)
+            object_cache.invalidate_many(model, [model._meta.pk.to_python(pk) for pk in pks])
@@ -0,0 +1,229 @@
+"""
+Minimal publish/subscribe channel shared by the project.
+
+Two backends are available, selected with settings.PUBSUB['BACKEND']:
+- 'redis': Redis PUBLISH/SUBSCRIBE, reaches every worker and server
+- 'local': an in-process stand-in for development and single-process setups
+
+Messages are JSON-serialisable dicts. A subscription is polled with
+get_message(timeout), which returns a (channel, message) tuple or None.
+`asubscribe()` returns the same thing for coroutines (`await
+get_message(timeout)`, `await close()`), waiting on the event loop (redis.asyncio,
+an asyncio.Queue) instead of holding a thread.
+
+Publishing happens on the request path, so the Redis backend publishes with
+short socket timeouts behind a circuit breaker (circuit_breaker.py): while
+Redis is down, messages are dropped at once. Subscribers lose their
+subscription in the same outage and must assume they missed messages
+(see invalidation.py).
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSubscription:
+    def __init__(self, hub, channels):
+        self.hub = hub
+        self.channels = tuple(channels)
+        self.queue = queue.SimpleQueue()
+        hub._register(self)
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def get_message(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub._unregister(self)
+
+
+class AsyncLocalSubscription:
+    def __init__(self, hub, channels):
+        self.hub = hub
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        hub._register(self)
+
+    def put(self, item):
+        # Publishers may run in any thread.
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            # The loop is gone; the subscriber went with it.
+            self.hub._unregister(self)
+
+    async def get_message(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.hub._unregister(self)
+
+
+class LocalPubSub:
+    """In-process stand-in: only subscribers living in the same process receive messages."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def _register(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+
+    def _unregister(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put((channel, message))
+
+    def subscribe(self, *channels):
+        return LocalSubscription(self, channels)
+
+    async def asubscribe(self, *channels):
+        return AsyncLocalSubscription(self, channels)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub, prefix):
+        self.pubsub = pubsub
+        self.prefix = prefix
+
+    def get_message(self, timeout=None):
+        message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout or 0)
+        if message is None:
+            return None
+        channel = message['channel'].decode()[len(self.prefix):]
+        return channel, json.loads(message['data'])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class AsyncRedisSubscription:
+    def __init__(self, client, pubsub, prefix):
+        self.client = client
+        self.pubsub = pubsub
+        self.prefix = prefix
+
+    async def get_message(self, timeout=None):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout or 0)
+        if message is None:
+            return None
+        channel = message['channel'].decode()[len(self.prefix):]
+        return channel, json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisPubSub:
+    def __init__(self, location, prefix, publish_timeout=0.5, failure_threshold=3, reset_timeout=10):
+        import redis
+
+        self.client = redis.Redis.from_url(location)
+        self.publisher = redis.Redis.from_url(
+            location, socket_connect_timeout=publish_timeout, socket_timeout=publish_timeout,
+        )
+        self.location = location
+        self.errors = (redis.RedisError, OSError)
+        self.breaker = CircuitBreaker(f'PubSub {location}', failure_threshold, reset_timeout)
+        self.prefix = prefix
+
+    def publish(self, channel, message):
+        if not self.breaker.allow():
+            return
+        try:
+            self.publisher.publish(self.prefix + channel, json.dumps(message, default=str))
+        except self.errors as exc:
+            self.breaker.record_failure()
+            logger.warning(f'Failed to publish message on channel {channel}: {exc!r}')
+            return
+        self.breaker.record_success()
+
+    def subscribe(self, *channels):
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(*[self.prefix + channel for channel in channels])
+        return RedisSubscription(pubsub, self.prefix)
+
+    async def asubscribe(self, *channels):
+        import redis.asyncio
+
+        # A client per subscription: asyncio connections belong to the event loop that opened them.
+        client = redis.asyncio.Redis.from_url(self.location)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(*[self.prefix + channel for channel in channels])
+        except BaseException:
+            await pubsub.aclose()
+            await client.aclose()
+            raise
+        return AsyncRedisSubscription(client, pubsub, self.prefix)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_pubsub():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'PUBSUB', {})
+                if config.get('BACKEND', 'local') == 'redis':
+                    _backend = RedisPubSub(
+                        config['LOCATION'], config.get('PREFIX', 'cms:'),
+                        publish_timeout=config.get('PUBLISH_TIMEOUT', 0.5),
+                        failure_threshold=config.get('FAILURE_THRESHOLD', 3),
+                        reset_timeout=config.get('RESET_TIMEOUT', 10),
+                    )
+                else:
+                    _backend = LocalPubSub()
+    return _backend
+
+
+def publish(channel, message):
+    """Publish without ever failing the caller; a lost notification is not worth a 500."""
+    try:
+        get_pubsub().publish(channel, message)
+    except Exception:
+        logger.exception(f'Failed to publish message on channel {channel}')
+
+
+def publish_on_commit(channel, message):
+    """Publish once the surrounding transaction commits, so subscribers never see rolled back changes."""
+    transaction.on_commit(lambda: publish(channel, message))
+
+
+def subscribe(*channels):
+    return get_pubsub().subscribe(*channels)
+
+
+async def asubscribe(*channels):
+    return await get_pubsub().asubscribe(*channels)
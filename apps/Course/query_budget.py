@@ -0,0 +1,198 @@
+"""
+Per-view database time budgets.
+
+A view decorated with `@time_budget('<name>')` gets the number of seconds
+configured in settings.QUERY_BUDGET['VIEWS'][name] for all of its queries
+together. A query still running when the budget runs out is aborted:
+
+- SQLite: a progress handler interrupts the statement mid-flight.
+- PostgreSQL / MySQL: statements run with a statement timeout set to what
+  is left of the budget. It is set again only once the previous setting
+  would overshoot the deadline by more than TIMEOUT_SLACK of the budget.
+  Inside a PostgreSQL transaction it is set with SET LOCAL, for every
+  statement, and goes away with the transaction or savepoint (committed or
+  rolled back); a session-level timeout is RESET to the server/role default
+  when the budget ends.
+
+Both are installed on a connection by its first query under the budget and
+undone when the budget ends, so a budget never opens connections the view
+does not use (e.g. to the read replicas). A budget must end at the
+transaction depth it started at, as it does when used as a context manager.
+
+A query that would start after the budget is spent is not run at all. Either
+way QueryBudgetExceeded is raised and a warning with the SQL is logged. A
+budget only cancels once per request: whatever the view does to degrade
+(render the partial results it has, say) runs without one.
+
+If the view does not handle QueryBudgetExceeded itself, the decorator falls
+back to the last good response it cached for the same user and URL
+(`cache_fallback=True`), or to a 503.
+"""
+import hashlib
+import logging
+import sqlite3
+import time
+from contextlib import ExitStack, contextmanager, suppress
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# SQLite runs the progress handler every this many virtual machine instructions.
+SQLITE_PROGRESS_STEPS = 10000
+
+# A statement timeout set for an earlier statement is kept while it stops the
+# next one at most this fraction of the budget past the deadline.
+TIMEOUT_SLACK = 0.1
+
+
+class QueryBudgetExceeded(OperationalError):
+    pass
+
+
+class Budget:
+    def __init__(self, seconds, label):
+        self.seconds = seconds
+        self.label = label
+        self.deadline = time.monotonic() + seconds
+        self.cancelled = False
+        # alias -> (connection, DB-API connection) the budget was applied to
+        self._applied = {}
+        # alias -> (DB-API connection, monotonic time) of the last session-level statement timeout
+        self._timeouts = {}
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def expired(self):
+        return not self.cancelled and self.remaining() <= 0
+
+    def cancel(self, sql, params, reason):
+        self.cancelled = True
+        logger.warning(
+            f'Query budget of {self.seconds:.2f}s exceeded in {self.label} ({reason}) | SQL: {sql} | params: {params}'
+        )
+        return QueryBudgetExceeded(f'{self.label} exceeded its {self.seconds:.2f}s query budget')
+
+    def wrapper(self, connection):
+        vendor = connection.vendor
+
+        def execute(execute, sql, params, many, context):
+            if self.cancelled:
+                return execute(sql, params, many, context)
+            if self.remaining() <= 0:
+                raise self.cancel(sql, params, 'not started')
+            self._apply(connection)
+            if vendor in ('postgresql', 'mysql'):
+                self._set_timeout(connection, context['cursor'].cursor)
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as exc:
+                # Interrupted (SQLite) or cancelled by the statement timeout.
+                if self.remaining() <= 0:
+                    raise self.cancel(sql, params, 'cancelled') from exc
+                raise
+        return execute
+
+    def progress_handler(self):
+        # Non-zero aborts the running SQLite statement with "interrupted".
+        return 1 if self.expired() else 0
+
+    def _apply(self, connection):
+        # Runs inside execute(), so the connection is open.
+        raw = connection.connection
+        if self._applied.get(connection.alias, (None, None))[1] is raw:
+            return
+        if connection.vendor == 'sqlite':
+            raw.set_progress_handler(self.progress_handler, SQLITE_PROGRESS_STEPS)
+        self._applied[connection.alias] = (connection, raw)
+
+    def _set_timeout(self, connection, cursor):
+        milliseconds = max(int(self.remaining() * 1000), 1)
+        if connection.vendor == 'postgresql' and not connection.get_autocommit():
+            # A savepoint rollback would revert it, so it is not reused.
+            cursor.execute(f'SET LOCAL statement_timeout = {milliseconds}')
+            return
+        raw = connection.connection
+        last_raw, set_at = self._timeouts.get(connection.alias, (None, None))
+        now = time.monotonic()
+        # The last timeout was what remained then: it overshoots the deadline by the time since.
+        if last_raw is raw and now - set_at <= self.seconds * TIMEOUT_SLACK:
+            return
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'SET statement_timeout = {milliseconds}')
+        else:
+            cursor.execute(f'SET SESSION max_execution_time = {milliseconds}')
+        self._timeouts[connection.alias] = (raw, now)
+
+    def release(self):
+        """Undo what the budget set on the connections it was used on."""
+        for connection, raw in self._applied.values():
+            if connection.vendor == 'sqlite':
+                with suppress(sqlite3.ProgrammingError):  # closed meanwhile
+                    raw.set_progress_handler(None, 0)
+            elif connection.alias in self._timeouts and self._timeouts[connection.alias][0] is connection.connection:
+                _reset_timeout(connection)
+        self._applied.clear()
+        self._timeouts.clear()
+
+
+@contextmanager
+def query_budget(seconds, label='query budget'):
+    """Apply a time budget to every database connection of this thread that runs a query."""
+    budget = Budget(seconds, label)
+    with ExitStack() as stack:
+        for alias in settings.DATABASES:
+            connection = connections[alias]
+            stack.enter_context(connection.execute_wrapper(budget.wrapper(connection)))
+        stack.callback(budget.release)
+        yield budget
+
+
+def _reset_timeout(connection):
+    """Go back to the server/role default rather than to no timeout at all."""
+    with connection.connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('RESET statement_timeout')
+        else:
+            cursor.execute('SET SESSION max_execution_time = DEFAULT')
+
+
+def _fallback_key(name, request):
+    user_pk = request.user.pk if request.user.is_authenticated else 0
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'budget:{name}:{user_pk}:{path}'
+
+
+def time_budget(name, cache_fallback=False):
+    """Run the view under settings.QUERY_BUDGET['VIEWS'][name] (no budget if unset)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = settings.QUERY_BUDGET
+            seconds = config['VIEWS'].get(name, config.get('DEFAULT'))
+            if not config.get('ENABLED', True) or not seconds:
+                return view(request, *args, **kwargs)
+            key = _fallback_key(name, request) if cache_fallback and request.method == 'GET' else None
+            try:
+                with query_budget(seconds, label=name):
+                    response = view(request, *args, **kwargs)
+            except QueryBudgetExceeded:
+                cached = cache.get(key) if key else None
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                    response['Warning'] = '110 - "Response is stale"'
+                    return response
+                response = HttpResponse('This page is taking too long to load, please retry shortly.', status=503)
+                response['Retry-After'] = str(config.get('RETRY_AFTER', 5))
+                return response
+            if key and response.status_code == 200 and not getattr(response, 'streaming', False):
+                cache.set(key, (response.content, response['Content-Type']), config.get('FALLBACK_TIMEOUT', 3600))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,166 @@
+"""
+Query-result cache for the models listed in settings.QUERY_CACHE['MODELS'].
+
+Pages and API endpoints run the same small queries over and over
+(`PaymentMethod.objects.all()`, streams annotated with their subject count,
+...). Once a model is listed, every queryset of its managers caches its rows
+in CACHES['default'], keyed by the compiled SQL and parameters, so the views
+need no cache code of their own:
+
+    Stream.objects.annotate(subject_count=Count('subjects'))   # cached
+    Stream.objects.filter(...).uncached()                      # always reads the database
+
+Invalidation is per table. Every table has a version token in the cache, and
+the key of a result includes the tokens of all the tables its SQL reads.
+Writes are seen at the SQL level (an execute wrapper on every connection), so
+INSERT/UPDATE/DELETE on a table drops its token, whichever way they were
+issued: save(), queryset.update(), counter increments, raw SQL. The token is
+dropped again when the transaction commits, like object_cache does.
+
+Only queries reading nothing but tables of listed models (and their
+many-to-many tables) are cached, since no other table's writes are tracked.
+Results are always read from the primary: a lagging replica's rows must not
+be stored under the primary's current versions. Requests routed to a
+replica (db_router.py) share the entries and go to the primary on a miss.
+Queries inside a transaction, select_for_update(), reads for a write
+(get_or_create, ...) and related managers always go to the database.
+"""
+import hashlib
+import re
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_WRITE = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)\s+[`"\[]?([\w.]+)',
+    re.IGNORECASE,
+)
+
+_READ = re.compile(r'(?:FROM|JOIN)\s+[`"\[]?(\w+)', re.IGNORECASE)
+
+_tables = None
+
+
+def tracked_tables():
+    """Tables (lowercased) of the listed models and of their many-to-many fields."""
+    global _tables
+    if _tables is None:
+        tables = set()
+        for label in settings.QUERY_CACHE['MODELS']:
+            model = apps.get_model(label)
+            tables.add(model._meta.db_table.lower())
+            tables.update(field.remote_field.through._meta.db_table.lower() for field in model._meta.local_many_to_many)
+        _tables = tables
+    return _tables
+
+
+def _version_key(table):
+    return f"qc:v{settings.QUERY_CACHE['VERSION']}:table:{table.lower()}"
+
+
+def _versions(tables):
+    keys = [_version_key(table) for table in sorted(tables)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            token = uuid.uuid4().hex
+            cache.add(key, token, None)
+            versions[key] = cache.get(key) or token
+    return [versions[key] for key in keys]
+
+
+def invalidate_tables(tables, using='default'):
+    """Drop the cached results reading any of `tables`, now and when the current transaction commits."""
+    keys = [_version_key(table) for table in tables]
+    cache.delete_many(keys)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys), using=using)
+
+
+def _watch_writes(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    match = _WRITE.match(sql) if isinstance(sql, str) else None
+    if match:
+        table = match.group(1).rsplit('.', 1)[-1]
+        if table.lower() in tracked_tables():
+            invalidate_tables([table], context['connection'].alias)
+    return result
+
+
+@receiver(connection_created)
+def watch_connection(sender, connection, **kwargs):
+    # Outermost wrapper, ahead of any pushed by connection.execute_wrapper() blocks.
+    if settings.QUERY_CACHE['ENABLED'] and _watch_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _watch_writes)
+
+
+class QueryCacheMixin:
+    """Serve evaluated querysets from the cache (see module docstring)."""
+
+    _use_query_cache = True
+
+    def uncached(self):
+        clone = self._chain()
+        clone._use_query_cache = False
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._use_query_cache = self._use_query_cache
+        return clone
+
+    def _cache_key(self):
+        if (
+            not self._use_query_cache or self._for_write or self._known_related_objects
+            or self.query.select_for_update or connections[self.db].in_atomic_block
+        ):
+            return None
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        # Subqueries included; `FROM (SELECT ...)` names no table itself.
+        tables = {table.lower() for table in _READ.findall(sql)}
+        if not tables or not tables <= tracked_tables():
+            return None
+        raw = '|'.join([
+            self.model._meta.label, self._iterable_class.__name__, repr(self._fields),
+            sql, repr(params), *_versions(tables),
+        ])
+        return f"qc:v{settings.QUERY_CACHE['VERSION']}:" + hashlib.md5(raw.encode()).hexdigest()
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            key = self._cache_key()
+            if key is not None:
+                rows = cache.get(key)
+                if rows is None:
+                    self._db = DEFAULT_DB_ALIAS
+                    rows = list(self._iterable_class(self))
+                    if len(rows) <= settings.QUERY_CACHE['MAX_ROWS']:
+                        cache.set(key, rows, settings.QUERY_CACHE['TIMEOUT'])
+                self._result_cache = rows
+        super()._fetch_all()
+
+
+def _cached_queryset_class(queryset_class):
+    if issubclass(queryset_class, QueryCacheMixin):
+        return queryset_class
+    return type(f'QueryCache{queryset_class.__name__}', (QueryCacheMixin, queryset_class), {})
+
+
+def install(app_config):
+    """Give the managers of the listed models of this app a result-caching queryset."""
+    if not settings.QUERY_CACHE['ENABLED']:
+        return
+    for label in settings.QUERY_CACHE['MODELS']:
+        model = apps.get_model(label)
+        if model._meta.app_config is app_config:
+            for manager in model._meta.managers:
+                manager._queryset_class = _cached_queryset_class(manager._queryset_class)
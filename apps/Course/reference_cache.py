@@ -0,0 +1,158 @@
+"""
+Two-tier cache for small, rarely changing reference tables (academic levels,
+streams, subjects, payment methods).
+
+These rows are read on nearly every request (the sidebar, forms, `str()` of
+related objects, serializers), so even a Redis round-trip per lookup adds up.
+`tiered` keeps a bounded LRU of values inside each process, in front of the
+shared CACHES['default']:
+
+    get:    local LRU -> shared cache -> compute, filling both on the way back
+    delete: shared cache and local LRU
+
+Other workers drop their local copy when the change reaches them over the
+invalidation bus (invalidation.py). Local entries also expire after
+REFERENCE_CACHE['LOCAL_TIMEOUT'] seconds, which bounds staleness if an
+event is ever lost.
+
+A model opts in with `cached = ReferenceManager()`. Its whole table is cached
+as one entry, so `Model.cached.get(pk=...)`, foreign keys pointing at it
+(object_cache.install_cached_foreign_keys) and `Model.cached.cached_all()`
+are served from process memory. Any change to a row (save, delete, counter
+update, see object_cache.invalidate) drops the table.
+
+Callers get copies of the cached instances and may modify them freely.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import invalidation
+from .object_cache import CachedManager, delete_now_and_on_commit
+
+_MISSING = object()
+
+
+class LocalCache:
+    """Thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TwoTierCache:
+    def __init__(self, shared=cache):
+        config = settings.REFERENCE_CACHE
+        self.shared = shared
+        self.timeout = config['TIMEOUT']
+        self.local = LocalCache(config['LOCAL_MAX_ENTRIES'], config['LOCAL_TIMEOUT'])
+
+    def get_or_set(self, key, compute):
+        invalidation.listen()
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.shared.set(key, value, self.timeout)
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.shared.set(key, value, self.timeout)
+        self.local.set(key, value)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self.shared.delete_many(keys)
+        self.local.delete_many(keys)
+
+
+tiered = TwoTierCache()
+invalidation.on_reset(tiered.local.clear)
+
+
+class ReferenceManager(CachedManager):
+    """Serve a small table from the two-tier cache (see module docstring)."""
+
+    def table_key(self):
+        return f"ref:v{settings.REFERENCE_CACHE['VERSION']}:{self.model._meta.label_lower}"
+
+    def _load(self):
+        # Rows come from the default manager, in its ordering, so hidden rows stay hidden.
+        return {instance.pk: instance for instance in self.model._default_manager.all()}
+
+    def _table(self):
+        return tiered.get_or_set(self.table_key(), self._load)
+
+    def get_cached(self, pk):
+        instance = self._table().get(pk)
+        if instance is None:
+            raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+        return copy.copy(instance)
+
+    def get_many(self, pks):
+        table = self._table()
+        pks = {self.model._meta.pk.to_python(pk) for pk in pks if pk is not None}
+        return {pk: copy.copy(table[pk]) for pk in pks if pk in table}
+
+    def cached_all(self):
+        """Every row, in the model's default ordering."""
+        return [copy.copy(instance) for instance in self._table().values()]
+
+    def warm(self, limit=None):
+        """
+        Reload the whole table into the shared cache; returns the number of rows.
+
+        Only the shared tier: warming runs in its own process (`manage.py
+        warm_caches`), whose LRU dies with it. Each worker fills its own LRU
+        from the shared entry on its first read.
+        """
+        table = self._load()
+        tiered.shared.set(self.table_key(), table, tiered.timeout)
+        return len(table)
+
+    def invalidate_many(self, pks):
+        delete_now_and_on_commit(tiered.delete_many, [self.table_key()])
+
+
+@invalidation.subscribe
+def evict_reference_table(model, pks):
+    if isinstance(getattr(model, 'cached', None), ReferenceManager):
+        tiered.local.delete_many([model.cached.table_key()])
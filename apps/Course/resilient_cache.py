@@ -0,0 +1,280 @@
+"""
+Cache backend that keeps the site up when Redis is slow or down.
+
+CACHES['default'] wraps the real backend (django_redis) in ResilientCache:
+
+    'BACKEND': 'apps.Course.resilient_cache.ResilientCache',
+    'LOCATION': 'redis://...',
+    'OPTIONS': {
+        'PRIMARY_BACKEND': 'django_redis.cache.RedisCache',
+        'PRIMARY_OPTIONS': {...},        # OPTIONS of the wrapped backend
+        'FAILURE_THRESHOLD': 3,          # failures in a row that open the circuit
+        'RESET_TIMEOUT': 10,             # seconds before Redis is tried again
+        'STALE_TIMEOUT': 600,            # how long local copies may be served
+        'STALE_KEY_PREFIXES': ('stats:', ...),  # keys worth a local copy (None: all)
+        'LOCAL_MAX_ENTRIES': 5000,
+    }
+
+Every call goes to Redis through a circuit breaker (circuit_breaker.py).
+Only connection and timeout errors count as an outage; any other error
+(a wrong type, a value that cannot be pickled) is raised to the caller as
+usual. Values of the keys starting with one of STALE_KEY_PREFIXES that are
+read from or written to Redis are also kept in a local in-memory cache;
+other keys (per-row fragments, per-user entries) are not copied, which
+would cost a pickle per hit. When a call fails, or while the circuit is
+open, the local cache answers instead: reads get the last value this
+process saw (possibly stale), writes stay local. After RESET_TIMEOUT one
+call probes Redis again: it first deletes from Redis the keys written or
+deleted during the outage, so no worker reads a value older than its own,
+and the circuit closes once that works.
+
+Short socket timeouts in PRIMARY_OPTIONS keep a slow Redis from blocking
+requests until the circuit opens. `add()` (used as a lock) is never answered
+from a local copy made before the outage, but during an outage it only locks
+within this process.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+from .circuit_breaker import HALF_OPEN, CircuitBreaker
+
+try:
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+except ImportError:  # a primary backend other than Redis
+    RedisConnectionError, RedisTimeoutError = ConnectionError, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Keys to delete from Redis once it is back; beyond this the oldest are dropped.
+MAX_PENDING_DELETES = 10000
+
+OUTAGE_ERRORS = (ConnectionError, TimeoutError, RedisConnectionError, RedisTimeoutError)
+
+
+def is_outage(exc):
+    """Is `exc` a connection or timeout error, possibly wrapped (django_redis' ConnectionInterrupted)?"""
+    while exc is not None:
+        if isinstance(exc, OUTAGE_ERRORS):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+class ResilientCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = dict(params.get('OPTIONS', {}))
+        shared = {name: params[name] for name in ('TIMEOUT', 'KEY_PREFIX', 'VERSION', 'KEY_FUNCTION') if name in params}
+        self.primary = import_string(options.get('PRIMARY_BACKEND', 'django_redis.cache.RedisCache'))(
+            location, {**shared, 'OPTIONS': options.get('PRIMARY_OPTIONS', {})}
+        )
+        self.stale_timeout = options.get('STALE_TIMEOUT', 600)
+        prefixes = options.get('STALE_KEY_PREFIXES')
+        self.stale_key_prefixes = None if prefixes is None else tuple(prefixes)
+        self.local = LocMemCache(
+            f'resilient:{location}',
+            {**shared, 'TIMEOUT': self.stale_timeout, 'OPTIONS': {'MAX_ENTRIES': options.get('LOCAL_MAX_ENTRIES', 5000)}},
+        )
+        self.breaker = CircuitBreaker(
+            f'Cache {location}',
+            failure_threshold=options.get('FAILURE_THRESHOLD', 3),
+            reset_timeout=options.get('RESET_TIMEOUT', 10),
+        )
+        self._pending_deletes = {}
+        self._pending_lock = threading.Lock()
+        self._add_lock = threading.Lock()
+
+    def _call(self, method, *args, **kwargs):
+        """Run `method` on the primary backend; raises Unavailable if it is down."""
+        if not self.breaker.allow():
+            raise Unavailable
+        try:
+            if self.breaker.state == HALF_OPEN:
+                # First call since the outage: catch Redis up before trusting what it returns.
+                self._flush_pending_deletes()
+            result = getattr(self.primary, method)(*args, **kwargs)
+        except Exception as exc:
+            if not is_outage(exc):
+                # Redis answered; the call itself was wrong.
+                self.breaker.record_success()
+                raise
+            self.breaker.record_failure()
+            logger.warning(f'Cache {method}() failed, using the local cache: {exc!r}')
+            raise Unavailable from exc
+        self.breaker.record_success()
+        return result
+
+    def _keeps_copy(self, key):
+        return self.stale_key_prefixes is None or key.startswith(self.stale_key_prefixes)
+
+    def _remember(self, key, value, version):
+        # A copy to serve while Redis is unavailable, for the keys worth one.
+        if self._keeps_copy(key):
+            self.local.set(key, value, self.stale_timeout, version=version)
+        else:
+            # Whatever was written locally during an outage is now older than Redis.
+            self.local.delete(key, version=version)
+
+    def _write_locally(self, key, value, version):
+        # Writes during an outage stay local, whatever the key.
+        self.local.set(key, value, self.stale_timeout, version=version)
+
+    def _defer_delete(self, keys, version):
+        with self._pending_lock:
+            for key in keys:
+                self._pending_deletes.pop((key, version), None)
+                self._pending_deletes[(key, version)] = None
+            while len(self._pending_deletes) > MAX_PENDING_DELETES:
+                del self._pending_deletes[next(iter(self._pending_deletes))]
+
+    def _flush_pending_deletes(self):
+        with self._pending_lock:
+            pending = list(self._pending_deletes)
+        by_version = defaultdict(list)
+        for key, version in pending:
+            by_version[version].append(key)
+        for version, keys in by_version.items():
+            # Raises if Redis is still down; the keys then stay pending.
+            self.primary.delete_many(keys, version=version)
+        with self._pending_lock:
+            for item in pending:
+                self._pending_deletes.pop(item, None)
+        if pending:
+            logger.warning(f'Deleted {len(pending)} key(s) changed while the cache was unavailable')
+
+    def get(self, key, default=None, version=None):
+        try:
+            value = self._call('get', key, _MISSING, version=version)
+        except Unavailable:
+            return self.local.get(key, default, version=version)
+        if value is _MISSING:
+            return default
+        if self._keeps_copy(key):
+            self._remember(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        try:
+            found = self._call('get_many', keys, version=version)
+        except Unavailable:
+            return self.local.get_many(keys, version=version)
+        for key, value in found.items():
+            if self._keeps_copy(key):
+                self._remember(key, value, version)
+        return found
+
+    def has_key(self, key, version=None):
+        try:
+            return self._call('has_key', key, version=version)
+        except Unavailable:
+            return self.local.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            self._call('set', key, value, timeout=timeout, version=version)
+        except Unavailable:
+            self._write_locally(key, value, version)
+            self._defer_delete([key], version)
+        else:
+            self._remember(key, value, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            failed = self._call('set_many', data, timeout=timeout, version=version)
+        except Unavailable:
+            for key, value in data.items():
+                self._write_locally(key, value, version)
+            self._defer_delete(data, version)
+            return []
+        for key, value in data.items():
+            self._remember(key, value, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            added = self._call('add', key, value, timeout=timeout, version=version)
+        except Unavailable:
+            with self._add_lock:
+                with self._pending_lock:
+                    written_during_outage = (key, version) in self._pending_deletes
+                if written_during_outage:
+                    return self.local.add(key, value, timeout=timeout, version=version)
+                # A copy from before the outage would hold the lock forever.
+                self.local.set(key, value, timeout=timeout, version=version)
+                self._defer_delete([key], version)
+                return True
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            return self._call('touch', key, timeout=timeout, version=version)
+        except Unavailable:
+            return self.local.touch(key, timeout=timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        try:
+            value = self._call('incr', key, delta, version=version)
+        except Unavailable:
+            value = self.local.incr(key, delta, version=version)
+            self._defer_delete([key], version)
+            return value
+        self._remember(key, value, version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        try:
+            return self._call('delete', key, version=version)
+        except Unavailable:
+            self._defer_delete([key], version)
+            return False
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many(keys, version=version)
+        try:
+            self._call('delete_many', keys, version=version)
+        except Unavailable:
+            self._defer_delete(keys, version)
+
+    def clear(self):
+        self.local.clear()
+        try:
+            self._call('clear')
+        except Unavailable:
+            logger.error('Cache clear() could not reach the primary cache')
+
+    def close(self, **kwargs):
+        try:
+            self.primary.close(**kwargs)
+        except Exception:
+            logger.exception('Closing the cache connection failed')
+
+    def forget_local(self, keys, version=None):
+        """Drop local copies only, e.g. when another worker changed the data behind them."""
+        self.local.delete_many(keys, version=version)
+
+    def status(self):
+        return {**self.breaker.status(), 'pending_deletes': len(self._pending_deletes)}
+
+    def __getattr__(self, name):
+        # Backend-specific extras (django_redis' lock(), ttl(), delete_pattern(), ...) go straight to Redis.
+        if name == 'primary':
+            raise AttributeError(name)
+        return getattr(self.primary, name)
+
+
+class Unavailable(Exception):
+    pass
+
+
+_MISSING = object()
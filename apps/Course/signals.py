@@ -0,0 +1,82 @@
+"""
+Model signal receivers.
+
+The receivers in the first half concern only some models (counted children,
+cached and outbox-tracked models, parents of SET_NULL children) and are
+connected to those models one by one by `connect()`, from
+CourseConfig.ready(). Connected without a sender they would make every model
+of the project, sessions and admin log entries included, lose Django's
+fast-delete path: each deleted row would be loaded and sent through them.
+"""
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import deletion, object_cache, outbox, waitlist
+from .counters import CountedRelationsMixin
+from .models import PaymentVerification, User, Video
+
+
+def release_counted_relations(sender, instance, **kwargs):
+    # Runs inside the deletion transaction, for cascaded rows as well.
+    instance.release_counted_relations()
+
+
+def invalidate_cached_object(sender, instance, **kwargs):
+    # Evicts the shared entry and announces `model:pk` to every worker (invalidation.py).
+    object_cache.invalidate(sender, instance.pk)
+
+
+def record_deletion(sender, instance, **kwargs):
+    # Runs inside the deletion transaction, like release_counted_relations.
+    outbox.record(sender, [instance.pk], outbox.DELETED)
+
+
+def touch_detached_rows(sender, instance, **kwargs):
+    # SET_NULL / SET_DEFAULT children are updated by the collector without updated_at (deletion.py).
+    deletion.touch_detached_rows(instance)
+
+
+def connect():
+    """Connect the receivers above to the models they concern (see module docstring)."""
+    for model in apps.get_models():
+        if issubclass(model, CountedRelationsMixin) and model.counted_relations:
+            post_delete.connect(release_counted_relations, sender=model)
+        if object_cache.is_cached(model):
+            post_save.connect(invalidate_cached_object, sender=model)
+            post_delete.connect(invalidate_cached_object, sender=model)
+        if outbox.is_tracked(model):
+            post_delete.connect(record_deletion, sender=model)
+        if deletion.detached_relations(model):
+            pre_delete.connect(touch_detached_rows, sender=model)
+
+
+@receiver(pre_delete, sender=PaymentVerification)
+def release_waitlisted_payment(sender, instance, **kwargs):
+    # A withdrawn payment gives up its place in the queue (or its offered seat).
+    waitlist.release_payment(instance)
+
+
+@receiver(pre_delete, sender=User)
+def leave_waitlists(sender, instance, **kwargs):
+    # The user foreign key cascade would delete the entries without closing their gaps in the queues.
+    waitlist.leave_all(instance)
+
+
+@receiver(m2m_changed, sender=Video.stream.through)
+def touch_video_streams(sender, instance, action, reverse, pk_set, **kwargs):
+    # A video's streams are part of its API representation, which is cached per updated_at (apps/api/fragments.py).
+    if reverse and action in ('post_add', 'post_remove'):
+        pks = list(pk_set)
+    elif reverse and action == 'pre_clear':
+        pks = list(instance.videos.values_list('pk', flat=True))
+    elif not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        pks = [instance.pk]
+    else:
+        return
+    now = timezone.now()
+    Video.objects.filter(pk__in=pks).update(updated_at=now)
+    if not reverse:
+        instance.updated_at = now
+    object_cache.invalidate_many(Video, pks)
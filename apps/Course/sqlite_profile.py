@@ -0,0 +1,138 @@
+"""
+Production profile for sites running on SQLite (SQLITE_PROFILE=production).
+
+SQLite allows one writer at a time. With the default rollback journal,
+readers block the writer and a transaction that starts reading and then
+writes can fail at once with "database is locked". The profile fixes both:
+
+- `apply_pragmas()` runs on every new connection: WAL journal (readers and
+  the writer no longer block each other), synchronous=NORMAL (safe with
+  WAL), a memory-mapped read window and a busy timeout so writers from
+  other processes wait for the lock instead of failing.
+- Every transaction (each outermost atomic block, wherever it is opened)
+  starts with BEGIN IMMEDIATE: it takes the database write lock up front,
+  waiting up to the busy timeout, instead of reading under a shared lock
+  and failing when it tries to upgrade it. This serializes all transactional
+  writers, in this process and others; read-only atomic blocks queue
+  behind writers too.
+- `writer` is a single-writer queue for this process. `serialized_write`
+  hands the decorated function to one writer thread, which runs jobs one by
+  one, each in its own transaction, so the hottest writes (enrollment and
+  the waitlist) never even wait on the lock. Calls made while already
+  inside a transaction (or from the writer thread itself) run inline.
+
+With the profile off both are no-ops, so other backends are unaffected.
+"""
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def enabled(conn=connection):
+    return conn.vendor == 'sqlite' and settings.SQLITE_PROFILE == 'production'
+
+
+def apply_pragmas(cursor, pragmas=None):
+    """Run `PRAGMA name=value` for each configured pragma on a DB-API cursor."""
+    for name, value in (settings.SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def _begin_immediate(connection):
+    # Replaces the sqlite backend's plain BEGIN (Django 5.1's transaction_mode='IMMEDIATE').
+    connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if enabled(connection):
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor)
+        connection._start_transaction_under_autocommit = functools.partial(_begin_immediate, connection)
+
+
+class WriteQueue:
+    """
+    Run write jobs one at a time on a dedicated thread.
+
+    `atomic` wraps every job (Django's transaction.atomic by default); pass
+    None to run jobs as they are, e.g. with a raw sqlite3 connection.
+    """
+
+    def __init__(self, name='sqlite-writer', atomic=transaction.atomic):
+        self.name = name
+        self.atomic = atomic
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name=self.name, daemon=True)
+                self._thread.start()
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, func, *args, **kwargs):
+        """Queue `func(*args, **kwargs)`; returns a Future with its result."""
+        future = Future()
+        self._ensure_started()
+        self._jobs.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """Run `func` on the writer thread and wait for its result (inline if that is not possible)."""
+        if self.in_writer() or connection.in_atomic_block:
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def stop(self):
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, func, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.atomic is None:
+                    result = func(*args, **kwargs)
+                else:
+                    with self.atomic():
+                        result = func(*args, **kwargs)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                if self.atomic is not None:
+                    connection.close_if_unusable_or_obsolete()
+        if self.atomic is not None:
+            connection.close()
+
+
+writer = WriteQueue()
+
+
+def serialized_write(func):
+    """Run `func` through the process' single-writer queue when the SQLite profile is on."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled():
+            return func(*args, **kwargs)
+        return writer.run(func, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,236 @@
+"""
+Aggregates behind the admin dashboard, the teacher list and the revenue
+widgets.
+
+Each function scans whole tables, so results are served through
+compute_cache: one worker recomputes a value while the others keep serving
+the previous one. Results are plain dicts of numbers plus a few short lists
+of model instances, small enough to cache, and at most
+settings.STATS_CACHE_TTL seconds old.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .compute_cache import cached_computation
+from .models import AcademicLevel, ArchivedPaymentVerification, Course, Enrollment, LiveClass, PaymentMethod, PaymentVerification, Stream, Subject, User, Video
+
+TTL = settings.STATS_CACHE_TTL
+
+
+def _percentage(part, whole):
+    return round((part / whole * 100) if whole > 0 else 0, 1)
+
+
+def role_counts():
+    return dict(User.objects.values_list('role').annotate(user_count=Count('pk')).order_by())
+
+
+@cached_computation('stats:users', ttl=TTL)
+def user_stats():
+    now = timezone.now()
+    week_ago, month_ago = now - timedelta(days=7), now - timedelta(days=30)
+    counts = role_counts()
+    student_count = counts.get(User.Role.STUDENT, 0)
+    students = User.objects.filter(role=User.Role.STUDENT)
+    enrolled_students = students.filter(pk__in=Enrollment.objects.active().values('user')).count()
+    student_totals = students.aggregate(
+        active=Count('pk', filter=Q(is_active=True)),
+        new_week=Count('pk', filter=Q(date_joined__gte=week_ago)),
+        new_month=Count('pk', filter=Q(date_joined__gte=month_ago)),
+        with_photos=Count('pk', filter=~Q(profile_picture='') & Q(profile_picture__isnull=False)),
+    )
+    return {
+        'total': sum(counts.values()),
+        'admin_count': counts.get(User.Role.ADMIN, 0),
+        'teacher_count': counts.get(User.Role.TEACHER, 0),
+        'student_count': student_count,
+        'enrolled_students_count': enrolled_students,
+        'enrolled_students': enrolled_students,
+        'unenrolled_students': student_count - enrolled_students,
+        'active_students': student_totals['active'],
+        'inactive_students': student_count - student_totals['active'],
+        'new_students_week': student_totals['new_week'],
+        'new_students_month': student_totals['new_month'],
+        'students_with_photos': student_totals['with_photos'],
+        'students_with_photos_percentage': _percentage(student_totals['with_photos'], student_count),
+        'recent_students': list(students.order_by('-date_joined')[:5]),
+        'enrollment_rate': _percentage(enrolled_students, student_count),
+    }
+
+
+@cached_computation('stats:teachers', ttl=TTL)
+def teacher_stats():
+    now = timezone.now()
+    week_ago, month_ago = now - timedelta(days=7), now - timedelta(days=30)
+    teachers = User.objects.filter(role=User.Role.TEACHER)
+    totals = teachers.aggregate(
+        count=Count('pk'),
+        active=Count('pk', filter=Q(is_active=True)),
+        new_week=Count('pk', filter=Q(date_joined__gte=week_ago)),
+        new_month=Count('pk', filter=Q(date_joined__gte=month_ago)),
+        with_photos=Count('pk', filter=~Q(profile_picture='') & Q(profile_picture__isnull=False)),
+    )
+    hosts = LiveClass.objects.filter(hosts__isnull=False).values_list('hosts').annotate(total=Count('pk')).order_by('-total')
+    names = {
+        user.pk: user.get_full_name() or user.username
+        for user in User.objects.filter(pk__in=[pk for pk, _ in hosts[:5]])
+    }
+    return {
+        'teacher_count': totals['count'],
+        'active_teachers': totals['active'],
+        'active_teachers_count': totals['active'],
+        'inactive_teachers': totals['count'] - totals['active'],
+        'new_teachers_week': totals['new_week'],
+        'new_teachers_month': totals['new_month'],
+        'teachers_with_photos': totals['with_photos'],
+        'recent_teachers': list(teachers.order_by('-date_joined')[:3]),
+        'video_counts': dict(teachers.filter(video_count__gt=0).values_list('pk', 'video_count')),
+        'class_counts': dict(teachers.filter(live_class_count__gt=0).values_list('pk', 'live_class_count')),
+        'top_class_hosts': [(names[pk], total) for pk, total in hosts[:5] if pk in names],
+    }
+
+
+@cached_computation('stats:content', ttl=TTL)
+def content_stats():
+    now = timezone.now()
+    week_ago, month_ago = now - timedelta(days=7), now - timedelta(days=30)
+
+    courses = Course.objects.aggregate(
+        total=Count('pk'),
+        free=Count('pk', filter=Q(cost=0)),
+        ongoing=Count('pk', filter=Q(start_time__lte=now, end_time__gte=now)),
+        upcoming=Count('pk', filter=Q(start_time__gt=now)),
+        past=Count('pk', filter=Q(end_time__lt=now)),
+        recent=Count('pk', filter=Q(created_at__gte=week_ago)),
+    )
+
+    levels = list(AcademicLevel.objects.annotate(
+        subject_total=Count('subjects', distinct=True), stream_total=Count('streams', distinct=True),
+    ).order_by('order'))
+    total_capacity = sum(level.capacity for level in levels if level.capacity)
+    level_details = [{
+        'level': level,
+        'student_count': level.student_count,
+        'utilization': round((level.student_count / level.capacity * 100), 1) if level.capacity else 0,
+        'subject_count': level.subject_total,
+        'stream_count': level.stream_total if level.allowed_streams else 0,
+    } for level in levels]
+    student_count = User.objects.filter(role=User.Role.STUDENT).count()
+
+    subjects = Subject.objects.aggregate(
+        total=Count('pk'),
+        with_videos=Count('pk', filter=Q(video_count__gt=0)),
+        with_classes=Count('pk', filter=Q(live_class_count__gt=0)),
+    )
+    videos = Video.objects.aggregate(
+        total=Count('pk'),
+        free=Count('pk', filter=Q(cost=0)),
+        week=Count('pk', filter=Q(uploaded_at__gte=week_ago)),
+        month=Count('pk', filter=Q(uploaded_at__gte=month_ago)),
+    )
+    classes = LiveClass.objects.aggregate(
+        total=Count('pk'),
+        upcoming=Count('pk', filter=Q(start_time__gt=now)),
+        past=Count('pk', filter=Q(end_time__lt=now)),
+        recorded=Count('pk', filter=Q(is_recorded=True)),
+        week=Count('pk', filter=Q(start_time__gte=week_ago, start_time__lte=now)),
+        month=Count('pk', filter=Q(start_time__gte=month_ago, start_time__lte=now)),
+    )
+    live_now = list(LiveClass.objects.filter(start_time__lte=now, end_time__gte=now))
+    stream_count = Stream.objects.count()
+
+    return {
+        'extra_activity_count': courses['total'],
+        'free_courses': courses['free'],
+        'paid_courses': courses['total'] - courses['free'],
+        'ongoing_courses_count': courses['ongoing'],
+        'upcoming_courses_count': courses['upcoming'],
+        'past_courses_count': courses['past'],
+        'recent_courses_count': courses['recent'],
+        'popular_courses': list(Course.objects.order_by('-enrolled_count')[:5]),
+
+        'level_count': len(levels),
+        'total_capacity': total_capacity,
+        'students_by_level': {level.pk: level.student_count for level in levels},
+        'level_details': level_details,
+        'most_populated_levels': sorted(level_details, key=lambda x: x['student_count'], reverse=True)[:3],
+        'levels_with_streams': sum(1 for level in levels if level.allowed_streams),
+        'capacity_utilization': _percentage(student_count, total_capacity),
+
+        'subject_count': subjects['total'],
+        'subjects_with_videos': subjects['with_videos'],
+        'subjects_with_classes': subjects['with_classes'],
+        'subjects_by_level_count': {level.name: level.subject_total for level in levels},
+
+        'video_count': videos['total'],
+        'free_videos_count': videos['free'],
+        'free_videos': videos['free'],
+        'paid_videos': videos['total'] - videos['free'],
+        'recent_videos_count': videos['week'],
+        'videos_this_month_count': videos['month'],
+
+        'live_class_count': classes['total'],
+        'upcoming_classes': list(LiveClass.objects.filter(start_time__gt=now).order_by('start_time')[:5]),
+        'upcoming_classes_count': classes['upcoming'],
+        'live_now': live_now,
+        'live_now_count': len(live_now),
+        'past_classes_count': classes['past'],
+        'recorded_classes_count': classes['recorded'],
+        'classes_this_week_count': classes['week'],
+        'classes_this_month_count': classes['month'],
+
+        'stream_count': stream_count,
+        'total_content_items': courses['total'] + videos['total'] + classes['total'],
+        'total_academic_resources': subjects['total'] + len(levels) + stream_count,
+    }
+
+
+@cached_computation('stats:revenue', ttl=TTL)
+def revenue_stats():
+    now = timezone.now()
+    week_ago, month_ago = now - timedelta(days=7), now - timedelta(days=30)
+    courses = Course.objects.aggregate(total_enrollments=Sum('enrolled_count'), avg_cost=Avg('cost'), max_cost=Max('cost'), min_paid_cost=Min('cost', filter=Q(cost__gt=0)))
+    videos = Video.objects.aggregate(avg_cost=Avg('cost'))
+    # Old verified payments live in the archive (archive.py); both tables count.
+    payments, most_used = Counter(), Counter()
+    for model in (PaymentVerification, ArchivedPaymentVerification):
+        totals = model.objects.aggregate(
+            total=Count('pk'),
+            verified_count=Count('pk', filter=Q(verified=True)),
+            revenue=Sum('amount', filter=Q(verified=True)),
+            pending_revenue=Sum('amount', filter=Q(verified=False)),
+            week=Count('pk', filter=Q(created_at__gte=week_ago)),
+            month=Count('pk', filter=Q(created_at__gte=month_ago)),
+        )
+        payments.update({name: value for name, value in totals.items() if value is not None})
+        most_used.update(dict(
+            model.objects.filter(verified=True)
+            .values_list('payment_method__name').annotate(total=Count('pk')).order_by()
+        ))
+    revenue = payments['revenue']
+    methods = PaymentMethod.objects.aggregate(total=Count('pk'), active=Count('pk', filter=Q(is_active=True)))
+    return {
+        'total_enrollments': courses['total_enrollments'] or 0,
+        'avg_course_cost': round(courses['avg_cost'] or 0, 2),
+        'max_course_cost': courses['max_cost'] or 0,
+        'avg_video_cost': round(videos['avg_cost'] or 0, 2),
+        'payment_methods_count': methods['total'],
+        'active_payment_methods': methods['active'],
+        'total_payments': payments['total'],
+        'pending_payments_count': payments['total'] - payments['verified_count'],
+        'verified_payments_count': payments['verified_count'],
+        'total_revenue': round(revenue, 2),
+        'pending_revenue': round(payments['pending_revenue'], 2),
+        'recent_payments': list(
+            PaymentVerification.objects.select_related('user', 'course', 'payment_method', 'verified_by').order_by('-created_at')[:5]
+        ),
+        'payments_this_week_count': payments['week'],
+        'payments_this_month_count': payments['month'],
+        'most_used_payment_methods': most_used.most_common(3),
+        'avg_payment': round(revenue / payments['verified_count'], 2) if payments['verified_count'] else 0,
+        'verification_rate': _percentage(payments['verified_count'], payments['total']),
+    }
@@ -1,3 +1,1010 @@
-from django.test import TestCase
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.db.models.deletion import Collector
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.api.views import AcademicLevelViewSet
+
+from . import archive, compute_cache, db_router, degraded, deletion, invalidation, object_cache, outbox, sqlite_profile, stats, waitlist
+from .circuit_breaker import CircuitBreaker
+from .counters import find_drift
+from .deletion import PendingDeletion
+from .enrollment import EnrollmentOutcome, enroll, unenroll
+from .forms import PaymentVerificationForm, StreamForm, UserForm
+from .middleware import AdmissionControlMiddleware, ReadReplicaMiddleware
+from .pubsub import LocalPubSub, RedisPubSub
+from .query_budget import Budget, QueryBudgetExceeded, query_budget
+from .resilient_cache import ResilientCache
+from .models import AcademicLevel, Course, Enrollment, OutboxCheckpoint, OutboxEvent, PaymentMethod, PaymentVerification, Stream, Subject, User, Video, WaitlistEntry
+
+
+class AdmissionClassifyTests(TestCase):
+    def setUp(self):
+        self.middleware = AdmissionControlMiddleware(lambda request: None)
+        self.user = User.objects.create_user('client', password='secret')
+
+    def classify(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        request = RequestFactory().get('/api/courses/', **headers)
+        request.user = AnonymousUser()
+        return self.middleware.classify(request)
+
+    def test_anonymous_request_is_api_anon(self):
+        self.assertEqual(self.classify(), 'api_anon')
+
+    def test_junk_authorization_header_gets_no_priority(self):
+        self.assertEqual(self.classify('Bearer not-a-token'), 'api_anon')
+        self.assertEqual(self.classify('Token nope'), 'api_anon')
+        self.assertEqual(self.classify('garbage'), 'api_anon')
+
+    def test_valid_credentials_are_api_auth(self):
+        self.assertEqual(self.classify(f'Token {AccessToken.for_user(self.user)}'), 'api_auth')
+        self.assertEqual(self.classify(f'Token {Token.objects.create(user=self.user).key}'), 'api_auth')
+
+    def test_classifying_runs_no_query(self):
+        with self.assertNumQueries(0):
+            self.classify('Token nope')
+            self.classify(f'Token {"0" * 40}')
+
+
+@override_settings(ADMISSION_CONTROL={
+    'MAX_IN_FLIGHT': 10,
+    'CLASSES': {
+        'api_auth': {'limit': 10, 'queue_timeout': 0},
+        'api_anon': {'limit': 1, 'queue_timeout': 0.05},
+    },
+})
+class AdmissionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('client', password='secret')
+        self.seen = []
+
+    def request(self, authorization=None):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        request = RequestFactory().get('/api/courses/', **headers)
+        request.user = AnonymousUser()
+        return request
+
+    def view(self, request):
+        self.seen.append(dict(self.middleware.in_flight))
+        return HttpResponse()
+
+    def test_junk_token_is_shed_without_a_query(self):
+        self.middleware = AdmissionControlMiddleware(self.view)
+        self.middleware.in_flight['api_anon'] = self.middleware.total_in_flight = 1
+        with self.assertNumQueries(0):
+            self.assertEqual(self.middleware(self.request('Token nope')).status_code, 503)
+
+    def test_unknown_token_is_demoted_after_admission(self):
+        self.middleware = AdmissionControlMiddleware(self.view)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.middleware(self.request(f'Token {"0" * 40}')).status_code, 200)
+        self.assertEqual(self.seen, [{'api_auth': 0, 'api_anon': 1}])
+        self.assertEqual(self.middleware.total_in_flight, 0)
+
+        self.middleware.in_flight['api_anon'] = self.middleware.total_in_flight = 1
+        self.assertEqual(self.middleware(self.request(f'Token {"0" * 40}')).status_code, 503)
+        self.assertEqual(self.middleware.in_flight, {'api_auth': 0, 'api_anon': 1})
+
+    def test_known_token_keeps_its_priority(self):
+        self.middleware = AdmissionControlMiddleware(self.view)
+        key = Token.objects.create(user=self.user).key
+        self.assertEqual(self.middleware(self.request(f'Token {key}')).status_code, 200)
+        self.assertEqual(self.seen, [{'api_auth': 1, 'api_anon': 0}])
+
+    def test_async_requests_wait_without_a_thread(self):
+        async def view(request):
+            return self.view(request)
+
+        self.middleware = AdmissionControlMiddleware(view)
+
+        async def queued():
+            async def finish():
+                await asyncio.sleep(0.01)
+                await self.middleware.arelease('api_anon')
+            finishing = asyncio.ensure_future(finish())
+            response = await self.middleware(self.request())
+            await finishing
+            return response
+
+        self.middleware.in_flight['api_anon'] = self.middleware.total_in_flight = 1
+        with mock.patch.object(self.middleware, 'acquire', side_effect=AssertionError):
+            self.assertEqual(async_to_sync(self.middleware)(self.request()).status_code, 503)
+            self.assertEqual(async_to_sync(queued)().status_code, 200)
+        self.assertEqual(self.middleware.total_in_flight, 0)
+
+
+class LevelCapacityTests(TestCase):
+    def setUp(self):
+        self.level = AcademicLevel.objects.create(name='Grade 10', slug='grade-10', order=10, capacity=1)
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.student = User.objects.create_user('student', password='secret', role='student')
+
+    def form_data(self, **extra):
+        return dict(username='newcomer', email='newcomer@example.com', role='student', academic_level=self.level.pk, **extra)
+
+    def test_form_reports_a_level_filled_after_validation(self):
+        form = UserForm(self.form_data(password='s3cret-Passw0rd', confirm_password='s3cret-Passw0rd'))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.student.academic_level = self.level
+        self.student.save()
+        self.assertIsNone(form.save_within_capacity())
+        self.assertIn('academic_level', form.errors)
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+    def test_admin_rejects_a_full_level_without_crashing(self):
+        User.objects.create_user('other', role='student', academic_level=self.level)
+        self.client.force_login(self.admin)
+        url = reverse('admin:Course_user_change', args=[self.student.pk])
+        data = {
+            'username': 'student', 'role': 'student', 'academic_level': self.level.pk,
+            'date_joined_0': '2024-01-01', 'date_joined_1': '00:00:00',
+            'enrollments-TOTAL_FORMS': '0', 'enrollments-INITIAL_FORMS': '0',
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('academic_level', response.context['adminform'].form.errors)
+        self.student.refresh_from_db()
+        self.assertIsNone(self.student.academic_level_id)
+
+
+class StaleParentSaveTests(TestCase):
+    def test_stale_save_during_enrollment_keeps_the_counter(self):
+        course = Course.objects.create(title='Small course', capacity=2)
+        stale = Course.objects.get(pk=course.pk)
+        students = [User.objects.create_user(f'student-{i}', role='student') for i in range(3)]
+        for student in students[:2]:
+            self.assertEqual(enroll(student, course), EnrollmentOutcome.ENROLLED)
+        stale.title = 'Renamed'
+        stale.save()
+        course.refresh_from_db()
+        self.assertEqual((course.title, course.enrolled_count), ('Renamed', 2))
+        self.assertEqual(enroll(students[2], course), EnrollmentOutcome.FULL)
+        self.assertEqual(course.enrollments.active().count(), 2)
+
+    def test_stale_save_keeps_level_and_teacher_counters(self):
+        level = AcademicLevel.objects.create(name='Grade 9', slug='grade-9', order=9)
+        stale = AcademicLevel.objects.get(pk=level.pk)
+        User.objects.create_user('student', role='student', academic_level=level)
+        stale.save()
+        self.assertEqual(find_drift(), [])
+
+
+class SignalScopeTests(TestCase):
+    def can_fast_delete(self, model):
+        return Collector(using='default').can_fast_delete(model._base_manager.all())
+
+    def test_untracked_models_keep_fast_deletes(self):
+        for model in (Session, LogEntry, OutboxEvent, WaitlistEntry):
+            with self.subTest(model=model):
+                self.assertTrue(self.can_fast_delete(model))
+
+    def test_counted_and_cached_models_still_get_their_receivers(self):
+        self.assertFalse(self.can_fast_delete(Enrollment))
+        course = Course.objects.create(title='Course')
+        student = User.objects.create_user('student', role='student')
+        enroll(student, course)
+        Enrollment.objects.all().delete()
+        course.refresh_from_db()
+        self.assertEqual(course.enrolled_count, 0)
+        self.assertEqual(OutboxEvent.objects.filter(model='Course.Course', action='deleted').count(), 0)
+        course.delete()
+        self.assertEqual(OutboxEvent.objects.filter(model='Course.Course', action='deleted').count(), 1)
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Small course', capacity=1)
+        self.enrolled = User.objects.create_user('enrolled', role='student')
+        enroll(self.enrolled, self.course)
+        self.waiting = [User.objects.create_user(f'waiting-{i}', role='student') for i in range(3)]
+        self.entries = [waitlist.join(user, self.course) for user in self.waiting]
+
+    def positions(self):
+        entries = WaitlistEntry.objects.filter(course=self.course).select_related('course').order_by('pk')
+        return [entry.position for entry in entries]
+
+    def test_queue_is_first_come_first_served(self):
+        self.assertEqual([entry.ticket for entry in self.entries], [1, 2, 3])
+        self.assertEqual(self.positions(), [1, 2, 3])
+        self.assertEqual(waitlist.join(self.waiting[0], self.course), self.entries[0])
+
+    def test_position_is_a_subtraction_after_leaving_and_offers(self):
+        waitlist.leave(self.entries[1])
+        self.assertEqual(self.positions(), [1, None, 2])
+        Course.objects.filter(pk=self.course.pk).update(capacity=2)
+        self.assertEqual(waitlist.offer_free_seats(self.course), [self.entries[0]])
+        self.assertEqual(self.positions(), [None, None, 1])
+        entry = WaitlistEntry.objects.select_related('course').get(pk=self.entries[2].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(entry.position, 1)
+        late = waitlist.join(User.objects.create_user('late', role='student'), self.course)
+        self.assertEqual(self.positions(), [None, None, 1, 2])
+        self.assertEqual(late.ticket, 3)
+
+    def test_a_freed_seat_is_offered_to_the_front_of_the_queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            unenroll(self.enrolled, self.course)
+        statuses = WaitlistEntry.objects.filter(course=self.course).order_by('ticket').values_list('status', flat=True)
+        self.assertEqual(list(statuses), [WaitlistEntry.Status.OFFERED, WaitlistEntry.Status.WAITING, WaitlistEntry.Status.WAITING])
+        self.assertEqual(self.positions(), [None, 1, 2])
+
+    def test_deleting_a_user_closes_their_gap(self):
+        self.waiting[0].delete()
+        self.assertEqual(self.positions(), [1, 2])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.waitlist_tail, 2)
+
+    def test_stale_course_save_keeps_the_tickets(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        waitlist.join(User.objects.create_user('late', role='student'), self.course)
+        stale.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.waitlist_tail, 4)
+
+
+class PendingDeletionTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Going away', capacity=1)
+        self.student = User.objects.create_user('student', role='student')
+
+    def hide(self):
+        Course.all_objects.filter(pk=self.course.pk).update(pending_deletion_at=timezone.now())
+
+    def test_enrolling_in_a_hidden_course_is_refused(self):
+        self.hide()
+        self.assertEqual(enroll(self.student, self.course), EnrollmentOutcome.UNAVAILABLE)
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_joining_the_waitlist_of_a_hidden_course_is_refused(self):
+        self.hide()
+        with self.assertRaises(PendingDeletion):
+            waitlist.join(self.student, self.course)
+
+    def test_payment_for_a_course_hidden_after_validation_is_a_form_error(self):
+        method = PaymentMethod.objects.create(name='Bank', created_by=self.student)
+        form = PaymentVerificationForm({'course': self.course.pk, 'payment_method': method.pk, 'amount': '10'}, user=self.student)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.hide()
+        self.assertIsNone(form.save())
+        self.assertIn('course', form.errors)
+        self.assertFalse(PaymentVerification.objects.exists())
+
+
+class EnrollmentAdminTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title='Small course', capacity=1)
+        self.admin = User.objects.create_superuser('admin', password='secret')
+        self.students = [User.objects.create_user(f'student-{i}', role='student') for i in range(2)]
+        self.client.force_login(self.admin)
+
+    def add(self, student):
+        url = reverse('admin:Course_enrollment_add')
+        return self.client.post(url, {'user': student.pk, 'course': self.course.pk}, follow=True)
+
+    def test_add_enrolls_and_a_full_course_is_a_message(self):
+        self.add(self.students[0])
+        response = self.add(self.students[1])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'is full')
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 1)
+        self.assertEqual(list(self.course.enrollments.active().values_list('user', flat=True)), [self.students[0].pk])
+
+    def test_ending_an_enrollment_unenrolls(self):
+        self.add(self.students[0])
+        enrollment = Enrollment.objects.get()
+        url = reverse('admin:Course_enrollment_change', args=[enrollment.pk])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(url, {'status': Enrollment.Status.CANCELLED})
+        enrollment.refresh_from_db()
+        self.course.refresh_from_db()
+        self.assertEqual(enrollment.status, Enrollment.Status.CANCELLED)
+        self.assertIsNotNone(enrollment.ended_at)
+        self.assertEqual(self.course.enrolled_count, 0)
+        self.assertTrue(callbacks)  # the freed seat is offered to the waitlist
+
+
+class RevenueStatsTests(TestCase):
+    def test_archived_payments_still_count(self):
+        student = User.objects.create_user('student', role='student')
+        course = Course.objects.create(title='Course')
+        method = PaymentMethod.objects.create(name='Bank', created_by=student)
+        for amount in (10, 20):
+            PaymentVerification.objects.create(user=student, course=course, payment_method=method, amount=amount, verified=True)
+        PaymentVerification.objects.create(user=student, course=course, payment_method=method, amount=5)
+        before = stats.revenue_stats.__wrapped__()
+        self.assertEqual(archive.archive(PaymentVerification, days=-1), 2)
+        after = stats.revenue_stats.__wrapped__()
+        for name in ('total_payments', 'verified_payments_count', 'total_revenue', 'pending_revenue', 'most_used_payment_methods'):
+            self.assertEqual(after[name], before[name], name)
+        self.assertEqual(after['total_revenue'], 30)
+        self.assertEqual(after['most_used_payment_methods'], [('Bank', 2)])
+
+
+class FakeClock:
+    """Stands in for the `time` module: time() and monotonic() only move when told to (or on sleep)."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ComputeCacheTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.calls = []
+        for target, value in (('cache', LocMemCache('compute-cache-tests', {})), ('time', self.clock)):
+            patcher = mock.patch.object(compute_cache, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        compute_cache.cache.clear()
+
+    def func(self):
+        self.clock.now += 1  # compute time
+        self.calls.append(self.clock.now)
+        return len(self.calls)
+
+    def read(self, func=None, draw=0.5):
+        with mock.patch.object(compute_cache.random, 'random', return_value=draw):
+            return compute_cache.cache_or_compute('key', func or self.func, ttl=60, stale_ttl=600, beta=1)
+
+    def test_early_refresh_grows_likelier_near_the_expiry(self):
+        self.read()
+        self.clock.now += 50  # 10s before the expiry, 1s of compute time
+        self.assertEqual(self.read(draw=0.5), 1)
+        self.assertEqual(self.read(draw=1 - 1e-6), 2)  # -log(1e-6) ~ 13.8s ahead
+
+        self.clock.now += 59.5  # 0.5s before the new expiry
+        self.assertEqual(self.read(draw=0.5), 3)  # -log(0.5) ~ 0.7s ahead
+
+    def test_one_caller_recomputes_while_the_others_get_the_stale_value(self):
+        self.read()
+        self.clock.now += 61
+        served = []
+
+        def recompute():
+            # Another worker reading while this one holds the lock.
+            served.append(self.read(func=self.func))
+            return self.func()
+
+        self.assertEqual(self.read(func=recompute), 2)
+        self.assertEqual(served, [1])
+        self.assertEqual(len(self.calls), 2)  # the seed and the lock holder's computation
+        self.assertIsNone(compute_cache.cache.get('key:lock'))
+        self.assertEqual(self.read(), 2)
+
+    def test_failed_recomputation_serves_the_previous_value(self):
+        self.read()
+        self.clock.now += 61
+
+        def failing():
+            raise OperationalError('database went away')
+
+        with self.assertLogs('apps.Course.compute_cache', 'ERROR'):
+            self.assertEqual(self.read(func=failing), 1)
+        self.assertIsNone(compute_cache.cache.get('key:lock'))
+        self.assertEqual(self.read(), 2)
+
+    def test_failure_without_a_previous_value_propagates(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.read(func=lambda: 1 / 0)
+        self.assertIsNone(compute_cache.cache.get('key:lock'))
+
+    def test_first_computation_is_awaited_by_the_others(self):
+        compute_cache.cache.add('key:lock', 1)
+        compute_cache.cache.set('key', None)
+
+        def sleep(seconds):
+            self.clock.now += seconds
+            compute_cache.compute('key', self.func, 60, 600)  # the lock holder finishes
+
+        with mock.patch.object(self.clock, 'sleep', sleep):
+            self.assertEqual(self.read(func=lambda: 1 / 0), 1)
+        self.assertEqual(len(self.calls), 1)
+
+
+class ReferenceListingTests(TestCase):
+    def setUp(self):
+        self.level = AcademicLevel.objects.create(name='Grade 10', slug='grade-10', order=10)
+        AcademicLevel.cached.warm()
+
+    def test_form_choices_render_from_the_reference_cache(self):
+        form = StreamForm()
+        with self.assertNumQueries(0):
+            html = str(form['level'])
+        self.assertIn('Grade 10', html)
+
+    def test_narrowed_choices_still_query(self):
+        form = StreamForm()
+        form.fields['level'].queryset = AcademicLevel.objects.exclude(pk=self.level.pk)
+        with self.assertNumQueries(1):
+            html = str(form['level'])
+        self.assertNotIn('Grade 10', html)
+
+    def test_api_list_is_served_from_the_reference_cache(self):
+        response = self.client.get(reverse('api:academic-level-list'))
+        self.assertEqual([level['name'] for level in response.json()], ['Grade 10'])
+
+
+class OutboxTests(TestCase):
+    class Recorder(outbox.Consumer):
+        name = 'test-recorder'
+
+        def __init__(self):
+            self.seen = []
+
+        def handle(self, events):
+            self.seen.extend(event.pk for event in events)
+
+    def event(self, pk, age=0):
+        OutboxEvent.objects.create(pk=pk, model='Course.course', object_pk='1', action='updated')
+        OutboxEvent.objects.filter(pk=pk).update(created_at=timezone.now() - timedelta(seconds=age))
+
+    def test_events_committed_after_their_gap_was_skipped_are_delivered(self):
+        consumer = self.Recorder()
+        self.event(1, age=120)
+        self.event(4, age=120)
+        outbox.consume_batch(consumer)
+        self.assertEqual(consumer.seen, [1, 4])
+        self.event(3)
+        self.event(5)
+        outbox.consume_batch(consumer)
+        self.assertEqual(consumer.seen, [1, 4, 3, 5])
+        checkpoint = OutboxCheckpoint.objects.get(name=consumer.name)
+        self.assertEqual((checkpoint.position, set(checkpoint.skipped)), (5, {'2'}))
+
+    @override_settings(DELETION={**settings.DELETION, 'BATCH_SIZE': 2, 'PAUSE': 0})
+    def test_prune_deletes_seen_events_in_batches(self):
+        OutboxEvent.objects.all().delete()
+        for pk in range(1, 6):
+            self.event(pk, age=10 * 86400)
+        self.event(6)
+        for consumer in outbox.consumers():
+            OutboxCheckpoint.objects.create(name=consumer.name, position=4)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(outbox.prune(days=1), 4)
+        self.assertEqual(list(OutboxEvent.objects.values_list('pk', flat=True)), [5, 6])
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in queries.captured_queries), 2)
+
+    def test_counter_updates_record_no_events(self):
+        course = Course.objects.create(title='Algebra')
+        before = OutboxEvent.objects.count()
+        with self.assertNumQueries(1):
+            Course.objects.filter(pk=course.pk).update(enrolled_count=F('enrolled_count') + 1)
+        self.assertEqual(OutboxEvent.objects.count(), before)
+        Course.objects.filter(pk=course.pk).update(title='Geometry')
+        self.assertEqual(OutboxEvent.objects.count(), before + 1)
+
+
+class DetachedRowsTests(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Physics')
+        self.course = Course.objects.create(title='Mechanics')
+        self.video = Video.objects.create(title='Forces', url='https://example.com/forces', subject=self.subject, course=self.course)
+        self.stale = timezone.now() - timedelta(days=1)
+        Video.objects.filter(pk=self.video.pk).update(updated_at=self.stale)
+
+    def test_set_null_cascade_bumps_updated_at(self):
+        self.subject.delete()
+        self.video.refresh_from_db()
+        self.assertIsNone(self.video.subject_id)
+        self.assertGreater(self.video.updated_at, self.stale)
+
+    @override_settings(DELETION={**settings.DELETION, 'IN_BACKGROUND': False, 'PAUSE': 0})
+    def test_deletion_job_bumps_updated_at(self):
+        deletion.schedule(self.course)
+        self.video.refresh_from_db()
+        self.assertIsNone(self.video.course_id)
+        self.assertGreater(self.video.updated_at, self.stale)
+
+
+class ConcurrentEnrollmentTests(TransactionTestCase):
+    """Parallel enrollers against the guarded counter increment (counters.py)."""
+
+    def test_capacity_holds_and_counters_do_not_drift(self):
+        course = Course.objects.create(title='Small course', capacity=3)
+        students = [User.objects.create_user(f'student-{i}', role='student') for i in range(12)]
+        outcomes = []
+        barrier = threading.Barrier(len(students))
+
+        def worker(student):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        outcomes.append(enroll(student, course))
+                        return
+                    except OperationalError:
+                        # Competing SQLite writers see a locked database; enroll() is atomic.
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(student,)) for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        course.refresh_from_db()
+        # A retry after a lock error past the enrollment's commit reports ALREADY_ENROLLED.
+        self.assertEqual(outcomes.count(EnrollmentOutcome.FULL), 9)
+        self.assertEqual(course.enrollments.active().count(), 3)
+        self.assertEqual(course.enrolled_count, 3)
+        self.assertEqual(find_drift(), [])
+
+
+class QueryBudgetTests(TestCase):
+    SLOW_SQL = 'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM (SELECT i FROM n LIMIT 100000000)'
+
+    def test_slow_query_is_interrupted_and_the_handler_removed(self):
+        with self.assertRaises(QueryBudgetExceeded), query_budget(0.05, label='test'):
+            with connection.cursor() as cursor:
+                cursor.execute(self.SLOW_SQL)
+        self.assertTrue(User.objects.count() >= 0)
+
+    def test_unused_connections_are_not_opened(self):
+        extra = dict(connections.settings['default'], NAME=os.path.join(tempfile.gettempdir(), 'unused.sqlite3'))
+        connections.settings['unused'] = extra
+        self.addCleanup(connections.settings.pop, 'unused')
+        with override_settings(DATABASES=dict(connections.settings)), query_budget(1):
+            User.objects.count()
+        self.assertIsNone(connections['unused'].connection)
+        del connections['unused']
+
+
+class StatementTimeoutTests(TestCase):
+    """The PostgreSQL statement timeout, against a connection that records its SQL."""
+
+    def setUp(self):
+        self.sql = []
+        cursor = mock.MagicMock()
+        cursor.execute.side_effect = self.sql.append
+        cursor.__enter__.return_value = cursor
+        raw = mock.Mock(cursor=mock.Mock(return_value=cursor))
+        self.autocommit = True
+        self.connection = mock.Mock(vendor='postgresql', alias='pg', connection=raw, get_autocommit=lambda: self.autocommit)
+        self.context = {'cursor': mock.Mock(cursor=cursor)}
+        self.now = 100.0
+        patcher = mock.patch('apps.Course.query_budget.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_statements(self, budget, count):
+        execute = budget.wrapper(self.connection)
+        for _ in range(count):
+            execute(lambda sql, *args: self.sql.append(sql), 'SELECT 1', None, False, self.context)
+
+    def test_session_timeout_is_reused_then_reset_to_the_default(self):
+        budget = Budget(10, 'test')
+        self.run_statements(budget, 3)
+        self.now += 2  # past the slack: the old timeout would overshoot by 2s
+        self.run_statements(budget, 1)
+        budget.release()
+        self.assertEqual(self.sql, [
+            'SET statement_timeout = 10000', 'SELECT 1', 'SELECT 1', 'SELECT 1',
+            'SET statement_timeout = 8000', 'SELECT 1', 'RESET statement_timeout',
+        ])
+
+    def test_transactions_use_set_local_and_need_no_reset(self):
+        self.autocommit = False
+        budget = Budget(10, 'test')
+        self.run_statements(budget, 2)
+        budget.release()
+        self.assertEqual(self.sql, ['SET LOCAL statement_timeout = 10000', 'SELECT 1'] * 2)
+
+
+def _failing(name):
+    def method(self, *args, **kwargs):
+        self.calls += 1
+        if self.failure is not None:
+            raise self.failure
+        return getattr(LocMemCache, name)(self, *args, **kwargs)
+    return method
+
+
+class FakeRedis(LocMemCache):
+    """Primary backend for ResilientCache whose calls raise `failure` while it is set."""
+
+    failure = None
+    calls = 0
+
+    get = _failing('get')
+    get_many = _failing('get_many')
+    has_key = _failing('has_key')
+    set = _failing('set')
+    set_many = _failing('set_many')
+    add = _failing('add')
+    incr = _failing('incr')
+    delete = _failing('delete')
+    delete_many = _failing('delete_many')
+
+
+class ResilientCacheTests(TestCase):
+    def setUp(self):
+        self.cache = ResilientCache(f'fake-{uuid.uuid4().hex}', {'OPTIONS': {
+            'PRIMARY_BACKEND': 'apps.Course.tests.FakeRedis',
+            'FAILURE_THRESHOLD': 2,
+            'RESET_TIMEOUT': 60,
+            'STALE_KEY_PREFIXES': ('stats:',),
+        }})
+        self.redis = self.cache.primary
+
+    def outage(self):
+        self.redis.failure = ConnectionInterrupted(connection=None)
+        self.redis.failure.__cause__ = RedisConnectionError('Connection refused')
+
+    def recover(self):
+        self.redis.failure = None
+        self.cache.breaker.reset_timeout = 0
+
+    def test_breaker_opens_after_the_threshold(self):
+        self.outage()
+        self.cache.get('stats:a')
+        self.cache.get('stats:a')
+        self.assertEqual(self.cache.status()['state'], 'open')
+        calls = self.redis.calls
+        self.cache.get('stats:a')
+        self.assertEqual(self.redis.calls, calls)
+
+    def test_other_errors_are_raised_and_do_not_count(self):
+        self.redis.failure = ResponseError('WRONGTYPE')
+        with self.assertRaises(ResponseError):
+            self.cache.get('stats:a')
+        self.assertEqual(self.cache.status()['failures'], 0)
+
+    def test_open_breaker_serves_local_copies_of_listed_keys_only(self):
+        self.cache.set('stats:users', 1)
+        self.cache.set('frag:video:1', 2)
+        self.assertEqual(self.cache.get('stats:users'), 1)
+        self.outage()
+        for _ in range(3):
+            self.assertEqual(self.cache.get('stats:users'), 1)
+            self.assertIsNone(self.cache.get('frag:video:1'))
+        self.assertEqual(self.cache.status()['state'], 'open')
+
+    def test_half_open_probe_deletes_keys_changed_during_the_outage(self):
+        self.cache.set('stats:users', 1)
+        self.outage()
+        self.cache.set('stats:users', 2)
+        self.cache.delete('stats:teachers')
+        self.assertEqual(self.cache.get('stats:users'), 2)  # local, while Redis is down
+        self.assertEqual(self.cache.status()['pending_deletes'], 2)
+        self.recover()
+        self.assertIsNone(self.cache.get('stats:users'))  # the old value is gone from Redis
+        self.assertEqual(self.cache.status()['state'], 'closed')
+        self.assertEqual(self.cache.status()['pending_deletes'], 0)
+
+    def test_add_locks_within_the_process_during_an_outage(self):
+        self.assertTrue(self.cache.add('stats:lock', 1))
+        self.cache.set('stats:lock', 1)  # leaves a local copy from before the outage
+        self.outage()
+        self.assertTrue(self.cache.add('stats:lock', 2))  # the old copy does not hold the lock
+        self.assertFalse(self.cache.add('stats:lock', 3))
+        self.assertEqual(self.cache.get('stats:lock'), 2)
+
+
+class PubSubTests(TestCase):
+    def test_local_subscription_gets_its_channels_only(self):
+        hub = LocalPubSub()
+        subscription = hub.subscribe('user:1', 'public')
+        hub.publish('user:2', {'n': 1})
+        hub.publish('public', {'n': 2})
+        self.assertEqual(subscription.get_message(timeout=0.1), ('public', {'n': 2}))
+        self.assertIsNone(subscription.get_message(timeout=0.01))
+        subscription.close()
+        hub.publish('public', {'n': 3})
+        self.assertIsNone(subscription.get_message(timeout=0.01))
+
+    def test_async_subscription_waits_on_the_event_loop(self):
+        hub = LocalPubSub()
+
+        async def run():
+            subscription = await hub.asubscribe('public')
+            self.assertIsNone(await subscription.get_message(timeout=0.01))
+            # Published from another thread, as request handlers do.
+            publisher = threading.Thread(target=hub.publish, args=('public', {'n': 1}))
+            publisher.start()
+            received = await subscription.get_message(timeout=1)
+            publisher.join()
+            await subscription.close()
+            return received
+
+        self.assertEqual(async_to_sync(run)(), ('public', {'n': 1}))
+        self.assertFalse(any(hub._subscribers.values()))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'degraded-tests'}})
+class DegradedModeTests(TestCase):
+    def setUp(self):
+        AcademicLevel.objects.create(name='Grade 10', slug='grade-10', order=10)
+        self.url = reverse('api:academic-level-list')
+        self.client = Client(raise_request_exception=False)
+        self.breaker = CircuitBreaker('database', failure_threshold=3, reset_timeout=10)
+        patcher = mock.patch.object(degraded, 'breaker', self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+
+    def fail_requests(self, message, count=3):
+        with mock.patch.object(AcademicLevelViewSet, 'list', side_effect=OperationalError(message)):
+            return [self.client.get(self.url) for _ in range(count)]
+
+    def test_lock_timeouts_do_not_open_the_circuit(self):
+        responses = self.fail_requests('database is locked')
+        self.assertEqual([response.status_code for response in responses], [500] * 3)
+        self.assertEqual(self.breaker.status()['state'], 'closed')
+
+    def test_outage_serves_stale_reads_and_refuses_writes(self):
+        fresh = self.client.get(self.url)
+        self.assertEqual(fresh.status_code, 200)
+        with mock.patch.object(degraded, 'database_reachable', return_value=False):
+            responses = self.fail_requests('could not connect to server')
+        self.assertEqual(self.breaker.status()['state'], 'open')
+        self.assertEqual(responses[0]['Warning'], '110 - "Response is stale"')
+        with self.assertNumQueries(0):
+            stale = self.client.get(self.url)
+            write = self.client.post(self.url, {'name': 'Grade 11'})
+        self.assertEqual((stale.status_code, stale.content), (200, fresh.content))
+        self.assertEqual(stale['Warning'], '110 - "Response is stale"')
+        self.assertEqual(write.status_code, 503)
+        self.assertIn('Retry-After', write)
+        self.assertEqual(self.client.get(self.url + '?uncached=1').status_code, 503)
+
+    def test_probe_closes_the_circuit_only_after_reaching_the_database(self):
+        self.client.get(self.url)
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.breaker.opened_at -= 10
+        with mock.patch.object(degraded, 'database_reachable', return_value=False):
+            self.client.get(self.url)  # served without a query: proves nothing
+        self.assertEqual(self.breaker.status()['state'], 'open')
+        self.breaker.opened_at -= 10
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.breaker.status()['state'], 'closed')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'object-cache-tests'}})
+class CachedForeignKeyTests(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.course = Course.objects.create(title='Algebra')
+        self.video = Video.objects.create(title='Lesson 1', description='Fractions', url='https://example.com/1', course=self.course)
+
+    def course_title(self):
+        return Video.objects.get(pk=self.video.pk).course.title
+
+    def test_foreign_key_is_read_through_the_cache(self):
+        self.course_title()
+        with self.assertNumQueries(1):  # the video; its course comes from the cache
+            self.assertEqual(self.course_title(), 'Algebra')
+
+    def test_save_reaches_foreign_key_reads(self):
+        self.course_title()
+        self.course.title = 'Geometry'
+        self.course.save()
+        self.assertEqual(self.course_title(), 'Geometry')
+
+    def test_update_reaches_foreign_key_reads(self):
+        self.course_title()
+        Course.objects.filter(pk=self.course.pk).update(title='Geometry')
+        outbox.consume_batch(outbox.ObjectCacheConsumer())
+        self.assertEqual(self.course_title(), 'Geometry')
+
+    def test_delete_reaches_foreign_key_reads(self):
+        loaded = Video.objects.get(pk=self.video.pk)
+        self.course_title()
+        self.course.delete()
+        with self.assertRaises(Course.DoesNotExist):
+            loaded.course
+
+    def test_edits_start_from_the_database_row(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        stale = Video.objects.get(pk=self.video.pk)
+        stale.uploaded_at -= timedelta(days=30)  # not on the form: a save would write it back
+        object_cache._store(stale)
+        url = reverse('dashboard:video_detail', args=[self.video.pk])
+        self.assertEqual(self.client.get(url).context['object'].uploaded_at, stale.uploaded_at)
+
+        data = {'title': 'Lesson 1b', 'description': 'Fractions', 'url': 'https://example.com/1', 'course': self.course.pk, 'cost': '0'}
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        edited = Video.objects.get(pk=self.video.pk)
+        self.assertEqual((edited.title, edited.uploaded_at), ('Lesson 1b', self.video.uploaded_at))
+
+
+class InvalidationTests(TestCase):
+    def test_only_cached_models_are_announced(self):
+        student = User.objects.create_user('student', role='student')
+        course = Course.objects.create(title='Course')
+        with mock.patch.object(invalidation.pubsub, 'publish_on_commit') as publish:
+            Enrollment.objects.create(user=student, course=course, status=Enrollment.Status.CANCELLED)
+            publish.assert_not_called()
+            course.save()
+            publish.assert_called_once()
+
+    def test_publishing_stops_while_redis_is_down(self):
+        backend = RedisPubSub('redis://127.0.0.1:1/0', 'test:', publish_timeout=0.1, failure_threshold=2, reset_timeout=60)
+        backend.publish('invalidate', {})
+        backend.publish('invalidate', {})
+        self.assertEqual(backend.breaker.status()['state'], 'open')
+        with mock.patch.object(backend.publisher, 'publish') as publish:
+            backend.publish('invalidate', {})
+        publish.assert_not_called()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-cache-tests'}})
+class QueryCacheTests(TransactionTestCase):
+    """Reads outside a transaction: TestCase's own would keep every query out of the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.level = AcademicLevel.objects.create(name='Grade 10', slug='grade-10', order=10)
+        self.subject = Subject.objects.create(name='Physics')
+        self.streams = [Stream.objects.create(name=name, slug=name.lower(), level=self.level) for name in ('Science', 'Arts')]
+        self.subject.streams.add(self.streams[0])
+
+    def names(self, queryset):
+        return list(queryset.values_list('name', flat=True))
+
+    def assertCachedThenRefreshed(self, queryset, write, before, after):
+        self.assertEqual(self.names(queryset), before)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(queryset), before)
+        write()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names(queryset), after)
+
+    def rename(self):
+        self.level.name = 'Grade 11'
+        self.level.save()
+
+    def test_save_invalidates(self):
+        self.assertCachedThenRefreshed(AcademicLevel.objects.all(), self.rename, ['Grade 10'], ['Grade 11'])
+
+    def test_queryset_update_invalidates(self):
+        write = lambda: AcademicLevel.objects.filter(pk=self.level.pk).update(name='Grade 11')
+        self.assertCachedThenRefreshed(AcademicLevel.objects.all(), write, ['Grade 10'], ['Grade 11'])
+
+    def test_many_to_many_add_invalidates(self):
+        write = lambda: self.subject.streams.add(self.streams[1])
+        queryset = Stream.objects.filter(subjects=self.subject).order_by('name')
+        self.assertCachedThenRefreshed(queryset, write, ['Science'], ['Arts', 'Science'])
+
+    def test_raw_update_invalidates(self):
+        def write():
+            with connection.cursor() as cursor:
+                cursor.execute(f'UPDATE "{AcademicLevel._meta.db_table}" SET name = %s', ['Grade 11'])
+        self.assertCachedThenRefreshed(AcademicLevel.objects.all(), write, ['Grade 10'], ['Grade 11'])
+
+    def test_transactions_and_locking_reads_bypass_the_cache(self):
+        self.names(AcademicLevel.objects.all())
+        with transaction.atomic(), self.assertNumQueries(2):
+            self.names(AcademicLevel.objects.all())
+            list(AcademicLevel.objects.select_for_update())
+        self.assertIsNone(AcademicLevel.objects.select_for_update()._cache_key())
+        self.assertIsNotNone(AcademicLevel.objects.all()._cache_key())
+
+
+class SQLiteProfileTests(TransactionTestCase):
+    @override_settings(SQLITE_PROFILE='production')
+    def test_transactions_take_the_write_lock_up_front(self):
+        sqlite_profile.configure_connection(sender=None, connection=connection)
+        self.addCleanup(delattr, connection, '_start_transaction_under_autocommit')
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            User.objects.exists()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """A second SQLite file stands in for the replica, refreshed like `manage.py sync_replica` does."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test databases are set up: the runner neither creates nor flushes it.
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica1'] = dict(connections.settings['default'], NAME=os.path.join(cls.directory.name, 'replica.sqlite3'))
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        overrides = override_settings(DATABASES=dict(connections.settings), DATABASE_REPLICAS=['replica1'])
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        db_router._breakers.clear()
+        Course.objects.create(title='Replicated')
+        self.sync_replica()
+        Course.objects.create(title='Primary only')
+
+    def sync_replica(self):
+        connections['replica1'].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(connections['replica1'].settings_dict['NAME'])
+        connection.connection.backup(target)
+        target.close()
+
+    def request(self, view, method='get', **cookies):
+        request = getattr(RequestFactory(), method)(reverse('dashboard:course_home'))
+        request.COOKIES.update(cookies)
+        request.user = AnonymousUser()
+        response = ReadReplicaMiddleware(lambda request: view(request) or HttpResponse())(request)
+        return response
+
+    def titles(self):
+        return sorted(Course.objects.values_list('title', flat=True))
+
+    def test_safe_requests_read_from_the_replica(self):
+        seen = []
+        self.request(lambda request: seen.append(self.titles()))
+        self.assertEqual(seen, [['Replicated']])
+        self.assertEqual(self.titles(), ['Primary only', 'Replicated'])  # outside a request
+
+    def test_a_write_pins_the_request_and_the_client_to_the_primary(self):
+        seen = []
+
+        def view(request):
+            Course.objects.create(title='Written')
+            seen.append(self.titles())
+
+        response = self.request(view)
+        self.assertEqual(seen, [['Primary only', 'Replicated', 'Written']])
+        self.assertEqual(response.cookies[db_router.PIN_COOKIE].value, '1')
+        self.request(lambda request: seen.append(self.titles()), **{db_router.PIN_COOKIE: '1'})
+        self.assertEqual(seen[-1], ['Primary only', 'Replicated', 'Written'])
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        connections['replica1'].close()
+        connections['replica1'].settings_dict['NAME'] = os.path.join(self.directory.name, 'missing', 'replica.sqlite3')
+        self.addCleanup(connections['replica1'].settings_dict.__setitem__, 'NAME', os.path.join(self.directory.name, 'replica.sqlite3'))
+        seen = []
+        self.request(lambda request: seen.append(self.titles()))
+        self.request(lambda request: seen.append(self.titles()))
+        self.assertEqual(seen, [['Primary only', 'Replicated']] * 2)
+        self.assertEqual(db_router._breaker('replica1').status()['state'], 'open')
+
+    def test_query_cache_never_stores_replica_rows(self):
+        AcademicLevel.objects.create(name='Grade 10', slug='grade-10', order=10)
+        seen = []
+        self.request(lambda request: seen.append(list(AcademicLevel.objects.values_list('name', flat=True))))
+        self.assertEqual(seen, [['Grade 10']])  # not on the replica: the miss was read from the primary
+        self.request(lambda request: seen.append(list(AcademicLevel.objects.values_list('name', flat=True))))
+        self.assertEqual(seen[-1], ['Grade 10'])
@@ -47,6 +47,8 @@ urlpatterns = [
     path('activities/<int:pk>/', views.activity_detail, name='activity_detail'),
     path('activities/<int:pk>/delete/', views.activity_delete, name='activity_delete'),
 
+    path('deletions/<int:pk>/', views.deletion_status, name='deletion_status'),
+
     path('videos/<int:pk>/', views.video_detail, name='video_detail'),
     path('videos/<int:pk>/delete/', views.video_delete, name='video_delete'),
 
@@ -59,9 +59,10 @@ from apps.Course import models
 
 
 def get_all_academic_levels():
-    levels = models.AcademicLevel.objects.all()
-    level_count = levels.count()
-    limited_levels = levels.order_by('-pk')[:3]
+    # Rendered on every page: served from the in-process reference cache, no queries.
+    levels = models.AcademicLevel.cached.cached_all()
+    level_count = len(levels)
+    limited_levels = sorted(levels, key=lambda level: level.pk, reverse=True)[:3]
     # return 0 if capacity_remaining is None else capacity_remaining
     capacity_remaining = [level.capacity_remaining() for level in limited_levels if level.capacity_remaining() is not None]
     context = {
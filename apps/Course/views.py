@@ -23,11 +23,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.urls import reverse
-from django.db.models import Q, Count, Sum, Avg, Max, Min
+from django.db.models import Q, F, Count, Sum, Avg, Max, Min, Prefetch
 from django.utils import timezone
 
-from . import models
+from . import archive, deletion, models, object_cache, stats, waitlist
+from .enrollment import EnrollmentOutcome, unenroll
+from .query_budget import QueryBudgetExceeded, time_budget
 from .models import User, AcademicLevel, Stream, Subject, LiveClass, Course, Video, PaymentMethod, PaymentVerification
 
 # Forms are imported directly from apps.Course.forms (no alias). This keeps
@@ -43,8 +46,7 @@ from .models import User, AcademicLevel, Stream, Subject, LiveClass, Course, Vid
 def add_user(request):
     if request.method == 'POST':
         form = UserForm(request.POST, request.FILES)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save_within_capacity():
             messages.success(request, 'User added successfully!')
             return redirect('dashboard:index')
     else:
@@ -106,8 +108,9 @@ def add_enrollment(request):
         form = form_cls(request.POST)
         if form.is_valid():
             student = form.save()
-            messages.success(request, f'{student.get_full_name() or student.username} has been enrolled in {student.course.title}!')
-            return redirect('dashboard:enrollment_home')
+            if student is not None:
+                messages.success(request, f'{student.get_full_name() or student.username} has been enrolled in {form.cleaned_data["course"].title}!')
+                return redirect('dashboard:enrollment_home')
     else:
         form = form_cls()
 
@@ -136,6 +139,7 @@ def add_activity(request):
         form = CourseForm(request.POST, request.FILES)
         if form.is_valid():
             form.save()
+            warn_turned_away(request, form)
             messages.success(request, 'Activity added successfully!')
             return redirect('dashboard:course_home')
     else:
@@ -162,10 +166,29 @@ def add_video(request):
 
 @login_required
 def subject_list(request):
-    subjects = Subject.objects.all()
+    subjects = Subject.cached.cached_all()
     return render(request, 'dashboard/subjects.html', {'subjects': subjects})
 
 
+def with_active_enrollments(users):
+    """Prefetch each user's active enrollments (with their courses) as `user.active_enrollments`."""
+    return users.prefetch_related(Prefetch(
+        'enrollments',
+        queryset=models.Enrollment.objects.active().select_related('course'),
+        to_attr='active_enrollments',
+    ))
+
+
+def enrolled_user_ids():
+    return models.Enrollment.objects.active().values('user')
+
+
+def warn_turned_away(request, form):
+    if form.turned_away:
+        names = ', '.join(student.username for student in form.turned_away)
+        messages.warning(request, f'The course is full; these students were not enrolled: {names}')
+
+
 # ---------------------------------------------------------------------------
 # Full dashboard views (ported from apps.Course.dashboard_views)
 # Grouped and lightly refactored for readability.
@@ -174,8 +197,8 @@ def subject_list(request):
 
 @login_required
 def course_home_view(request):
-    extra_activities = models.Course.objects.all().prefetch_related('enrolled_students').annotate(
-        participant_count=Count('enrolled_students')
+    extra_activities = models.Course.objects.all().annotate(
+        participant_count=F('enrolled_count')
     ).order_by('-created_at')
     context = {
         'extra_activities': extra_activities,
@@ -191,9 +214,9 @@ def class_level_view(request, level_slug):
     if not level:
         messages.error(request, 'Academic level not found.')
         return redirect('dashboard:index')
-    users = models.User.objects.filter(academic_level=level).select_related('course')
+    users = with_active_enrollments(models.User.objects.filter(academic_level=level))
     total_students = users.filter(role=User.Role.STUDENT).count()
-    enrolled_students = users.filter(role=User.Role.STUDENT, course__isnull=False).count()
+    enrolled_students = users.filter(role=User.Role.STUDENT, pk__in=enrolled_user_ids()).count()
     context = {
         'level': level,
         'level_users': users,
@@ -213,7 +236,7 @@ def subject_list_view(request):
 
 @login_required
 def student_list_view(request):
-    all_users = models.User.objects.select_related('academic_level', 'course').all()
+    all_users = with_active_enrollments(models.User.objects.select_related('academic_level').all())
     queryset_results = all_users.values('role').annotate(user_count=Count('role'))
     role_counts = {item['role']: item['user_count'] for item in queryset_results}
     total_users = sum(role_counts.values())
@@ -222,7 +245,7 @@ def student_list_view(request):
     student_count = role_counts.get(User.Role.STUDENT, 0)
     teachers = [user for user in all_users if user.role == User.Role.TEACHER]
     students = [user for user in all_users if user.role == User.Role.STUDENT]
-    enrolled_students = sum(1 for s in students if s.course is not None)
+    enrolled_students = sum(1 for s in students if s.active_enrollments)
     active_students = sum(1 for s in students if s.is_active)
     context = {
         'total': total_users,
@@ -239,30 +262,17 @@ def student_list_view(request):
 
 @login_required
 def teacher_list_view(request):
-    all_users = User.objects.select_related('academic_level').all()
-    queryset_results = all_users.values('role').annotate(user_count=Count('role'))
-    role_counts = {item['role']: item['user_count'] for item in queryset_results}
-    total_users = sum(role_counts.values())
-    admin_count = role_counts.get(User.Role.ADMIN, 0)
-    teacher_count = role_counts.get(User.Role.TEACHER, 0)
-    student_count = role_counts.get(User.Role.STUDENT, 0)
-    teachers = [user for user in all_users if user.role == User.Role.TEACHER]
-    students = [user for user in all_users if user.role == User.Role.STUDENT]
-    active_teachers = sum(1 for t in teachers if t.is_active)
-    videos_by_teachers = models.Video.objects.filter(teacher__in=[t.id for t in teachers]).values('teacher').annotate(video_count=Count('id'))
-    video_counts = {item['teacher']: item['video_count'] for item in videos_by_teachers}
-    live_classes_by_teachers = models.LiveClass.objects.filter(hosts__in=[t.id for t in teachers]).values('hosts').annotate(class_count=Count('id'))
-    class_counts = {item['hosts']: item['class_count'] for item in live_classes_by_teachers}
+    role_counts = stats.role_counts()
+    teacher_stats = stats.teacher_stats()
     context = {
-        'total': total_users,
-        'admin_count': admin_count,
-        'teacher_count': teacher_count,
-        'student_count': student_count,
-        'teachers': teachers,
-        'students': students,
-        'active_teachers': active_teachers,
-        'video_counts': video_counts,
-        'class_counts': class_counts,
+        'total': sum(role_counts.values()),
+        'admin_count': role_counts.get(User.Role.ADMIN, 0),
+        'teacher_count': role_counts.get(User.Role.TEACHER, 0),
+        'student_count': role_counts.get(User.Role.STUDENT, 0),
+        'teachers': User.objects.filter(role=User.Role.TEACHER).select_related('academic_level'),
+        'active_teachers': teacher_stats['active_teachers'],
+        'video_counts': teacher_stats['video_counts'],
+        'class_counts': teacher_stats['class_counts'],
     }
     return render(request, 'dashboard/teachers.html', context)
 
@@ -283,14 +293,14 @@ def video_list_view(request):
 
 @login_required
 def enrollment_list_view(request):
-    all_students = models.User.objects.filter(role=models.User.Role.STUDENT).select_related('academic_level', 'course').order_by('-date_joined')
-    unenrolled_students = all_students.filter(course__isnull=True)
-    enrolled_students = all_students.filter(course__isnull=False)
+    all_students = with_active_enrollments(models.User.objects.filter(role=models.User.Role.STUDENT).select_related('academic_level').order_by('-date_joined'))
+    unenrolled_students = all_students.exclude(pk__in=enrolled_user_ids())
+    enrolled_students = all_students.filter(pk__in=enrolled_user_ids())
     total_students = all_students.count()
     enrolled_count = enrolled_students.count()
     unenrolled_count = unenrolled_students.count()
     active_enrolled = enrolled_students.filter(is_active=True).count()
-    enrollments_by_course = enrolled_students.values('course__title').annotate(count=Count('id')).order_by('-count')[:5]
+    enrollments_by_course = models.Enrollment.objects.active().filter(user__role=models.User.Role.STUDENT).values('course__title').annotate(count=Count('id')).order_by('-count')[:5]
     context = {
         'all_students': all_students,
         'enrolled_students': enrolled_students,
@@ -313,7 +323,7 @@ def live_classes_view(request):
 
 @login_required
 def payment_method_list(request):
-    payment_methods = models.PaymentMethod.objects.all()
+    payment_methods = models.PaymentMethod.cached.cached_all()
     return render(request, 'dashboard/payment_methods.html', {'payment_methods': payment_methods})
 
 
@@ -388,7 +398,8 @@ def delete_payment_method(request, pk):
 # PAYMENT VERIFICATION VIEWS
 @login_required
 def payment_verification_list(request):
-    unverified_payments = models.PaymentVerification.objects.filter(verified=False).select_related('user', 'course', 'payment_method')
+    # Payments still waiting for a seat stay out of the queue until the waitlist offers them one
+    unverified_payments = models.PaymentVerification.objects.filter(verified=False).exclude(waitlist_entry__status=models.WaitlistEntry.Status.WAITING).select_related('user', 'course', 'payment_method')
     verified_payments = models.PaymentVerification.objects.filter(verified=True).select_related('user', 'course', 'payment_method', 'verified_by')
     context = {'unverified_payments': unverified_payments, 'verified_payments': verified_payments, 'unverified_count': unverified_payments.count(), 'verified_count': verified_payments.count()}
     return render(request, 'dashboard/payment_verifications.html', context)
@@ -398,9 +409,13 @@ def payment_verification_list(request):
 def add_payment_verification(request):
     if request.method == 'POST':
         form = PaymentVerificationForm(request.POST, request.FILES, user=request.user)
-        if form.is_valid():
-            payment_verification = form.save()
-            messages.success(request, f'Payment verification request for "{payment_verification.course.title}" has been submitted successfully. Please wait for admin approval.')
+        payment_verification = form.save() if form.is_valid() else None
+        if payment_verification is not None:
+            entry = waitlist.active_entry(request.user, payment_verification.course)
+            if entry is not None and entry.status == models.WaitlistEntry.Status.WAITING:
+                messages.info(request, f'"{payment_verification.course.title}" is full. You are number {entry.position} on the waitlist; your payment will be reviewed as soon as a seat is offered to you.')
+            else:
+                messages.success(request, f'Payment verification request for "{payment_verification.course.title}" has been submitted successfully. Please wait for admin approval.')
             return redirect('dashboard:my_payment_verifications')
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -413,7 +428,7 @@ def add_payment_verification(request):
 
 @login_required
 def payment_verification_detail(request, pk):
-    payment_verification = get_object_or_404(models.PaymentVerification, pk=pk)
+    payment_verification = archive.get_or_404(models.PaymentVerification, pk)
     return render(request, 'dashboard/payment_verification_detail.html', {'payment_verification': payment_verification, 'object': payment_verification})
 
 
@@ -424,11 +439,17 @@ def verify_payment(request, pk):
         notes = request.POST.get('verification_notes', '')
         action = request.POST.get('action')
         if action == 'approve':
-            payment_verification.verify(request.user, notes)
-            messages.success(request, f'Payment verified successfully. User {payment_verification.user.username} has been enrolled in {payment_verification.course.title}.')
+            outcome = payment_verification.verify(request.user, notes)
+            if outcome == EnrollmentOutcome.FULL:
+                messages.error(request, f'"{payment_verification.course.title}" is full. Payment remains unverified.')
+            elif outcome == EnrollmentOutcome.UNAVAILABLE:
+                messages.error(request, f'"{payment_verification.course.title}" is being deleted. Payment remains unverified.')
+            else:
+                messages.success(request, f'Payment verified successfully. User {payment_verification.user.username} has been enrolled in {payment_verification.course.title}.')
         elif action == 'reject':
             payment_verification.verification_notes = notes
             payment_verification.save()
+            waitlist.release_payment(payment_verification)
             messages.warning(request, 'Payment verification notes updated. Payment remains unverified.')
         return redirect('dashboard:payment_verification_list')
 
@@ -437,7 +458,7 @@ def verify_payment(request, pk):
 
 @login_required
 def my_payment_verifications(request):
-    payment_verifications = models.PaymentVerification.objects.filter(user=request.user).select_related('course', 'payment_method', 'verified_by')
+    payment_verifications = models.PaymentVerification.objects.filter(user=request.user).select_related('course', 'payment_method', 'verified_by', 'waitlist_entry__course')
     return render(request, 'dashboard/my_payment_verifications.html', {'payment_verifications': payment_verifications})
 
 
@@ -461,212 +482,16 @@ def delete_payment_verification(request, pk):
 
 
 @login_required
+@time_budget('dashboard', cache_fallback=True)
 def dashboard_view(request):
-    now = timezone.now()
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-
-    # User statistics
-    all_users = User.objects.select_related('academic_level', 'course').all()
-    queryset_results = all_users.values('role').annotate(user_count=Count('role'))
-    role_counts = {item['role']: item['user_count'] for item in queryset_results}
-    total_users = sum(role_counts.values())
-    admin_count = role_counts.get(User.Role.ADMIN, 0)
-    teacher_count = role_counts.get(User.Role.TEACHER, 0)
-    student_count = role_counts.get(User.Role.STUDENT, 0)
-    teachers = [user for user in all_users if user.role == User.Role.TEACHER]
-    students = [user for user in all_users if user.role == User.Role.STUDENT]
-    enrolled_students = sum(1 for s in students if s.course is not None)
-    unenrolled_students = student_count - enrolled_students
-    active_students = sum(1 for s in students if s.is_active)
-    inactive_students = student_count - active_students
-    active_teachers = sum(1 for t in teachers if t.is_active)
-    inactive_teachers = teacher_count - active_teachers
-    new_students_week = sum(1 for s in students if s.date_joined >= week_ago)
-    new_teachers_week = sum(1 for t in teachers if t.date_joined >= week_ago)
-    new_students_month = sum(1 for s in students if s.date_joined >= month_ago)
-    new_teachers_month = sum(1 for t in teachers if t.date_joined >= month_ago)
-    students_with_photos = sum(1 for s in students if s.profile_picture)
-    teachers_with_photos = sum(1 for t in teachers if t.profile_picture)
-
-    context = {
-        'total': total_users,
-        'admin_count': admin_count,
-        'teacher_count': teacher_count,
-        'student_count': student_count,
-        'teachers': teachers,
-        'students': students,
-        'enrolled_students_count': enrolled_students,
-        'enrolled_students': enrolled_students,
-        'unenrolled_students': unenrolled_students,
-        'active_students': active_students,
-        'inactive_students': inactive_students,
-        'active_teachers_count': active_teachers,
-        'active_teachers': active_teachers,
-        'inactive_teachers': inactive_teachers,
-        'new_students_week': new_students_week,
-        'new_teachers_week': new_teachers_week,
-        'new_students_month': new_students_month,
-        'new_teachers_month': new_teachers_month,
-        'students_with_photos': students_with_photos,
-        'students_with_photos_percentage': round((students_with_photos / student_count * 100) if student_count > 0 else 0, 1),
-        'teachers_with_photos': teachers_with_photos,
-        'recent_students': sorted(students, key=lambda x: x.date_joined, reverse=True)[:5],
-        'recent_teachers': sorted(teachers, key=lambda x: x.date_joined, reverse=True)[:3],
-        'enrollment_rate': round((enrolled_students / student_count * 100) if student_count > 0 else 0, 1),
-    }
-
-    # Courses
-# Courses
-    extra_activities = (
-        models.Course.objects
-        .prefetch_related('enrolled_students')
-        .annotate(participant_count=Count('enrolled_students'))
-        .order_by('-created_at')
-    )
-    
-    # Basic stats
-    total_courses = extra_activities.count()
-    free_courses = extra_activities.filter(cost=0).count()
-    paid_courses = total_courses - free_courses
-    
-    total_course_enrollments = sum(c.participant_count for c in extra_activities)
-    
-    course_revenue_stats = models.Course.objects.aggregate(
-        total_potential=Sum('cost'),
-        avg_cost=Avg('cost'),
-        max_cost=Max('cost'),
-        min_paid_cost=Min('cost', filter=Q(cost__gt=0))
-    )
-    
-    # Ongoing courses: only courses with valid start & end dates
-    ongoing_courses = extra_activities.filter(
-        start_time__isnull=False,
-        end_time__isnull=False,
-        start_time__lte=now,
-        end_time__gte=now
-    )
-    
-    # Upcoming courses: only courses with valid start date
-    upcoming_courses = extra_activities.filter(
-        start_time__isnull=False,
-        start_time__gt=now
-    )
-    
-    # Past courses: only courses with valid end date
-    past_courses = extra_activities.filter(
-        end_time__isnull=False,
-        end_time__lt=now
-    )
-    
-    # Popular courses (top 5 by participant count)
-    popular_courses = sorted(
-        extra_activities,
-        key=lambda x: x.participant_count,
-        reverse=True
-    )[:5]
-    
-    # Recently created courses (within last week)
-    recent_courses = list(
-        extra_activities.filter(created_at__gte=week_ago)
-    )
-    
-    
-
-    context.update({
-        'extra_activities': extra_activities,
-        'extra_activity_count': total_courses,
-        'limited_activities': extra_activities[:3],
-        'free_courses': free_courses,
-        'paid_courses': paid_courses,
-        'total_enrollments': total_course_enrollments,
-        'ongoing_courses_count': len(ongoing_courses),
-        'upcoming_courses_count': len(upcoming_courses),
-        'past_courses_count': len(past_courses),
-        'popular_courses': popular_courses,
-        'recent_courses_count': len(recent_courses),
-        'avg_course_cost': round(course_revenue_stats['avg_cost'] or 0, 2),
-        'max_course_cost': course_revenue_stats['max_cost'] or 0,
-    })
-
-    # Levels
-    levels = models.AcademicLevel.objects.prefetch_related('subjects', 'streams').all().order_by('order')
-    limited_levels = levels[:3]
-    total_capacity = sum(level.capacity for level in levels if level.capacity)
-    students_by_level = {}
-    level_details = []
-    for level in levels:
-        level_students = sum(1 for s in students if s.academic_level == level)
-        students_by_level[level.id] = level_students
-        utilization = round((level_students / level.capacity * 100), 1) if level.capacity else 0
-        level_details.append({'level': level, 'student_count': level_students, 'utilization': utilization, 'subject_count': level.subjects.count(), 'stream_count': level.streams.count() if level.allowed_streams else 0})
-
-    most_populated_levels = sorted(level_details, key=lambda x: x['student_count'], reverse=True)[:3]
-    levels_with_streams = sum(1 for l in levels if l.allowed_streams)
-
-    context.update({'levels': levels, 'level_count': levels.count(), 'limited_levels': limited_levels, 'total_capacity': total_capacity, 'students_by_level': students_by_level, 'level_details': level_details, 'most_populated_levels': most_populated_levels, 'levels_with_streams': levels_with_streams, 'capacity_utilization': round((student_count / total_capacity * 100) if total_capacity > 0 else 0, 1),})
-
-    # Subjects
-    subjects = models.Subject.objects.select_related('levels').prefetch_related('streams').all()
-    subjects_with_videos = models.Subject.objects.annotate(video_count=Count('videos')).filter(video_count__gt=0).count()
-    subjects_with_classes = models.Subject.objects.annotate(class_count=Count('live_classes')).filter(class_count__gt=0).count()
-    subjects_by_level_count = {level.name: subjects.filter(levels=level).count() for level in levels}
-    context.update({'subjects': subjects, 'subject_count': subjects.count(), 'limited_subjects': subjects[:3], 'subjects_with_videos': subjects_with_videos, 'subjects_with_classes': subjects_with_classes, 'subjects_by_level_count': subjects_by_level_count,})
-
-    # Videos
-    videos = models.Video.objects.select_related('subject', 'teacher', 'course', 'level').order_by('-uploaded_at')
-    total_videos = videos.count()
-    free_videos_count = videos.filter(cost=0).count()
-    paid_videos = total_videos - free_videos_count
-    video_revenue_stats = videos.aggregate(total_potential=Sum('cost'), avg_cost=Avg('cost'))
-    context.update({'videos': videos, 'video_count': total_videos, 'limited_videos': videos[:3], 'free_videos_count': free_videos_count, 'free_videos': free_videos_count, 'paid_videos': paid_videos, 'recent_videos_count': len(list(videos.filter(uploaded_at__gte=week_ago))), 'videos_this_month_count': len(list(videos.filter(uploaded_at__gte=month_ago))), 'avg_video_cost': round(video_revenue_stats['avg_cost'] or 0, 2),})
-
-    # Live classes
-    live_classes = models.LiveClass.objects.select_related('subject', 'hosts', 'level', 'course').order_by('start_time')
-    all_classes_list = list(live_classes)
-    upcoming_classes = [lc for lc in all_classes_list if lc.start_time > now]
-    past_classes = [lc for lc in all_classes_list if lc.end_time < now]
-    live_now = [lc for lc in all_classes_list if lc.is_live()]
-    recorded_classes = [lc for lc in all_classes_list if lc.is_recorded]
-    classes_this_week = [lc for lc in all_classes_list if week_ago <= lc.start_time <= now]
-    classes_this_month = [lc for lc in all_classes_list if month_ago <= lc.start_time <= now]
-    classes_by_teacher = {}
-    for lc in all_classes_list:
-        if lc.hosts:
-            teacher_name = lc.hosts.get_full_name() or lc.hosts.username
-            classes_by_teacher[teacher_name] = classes_by_teacher.get(teacher_name, 0) + 1
-    top_class_hosts = sorted(classes_by_teacher.items(), key=lambda x: x[1], reverse=True)[:5]
-    context.update({'live_classes': live_classes, 'live_class_count': live_classes.count(), 'upcoming_classes': upcoming_classes[:5], 'upcoming_classes_count': len(upcoming_classes), 'live_now_count': len(live_now), 'live_now': live_now, 'past_classes_count': len(past_classes), 'recorded_classes_count': len(recorded_classes), 'classes_this_week_count': len(classes_this_week), 'classes_this_month_count': len(classes_this_month), 'top_class_hosts': top_class_hosts,})
-
-    # Streams (used below in system health)
-    streams = models.Stream.objects.select_related('level').annotate(subject_count=Count('subjects')).order_by('-pk')
-    context.update({'streams': streams, 'stream_count': streams.count()})
-
-    # Payments
-    payment_methods = models.PaymentMethod.objects.all()
-    active_payment_methods = payment_methods.filter(is_active=True).count()
-    payments = models.PaymentVerification.objects.select_related('user', 'course', 'payment_method', 'verified_by').all()
-    all_payments_list = list(payments)
-    pending_payments = [p for p in all_payments_list if not p.verified]
-    verified_payments = [p for p in all_payments_list if p.verified]
-    total_revenue = sum(p.amount for p in verified_payments)
-    pending_revenue = sum(p.amount for p in pending_payments)
-    recent_payments = sorted(all_payments_list, key=lambda x: x.created_at, reverse=True)[:5]
-    payments_this_week = [p for p in all_payments_list if p.created_at >= week_ago]
-    payments_this_month = [p for p in all_payments_list if p.created_at >= month_ago]
-    payments_by_method = {}
-    for p in verified_payments:
-        method_name = p.payment_method.name
-        payments_by_method[method_name] = payments_by_method.get(method_name, 0) + 1
-    most_used_payment_methods = sorted(payments_by_method.items(), key=lambda x: x[1], reverse=True)[:3]
-    avg_payment = round(total_revenue / len(verified_payments), 2) if verified_payments else 0
-    context.update({'payment_methods_count': payment_methods.count(), 'active_payment_methods': active_payment_methods, 'total_payments': payments.count(), 'pending_payments_count': len(pending_payments), 'verified_payments_count': len(verified_payments), 'total_revenue': round(total_revenue, 2), 'pending_revenue': round(pending_revenue, 2), 'recent_payments': recent_payments, 'payments_this_week_count': len(payments_this_week), 'payments_this_month_count': len(payments_this_month), 'most_used_payment_methods': most_used_payment_methods, 'avg_payment': avg_payment, 'verification_rate': round((len(verified_payments) / len(all_payments_list) * 100) if all_payments_list else 0, 1),})
+    # Every number here scans whole tables: served from stats.py, recomputed by one worker at a time.
+    users, teachers, content, revenue = stats.user_stats(), stats.teacher_stats(), stats.content_stats(), stats.revenue_stats()
+    context = {**users, **teachers, **content, **revenue}
 
     # System health
-    total_content_items = total_courses + total_videos + live_classes.count()
-    total_academic_resources = subjects.count() + levels.count() + streams.count()
-    data_completeness = round(((students_with_photos + teachers_with_photos) / (student_count + teacher_count) * 100) if (student_count + teacher_count) > 0 else 0, 1)
-    context.update({'total_content_items': total_content_items, 'total_users': total_users, 'total_academic_resources': total_academic_resources, 'data_completeness': data_completeness, 'system_health': {'total_content_items': total_content_items, 'total_users': total_users, 'total_academic_resources': total_academic_resources, 'data_completeness': data_completeness}})
+    people = users['student_count'] + users['teacher_count']
+    data_completeness = round(((users['students_with_photos'] + teachers['teachers_with_photos']) / people * 100) if people > 0 else 0, 1)
+    context.update({'total_users': users['total'], 'data_completeness': data_completeness, 'system_health': {'total_content_items': content['total_content_items'], 'total_users': users['total'], 'total_academic_resources': content['total_academic_resources'], 'data_completeness': data_completeness}})
 
     return render(request, 'dashboard/index.html', context)
 
@@ -705,8 +530,7 @@ def user_detail(request, pk):
     user = get_object_or_404(models.User, pk=pk)
     if request.method == 'POST':
         form = UserForm(request.POST, request.FILES, instance=user)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save_within_capacity():
             messages.success(request, f'User "{user.username}" updated successfully!')
             return redirect('dashboard:user_detail', pk=pk)
         else:
@@ -752,8 +576,8 @@ def level_delete(request, pk):
     level = get_object_or_404(models.AcademicLevel, pk=pk)
     if request.method == 'POST':
         name = level.name
-        level.delete()
-        messages.success(request, f'Level "{name}" deleted successfully!')
+        deletion.schedule(level, request.user)
+        messages.success(request, f'Level "{name}" is being deleted in the background.')
         return redirect('dashboard:index')
     return redirect('dashboard:level_detail', pk=pk)
 
@@ -824,8 +648,7 @@ def enrollment_detail(request, pk):
 def enrollment_delete(request, pk):
     user = get_object_or_404(models.User, pk=pk)
     if request.method == 'POST':
-        user.course = None
-        user.save()
+        unenroll(user)
         messages.success(request, f'{user.get_full_name() or user.username} has been unenrolled!')
         return redirect('dashboard:enrollment_home')
     return redirect('dashboard:user_detail', pk=pk)
@@ -833,7 +656,12 @@ def enrollment_delete(request, pk):
 
 @login_required
 def liveclass_detail(request, pk):
-    live_class = get_object_or_404(models.LiveClass, pk=pk)
+    live_class = archive.get_or_404(models.LiveClass, pk, fresh=request.method != 'GET')
+    if getattr(live_class, 'archived', False):
+        # Archived classes are history: show them, never write them back.
+        messages.info(request, f'Live Class "{live_class.title}" is archived and read-only.')
+        context = {'form': LiveClassForm(instance=live_class), 'item_name': 'Live Class', 'object': live_class, 'read_only': True}
+        return render(request, 'dashboard/detailed.html', context)
     if request.method == 'POST':
         form = LiveClassForm(request.POST, instance=live_class)
         if form.is_valid():
@@ -861,18 +689,19 @@ def liveclass_delete(request, pk):
 
 @login_required
 def activity_detail(request, pk):
-    activity = get_object_or_404(models.Course.objects.prefetch_related('enrolled_students'), pk=pk)
+    activity = object_cache.get_or_404(models.Course, pk, fresh=request.method != 'GET')
     if request.method == 'POST':
         form = CourseForm(request.POST, request.FILES, instance=activity)
         if form.is_valid():
             form.save()
+            warn_turned_away(request, form)
             messages.success(request, f'Activity "{activity.title}" and related videos updated successfully!')
             return redirect('dashboard:activity_detail', pk=pk)
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
         form = CourseForm(instance=activity)
-    enrolled_students = activity.enrolled_students.all().order_by('username')
+    enrolled_students = activity.students.select_related('academic_level').order_by('username')
     context = {'form': form, 'item_name': 'Activity', 'delete_url': reverse('dashboard:activity_delete', args=[pk]), 'object': activity, 'enrolled_students': enrolled_students, 'enrolled_count': enrolled_students.count()}
     return render(request, 'dashboard/detailed.html', context)
 
@@ -882,15 +711,28 @@ def activity_delete(request, pk):
     activity = get_object_or_404(models.Course, pk=pk)
     if request.method == 'POST':
         title = activity.title
-        activity.delete()
-        messages.success(request, f'Activity "{title}" deleted successfully!')
+        deletion.schedule(activity, request.user)
+        messages.success(request, f'Activity "{title}" is being deleted in the background.')
         return redirect('dashboard:course_home')
     return redirect('dashboard:activity_detail', pk=pk)
 
 
+@login_required
+def deletion_status(request, pk):
+    job = get_object_or_404(models.DeletionJob, pk=pk)
+    return JsonResponse({
+        'object': job.object_repr,
+        'status': job.status,
+        'deleted': job.deleted,
+        'total': job.total,
+        'progress': job.progress,
+        'error': job.error,
+    })
+
+
 @login_required
 def video_detail(request, pk):
-    video = get_object_or_404(models.Video, pk=pk)
+    video = object_cache.get_or_404(models.Video, pk, fresh=request.method != 'GET')
     if request.method == 'POST':
         form = VideoForm(request.POST, request.FILES, instance=video)
         if form.is_valid():
@@ -917,6 +759,7 @@ def video_delete(request, pk):
 
 
 @login_required
+@time_budget('global_search')
 def global_search_view(request):
     query = request.GET.get('q', '').strip()
     results = {'query': query, 'users': [], 'students': [], 'teachers': [], 'courses': [], 'subjects': [], 'levels': [], 'streams': [], 'videos': [], 'live_classes': [], 'enrollments': [], 'payment_methods': [], 'payment_verifications': [], 'error': None}
@@ -960,11 +803,14 @@ def global_search_view(request):
         if search_all or search_type == 'live_classes':
             results['live_classes'] = list(models.LiveClass.objects.filter(Q(title__icontains=search_term) | Q(description__icontains=search_term))[:20])
         if search_all or search_type == 'enrollments':
-            results['enrollments'] = list(models.User.objects.filter(Q(username__icontains=search_term) | Q(first_name__icontains=search_term) | Q(last_name__icontains=search_term) | Q(course__title__icontains=search_term), role=models.User.Role.STUDENT, course__isnull=False)[:20])
+            results['enrollments'] = list(models.Enrollment.objects.active().filter(Q(user__username__icontains=search_term) | Q(user__first_name__icontains=search_term) | Q(user__last_name__icontains=search_term) | Q(course__title__icontains=search_term), user__role=models.User.Role.STUDENT).select_related('user__academic_level', 'course')[:20])
         if search_all or search_type == 'payment_methods':
             results['payment_methods'] = list(models.PaymentMethod.objects.filter(Q(name__icontains=search_term) | Q(description__icontains=search_term))[:20])
         if search_all or search_type == 'payment_verifications':
             results['payment_verifications'] = list(models.PaymentVerification.objects.filter(Q(user__username__icontains=search_term) | Q(user__first_name__icontains=search_term) | Q(user__last_name__icontains=search_term) | Q(course__title__icontains=search_term) | Q(payment_method__name__icontains=search_term) | Q(transaction_id__icontains=search_term) | Q(remarks__icontains=search_term) | Q(verification_notes__icontains=search_term)).select_related('user', 'course', 'payment_method', 'verified_by')[:20])
+    except QueryBudgetExceeded:
+        # Keep whatever categories were found before the budget ran out.
+        results['partial'] = True
     except Exception as e:
         results['error'] = f"An error occurred during search: {str(e)}"
         import traceback
@@ -0,0 +1,129 @@
+"""
+Per-course waitlists for courses with a capacity.
+
+Payments for a course with a capacity queue for a seat here. A payment is
+offered a seat straight away while the course has room (offered seats count
+as taken); otherwise it waits, and stays out of the admin's payment queue
+until a seat is offered. Each course hands out increasing tickets
+(Course.waitlist_tail); Course.waitlist_head is the ticket of the last entry
+that left the front of the queue, and waiting entries always hold the
+consecutive tickets in between. A student's position is therefore
+`ticket - waitlist_head`: one row read, no counting.
+
+When seats free up (an unenrollment, a rejected or withdrawn payment) the
+front entries are offered them: their payments move into the admin queue and
+the students are notified over the event stream.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import events, object_cache
+from .deletion import PendingDeletion
+from .models import Course, WaitlistEntry
+from .sqlite_profile import serialized_write
+
+Status = WaitlistEntry.Status
+
+
+def _lock_course(course):
+    # _base_manager: a course being deleted in the background is hidden from Course.objects.
+    return Course._base_manager.select_for_update().get(pk=course.pk)
+
+
+def _free_seats(course):
+    if course.capacity is None:
+        return None
+    offered = WaitlistEntry.objects.filter(course=course, status=Status.OFFERED).count()
+    return course.capacity - course.enrolled_count - offered
+
+
+def active_entry(user, course):
+    return WaitlistEntry.objects.filter(user=user, course=course, status__in=WaitlistEntry.ACTIVE_STATUSES).first()
+
+
+@serialized_write
+def join(user, course, payment=None):
+    """Put `user` at the back of the queue for `course` (or return their existing entry); PendingDeletion for a hidden course."""
+    with transaction.atomic():
+        if _lock_course(course).pending_deletion_at is not None:
+            raise PendingDeletion(Course, course.pk)
+        entry = active_entry(user, course)
+        if entry is not None:
+            return entry
+        # The UPDATE serialises concurrent joiners, so every entry gets its own ticket.
+        Course._base_manager.filter(pk=course.pk).update(waitlist_tail=F('waitlist_tail') + 1)
+        object_cache.invalidate(Course, course.pk)
+        ticket = Course._base_manager.values_list('waitlist_tail', flat=True).get(pk=course.pk)
+        return WaitlistEntry.objects.create(course=course, user=user, payment=payment, ticket=ticket)
+
+
+@serialized_write
+def offer_free_seats(course):
+    """Offer every free seat of `course` to the front of its queue; returns the offered entries."""
+    with transaction.atomic():
+        course = _lock_course(course)
+        if course.pending_deletion_at is not None:
+            return []
+        free = _free_seats(course)
+        waiting = WaitlistEntry.objects.filter(course=course, status=Status.WAITING).order_by('ticket')
+        if free is not None:
+            waiting = waiting[:max(free, 0)]
+        entries = list(waiting.select_related('course'))
+        if not entries:
+            return []
+        now = timezone.now()
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in entries]).update(status=Status.OFFERED, offered_at=now)
+        Course._base_manager.filter(pk=course.pk).update(waitlist_head=entries[-1].ticket)
+        object_cache.invalidate(Course, course.pk)
+        for entry in entries:
+            entry.status, entry.offered_at = Status.OFFERED, now
+            events.waitlist_offered(entry)
+    return entries
+
+
+@serialized_write
+def leave(entry, status=Status.CANCELLED):
+    """Take `entry` out of the queue, closing the gap it leaves behind."""
+    with transaction.atomic():
+        _lock_course(entry.course)
+        # Re-read: the ticket may have moved up since `entry` was loaded.
+        previous, ticket = WaitlistEntry.objects.filter(pk=entry.pk).values_list('status', 'ticket').first() or (None, None)
+        if previous not in WaitlistEntry.ACTIVE_STATUSES:
+            return
+        WaitlistEntry.objects.filter(pk=entry.pk).update(status=status)
+        entry.status = status
+        if previous == Status.WAITING:
+            # Everyone behind moves up one place, so positions stay a plain subtraction.
+            WaitlistEntry.objects.filter(
+                course=entry.course_id, status=Status.WAITING, ticket__gt=ticket
+            ).update(ticket=F('ticket') - 1)
+            Course._base_manager.filter(pk=entry.course_id).update(waitlist_tail=F('waitlist_tail') - 1)
+            object_cache.invalidate(Course, entry.course_id)
+        elif status == Status.CANCELLED:
+            # A declined offer frees the seat it was holding.
+            offer_seats_on_commit(entry.course)
+
+
+def leave_course(user, course, status):
+    entry = active_entry(user, course)
+    if entry is not None:
+        leave(entry, status)
+
+
+def leave_all(user, status=Status.CANCELLED):
+    """Take `user` out of every queue they are in (e.g. their account is being deleted)."""
+    course_ids = WaitlistEntry.objects.filter(user=user, status__in=WaitlistEntry.ACTIVE_STATUSES).values_list('course', flat=True)
+    for course in Course._base_manager.filter(pk__in=list(course_ids)):
+        leave_course(user, course, status)
+
+
+def release_payment(payment):
+    """Cancel the waitlist entry backed by `payment` (payment rejected or withdrawn)."""
+    entry = WaitlistEntry.objects.filter(payment=payment, status__in=WaitlistEntry.ACTIVE_STATUSES).first()
+    if entry is not None:
+        leave(entry)
+
+
+def offer_seats_on_commit(course):
+    transaction.on_commit(lambda: offer_free_seats(course))
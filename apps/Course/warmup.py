@@ -0,0 +1,102 @@
+"""
+Cache warm-up, run at deploy time (`manage.py warm_caches`) before traffic
+is switched over.
+
+A new deploy starts with empty caches: new key versions or a flushed Redis.
+Without a warm-up, the first requests pay for the dashboard aggregates, the
+reference tables behind the level navigation and the objects behind the API
+detail views. Every cacheable artifact is registered here with the function
+that computes and stores it:
+
+    @warmup.register('stats:revenue')
+    def warm_revenue():
+        stats.revenue_stats.refresh()
+
+`warm()` runs the registered functions in a thread pool. A failing artifact
+is reported and does not stop the others.
+
+Only shared caches (CACHES['default']) are worth warming: the command runs
+in a process of its own, so whatever it keeps in process memory is gone when
+it exits. Reference tables are stored in the shared tier of reference_cache,
+and every worker fills its local LRU from there on first use.
+
+This module registers the app's own caches (stats.py, reference tables,
+per-object caches). Other apps register theirs from AppConfig.ready().
+"""
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from . import object_cache, stats
+from .reference_cache import ReferenceManager
+
+logger = logging.getLogger(__name__)
+
+Result = namedtuple('Result', 'name seconds detail error')
+
+_registry = {}
+
+
+def register(name, func=None):
+    """Register `func` as the warm-up of artifact `name`; usable as a decorator."""
+    if func is None:
+        return lambda func: register(name, func)
+    _registry[name] = func
+    return func
+
+
+def artifacts():
+    return dict(_registry)
+
+
+def _run(name, func):
+    started = time.monotonic()
+    try:
+        detail = func()
+    except Exception as exc:
+        logger.exception(f'Warming {name} failed')
+        return Result(name, time.monotonic() - started, None, exc)
+    finally:
+        # Each pool thread opened its own connections.
+        connections.close_all()
+    return Result(name, time.monotonic() - started, detail, None)
+
+
+def warm(names=None, workers=None):
+    """Run the warm-up of every registered artifact (or of `names`) in parallel; returns a Result per artifact."""
+    selected = artifacts() if names is None else {name: _registry[name] for name in names}
+    workers = workers or settings.WARMUP['WORKERS']
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warmup') as pool:
+        futures = [pool.submit(_run, name, func) for name, func in sorted(selected.items())]
+        return [future.result() for future in futures]
+
+
+def _computation(computation):
+    def warm():
+        computation.refresh()
+    return warm
+
+
+def _rows(manager, limit=None):
+    def warm():
+        return f'{manager.warm(limit)} rows'
+    return warm
+
+
+def _register_app_caches():
+    for computation in (stats.user_stats, stats.teacher_stats, stats.content_stats, stats.revenue_stats):
+        register(computation.key, _computation(computation))
+
+    for model in apps.get_app_config('Course').get_models():
+        if isinstance(getattr(model, 'cached', None), ReferenceManager):
+            register(f'reference:{model._meta.label_lower}', _rows(model.cached))
+        elif object_cache.is_cached(model):
+            register(f'objects:{model._meta.label_lower}', _rows(model.cached, settings.WARMUP['OBJECT_LIMIT']))
+
+
+_register_app_caches()
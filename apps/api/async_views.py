@@ -0,0 +1,124 @@
+"""
+Native async read-only endpoints for the public API.
+
+These mirror the list/retrieve actions of CourseViewSet, AcademicLevelViewSet,
+LiveClassViewSet and VideoViewSet but use Django's async ORM, so under ASGI
+(`uvicorn Course_Management_system.asgi:application`) a slow client only
+holds a coroutine instead of a whole worker thread. Under WSGI they still work,
+Django just runs them in an event loop per request.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from apps.Course import object_cache
+from apps.Course.models import AcademicLevel, Course, LiveClass, Video
+from .serializer import (
+    AcademicLevelSerializer,
+    CourseSerializer,
+    LiveClassPublicSerializer,
+    LiveClassSerializer,
+    VideoPublicSerializer,
+    VideoSerializer,
+)
+
+
+def get_user(request):
+    # Reuse the authenticators configured for DRF (JWT, session, token) so the
+    # async endpoints accept exactly the same credentials as the viewsets.
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    user = drf_request.user
+    user.is_authenticated  # force the lazy lookup while we are in a thread
+    return user
+
+
+async def aget_user(request):
+    return await sync_to_async(get_user)(request)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def _aget_or_404(queryset, pk):
+    try:
+        return await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.verbose_name} matches the given query.')
+
+
+async def _ais_enrolled(user, course_id):
+    return course_id is not None and await user.enrollments.active().filter(course=course_id).aexists()
+
+
+def video_queryset():
+    return Video.objects.prefetch_related('stream')
+
+
+async def course_list(request):
+    courses = await _alist(Course.objects.all().order_by('-start_time'))
+    serializer = CourseSerializer(courses, many=True, context={'request': request})
+    return JsonResponse(serializer.data, safe=False)
+
+
+async def course_detail(request, pk):
+    course = await _aget_or_404(Course.objects.all(), pk)
+    return JsonResponse(CourseSerializer(course, context={'request': request}).data)
+
+
+async def level_list(request):
+    # Served from the in-process reference cache (apps/Course/reference_cache.py).
+    levels = await sync_to_async(AcademicLevel.cached.cached_all)()
+    return JsonResponse(AcademicLevelSerializer(levels, many=True).data, safe=False)
+
+
+async def level_detail(request, pk):
+    level = await sync_to_async(object_cache.get_or_404)(AcademicLevel, pk)
+    return JsonResponse(AcademicLevelSerializer(level).data)
+
+
+async def liveclass_list(request):
+    user = await aget_user(request)
+    if user.is_authenticated:
+        enrolled = await _alist(LiveClass.objects.filter(course__in=user.enrolled_course_ids()))
+        others = await _alist(LiveClass.objects.exclude(course__in=user.enrolled_course_ids()))
+        return JsonResponse({
+            'enrolled_live_classes': LiveClassSerializer(enrolled, many=True).data,
+            'other_live_classes': LiveClassPublicSerializer(others, many=True).data,
+        })
+    live_classes = await _alist(LiveClass.objects.all())
+    return JsonResponse(LiveClassPublicSerializer(live_classes, many=True).data, safe=False)
+
+
+async def liveclass_detail(request, pk):
+    user = await aget_user(request)
+    live_class = await _aget_or_404(LiveClass.objects.all(), pk)
+    if user.is_authenticated and await _ais_enrolled(user, live_class.course_id):
+        serializer = LiveClassSerializer(live_class)
+    else:
+        serializer = LiveClassPublicSerializer(live_class)
+    return JsonResponse(serializer.data)
+
+
+async def video_list(request):
+    user = await aget_user(request)
+    if user.is_authenticated:
+        enrolled = await _alist(video_queryset().filter(course__in=user.enrolled_course_ids()))
+        others = await _alist(video_queryset().exclude(course__in=user.enrolled_course_ids()))
+        return JsonResponse({
+            'enrolled_videos': VideoSerializer(enrolled, many=True).data,
+            'other_videos': VideoPublicSerializer(others, many=True).data,
+        })
+    videos = await _alist(Video.objects.all())
+    return JsonResponse(VideoPublicSerializer(videos, many=True).data, safe=False)
+
+
+async def video_detail(request, pk):
+    user = await aget_user(request)
+    video = await _aget_or_404(video_queryset(), pk)
+    if user.is_authenticated and await _ais_enrolled(user, video.course_id):
+        serializer = VideoSerializer(video)
+    else:
+        serializer = VideoPublicSerializer(video)
+    return JsonResponse(serializer.data)
@@ -0,0 +1,77 @@
+"""
+Per-object cache of serialized representations for the API lists.
+
+Video and live class lists re-serialized every row on every request, even
+though rows rarely change. A serializer using FragmentCacheMixin caches the
+representation of each instance under
+
+    model, pk, variant ('public' / 'full'), updated_at
+
+so an edit produces a new key and nothing has to be invalidated; old
+fragments expire after FRAGMENT_CACHE['TIMEOUT']. Lists (many=True, through
+FragmentListSerializer) fetch all fragments with one get_many and serialize
+only the rows that missed.
+
+The representation must depend on the row alone: anything else that shows
+up in it has to bump updated_at (see touch_video_streams in signals.py for
+the video streams, touch_detached_rows for rows whose parent is deleted).
+Writes through queryset.update() must set updated_at themselves. Instances
+without updated_at (e.g. unsaved ones) are never cached.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from rest_framework import serializers
+
+
+class FragmentCacheMixin:
+    """ModelSerializer mixin: cache each instance's representation (see module docstring)."""
+
+    fragment_variant = None
+
+    def fragment_key(self, instance):
+        updated_at = getattr(instance, 'updated_at', None)
+        if updated_at is None or instance.pk is None:
+            return None
+        # File and image URLs are absolute when a request is in the context.
+        request = self.context.get('request')
+        host = request.get_host() if request is not None else ''
+        return (
+            f"frag:v{settings.FRAGMENT_CACHE['VERSION']}:{instance._meta.label_lower}:{instance.pk}:"
+            f"{self.fragment_variant}:{updated_at.timestamp()}:{host}"
+        )
+
+    def to_representation(self, instance):
+        key = self.fragment_key(instance)
+        if key is None:
+            return super().to_representation(instance)
+        data = cache.get(key)
+        if data is None:
+            data = super().to_representation(instance)
+            cache.set(key, data, settings.FRAGMENT_CACHE['TIMEOUT'])
+        return data
+
+    def serialize_many(self, instances):
+        """Representations of `instances`, in order, with one cache round trip for the lot."""
+        keys = [self.fragment_key(instance) for instance in instances]
+        found = cache.get_many([key for key in keys if key is not None])
+        data, missed = [], {}
+        for instance, key in zip(instances, keys):
+            if key in found:
+                data.append(found[key])
+                continue
+            representation = super().to_representation(instance)
+            if key is not None:
+                missed[key] = representation
+            data.append(representation)
+        if missed:
+            cache.set_many(missed, settings.FRAGMENT_CACHE['TIMEOUT'])
+        return data
+
+
+class FragmentListSerializer(serializers.ListSerializer):
+    """list_serializer_class of FragmentCacheMixin serializers."""
+
+    def to_representation(self, data):
+        instances = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return self.child.serialize_many(list(instances))
@@ -0,0 +1,96 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+def run_client(url, requests_per_client, timeout, headers, start_barrier):
+    """Issue sequential requests like one client would; return (latencies, errors)."""
+    latencies, errors = [], 0
+    start_barrier.wait()
+    for _ in range(requests_per_client):
+        request = urllib.request.Request(url, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                if response.status != 200:
+                    errors += 1
+                    continue
+        except (urllib.error.URLError, OSError):
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare how many simultaneous clients one process sustains on the WSGI "
+        "viewsets and the async ASGI endpoints. Start one single-process server "
+        "per target first, e.g. `gunicorn -w 1 --threads 8 Course_Management_system.wsgi` "
+        "on :8000 and `uvicorn --workers 1 --port 8001 Course_Management_system.asgi:application`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", default="http://127.0.0.1:8000/api/videos/", help="Endpoint served by the WSGI process")
+        parser.add_argument("--asgi-url", default="http://127.0.0.1:8001/api/async/videos/", help="Endpoint served by the ASGI process")
+        parser.add_argument("--clients", default="10,50,100,200", help="Comma-separated concurrency levels to test")
+        parser.add_argument("--requests", type=int, default=5, help="Requests issued by each client")
+        parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+        parser.add_argument("--slo", type=float, default=1.0, help="p95 latency (seconds) a level must stay under to count as sustained")
+        parser.add_argument("--token", help="Optional JWT access token sent as 'Authorization: Token <token>'")
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options["clients"].split(",") if level.strip()]
+        headers = {"Authorization": f"Token {options['token']}"} if options.get("token") else {}
+        summary = {}
+
+        for label, url in (("WSGI", options["wsgi_url"]), ("ASGI", options["asgi_url"])):
+            self.stdout.write(f"\n{label}: {url}")
+            self.stdout.write(f"{'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+            sustained = 0
+            for clients in levels:
+                result = self.run_level(url, clients, options["requests"], options["timeout"], headers)
+                self.stdout.write(
+                    f"{clients:>8} {result['throughput']:>9.1f} {result['p50'] * 1000:>9.1f} "
+                    f"{result['p95'] * 1000:>9.1f} {result['errors']:>7}"
+                )
+                if result["errors"] == 0 and result["p95"] <= options["slo"]:
+                    sustained = clients
+            summary[label] = sustained
+
+        self.stdout.write("")
+        for label, sustained in summary.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: sustained {sustained} simultaneous clients (no errors, p95 <= {options['slo']}s)"
+            ))
+
+    def run_level(self, url, clients, requests_per_client, timeout, headers):
+        barrier = threading.Barrier(clients)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            futures = [
+                pool.submit(run_client, url, requests_per_client, timeout, headers, barrier)
+                for _ in range(clients)
+            ]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+        errors = sum(client_errors for _, client_errors in results)
+        if latencies:
+            p50 = statistics.median(latencies)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        else:
+            p50 = p95 = float("inf")
+        return {
+            "throughput": len(latencies) / elapsed if elapsed else 0,
+            "p50": p50,
+            "p95": p95,
+            "errors": errors,
+        }
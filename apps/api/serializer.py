@@ -1,6 +1,7 @@
 from collections import OrderedDict
 from rest_framework import serializers
-from apps.Course.models import Course, PaymentMethod, Video,AcademicLevel, User, Stream, Subject, LiveClass
+from apps.Course.models import Course, PaymentMethod, Video,AcademicLevel, User, Stream, Subject, LiveClass, WaitlistEntry
+from .fragments import FragmentCacheMixin, FragmentListSerializer
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -39,6 +40,7 @@ class UserSerializer(serializers.ModelSerializer):
     Serializer for viewing/updating user profiles
     Only username is visible to all; other fields are admin-only
     """
+    enrolled_courses = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -50,8 +52,12 @@ class UserSerializer(serializers.ModelSerializer):
             'last_name',
             'bio',
             'profile_picture',
+            'enrolled_courses',
         ]
-        read_only_fields = ['id', 'username']
+        read_only_fields = ['id', 'username', 'enrolled_courses']
+
+    def get_enrolled_courses(self, obj):
+        return list(obj.enrolled_course_ids().values_list('course', flat=True))
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -66,8 +72,10 @@ class CourseSerializer(serializers.ModelSerializer):
             'end_time',
             'image',
             'created_at',
+            'capacity',
+            'enrolled_count',
         ]
-        read_only_fields = ['id', 'created_at']
+        read_only_fields = ['id', 'created_at', 'enrolled_count']
         extra_kwargs = {
             'start_time': {'required': False, 'allow_null': True},
             'end_time': {'required': False, 'allow_null': True},
@@ -82,8 +90,9 @@ class AcademicLevelSerializer(serializers.ModelSerializer):
             'name',
             'allowed_streams',
             'capacity',
+            'student_count',
         ]
-        read_only_fields = ['id', 'capacity', 'allowed_streams', 'name']
+        read_only_fields = ['id', 'capacity', 'allowed_streams', 'name', 'student_count']
 
 
 class StreamSerializer(serializers.ModelSerializer):
@@ -102,39 +111,63 @@ class SubjectSerializer(serializers.ModelSerializer):
         fields = [
             'name',
             'description',
+            'video_count',
+            'live_class_count',
         ]
-        read_only_fields = ['name', 'description']
+        read_only_fields = ['name', 'description', 'video_count', 'live_class_count']
     pass
 
-class LiveClassSerializer(serializers.ModelSerializer):
+class LiveClassSerializer(FragmentCacheMixin, serializers.ModelSerializer):
     """Full serializer for authenticated users"""
+    fragment_variant = 'full'
+
     class Meta:
         model = LiveClass
         fields = '__all__'
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = FragmentListSerializer
 
 
-class LiveClassPublicSerializer(serializers.ModelSerializer):
+class LiveClassPublicSerializer(FragmentCacheMixin, serializers.ModelSerializer):
     """Limited serializer for unauthenticated users - only name and image"""
+    fragment_variant = 'public'
+
     class Meta:
         model = LiveClass
         fields = ['id', 'title']  # Only name (title) visible to public
         read_only_fields = ['id', 'title']
+        list_serializer_class = FragmentListSerializer
+
+class VideoSerializer(FragmentCacheMixin, serializers.ModelSerializer):
+    fragment_variant = 'full'
 
-class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
         fields = '__all__'
         read_only_fields = ['video_url', 'title', 'description', 'duration']
+        list_serializer_class = FragmentListSerializer
+
+class VideoPublicSerializer(FragmentCacheMixin, serializers.ModelSerializer):
+    fragment_variant = 'public'
 
-class VideoPublicSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
         fields = [ 'id','title', 'teacher', 'course']
         read_only_fields = ['id', 'title', 'teacher', 'course']
+        list_serializer_class = FragmentListSerializer
         
         
 class PaymentMethodSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentMethod
-        fields = ['name', 'details', 'image', 'is_active', 'display_order']
\ No newline at end of file
+        fields = ['name', 'details', 'image', 'is_active', 'display_order']
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    course_title = serializers.CharField(source='course.title', read_only=True)
+    position = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'course', 'course_title', 'status', 'position', 'created_at', 'offered_at']
+        read_only_fields = fields
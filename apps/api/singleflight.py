@@ -0,0 +1,89 @@
+"""
+Request coalescing (single-flight) for expensive read-only API endpoints.
+
+When many clients ask for the same URL at the same moment only one worker
+computes the response; the others wait on a lock kept in the shared cache and
+reuse the computed data. Requests are grouped by URL and by visibility class,
+because live classes and videos are serialized differently depending on who
+is asking (anonymous visitors vs. students enrolled in a given course).
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'LOCK_TIMEOUT': 10,      # seconds the computing worker may hold the lock
+    'RESULT_TIMEOUT': 1,     # seconds a computed result is reused by duplicates
+    'WAIT_TIMEOUT': 5,       # how long duplicates wait before computing themselves
+    'POLL_INTERVAL': 0.05,   # seconds between checks while waiting
+}
+
+
+def _config(name):
+    return getattr(settings, 'SINGLE_FLIGHT', {}).get(name, DEFAULTS[name])
+
+
+def visibility_class(request):
+    """Return the audience a response is computed for.
+
+    Anonymous users all see the public serializers. Authenticated users see the
+    full serializers for their own courses; they are grouped by user id, which
+    costs no query on the hot path (cache hits and waiting duplicates) and
+    cannot go stale when enrollments change.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return 'public'
+    return f'user:{user.pk}'
+
+
+def flight_key(request):
+    raw = f'{request.get_full_path()}|{visibility_class(request)}'
+    return 'singleflight:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def single_flight(view_method):
+    """Coalesce identical concurrent calls to a viewset action.
+
+    Only successful responses are shared. If the computing worker fails or the
+    wait times out, the waiting request falls back to computing on its own.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = flight_key(request)
+        result_key = f'{key}:result'
+        lock_key = f'{key}:lock'
+
+        data = cache.get(result_key)
+        if data is not None:
+            return Response(data)
+
+        if cache.add(lock_key, 1, timeout=_config('LOCK_TIMEOUT')):
+            try:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code == 200 and getattr(response, 'data', None) is not None:
+                    cache.set(result_key, response.data, timeout=_config('RESULT_TIMEOUT'))
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        deadline = time.monotonic() + _config('WAIT_TIMEOUT')
+        while time.monotonic() < deadline:
+            time.sleep(_config('POLL_INTERVAL'))
+            data = cache.get(result_key)
+            if data is not None:
+                return Response(data)
+            if not cache.get(lock_key):
+                # The computing worker finished without sharing a result.
+                break
+        logger.info(f'Single-flight wait expired for {request.path}, computing locally')
+        return view_method(self, request, *args, **kwargs)
+
+    return wrapper
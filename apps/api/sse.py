@@ -0,0 +1,209 @@
+"""
+Server-Sent Events stream replacing the polling of payment verification and
+live class status.
+
+Clients open GET /api/events/ (with the usual JWT/session credentials) and
+receive `payment_verified`, `live_class_starting` and `live_class_started`
+events as they are published on the pub/sub channel.
+
+Under ASGI the stream is an async generator waiting on an async subscription
+(pubsub.asubscribe), so an idle client holds no thread at all. Django 4.2
+does not notice clients that go away while a response streams; the project's
+ASGI application is wrapped in CancelOnDisconnect, which cancels the stream
+when the server reports the disconnect. Under WSGI the stream necessarily
+holds one worker thread per client, and ends when writing a heartbeat fails.
+
+Streams are exempt from admission control (they would pin a budget slot for
+hours) and are capped per process instead, at SSE['MAX_STREAMS'] under ASGI
+and SSE['MAX_SYNC_STREAMS'] under WSGI; clients over the cap get a 503 with
+Retry-After, and EventSource reconnects.
+"""
+import asyncio
+import functools
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+
+from apps.Course import events
+from apps.Course.pubsub import asubscribe, subscribe
+from .async_views import get_user
+
+POLL_TIMEOUT = 1  # seconds a single wait on a sync subscription may block
+CLOSE_KEY = 'sse.close'  # scope entry where CancelOnDisconnect collects streams to close
+
+
+class StreamLimit:
+    """Count of the streams open in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+streams = StreamLimit()
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """Gives the stream's slot back when the response is closed, or when the stream ends first."""
+
+    def __init__(self, stream, *args, **kwargs):
+        self._slot_held = True
+        self._stream = stream(self.release_slot)
+        super().__init__(self._stream, *args, content_type='text/event-stream', **kwargs)
+        self['Cache-Control'] = 'no-cache'
+        self['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+
+    def release_slot(self):
+        if self._slot_held:
+            self._slot_held = False
+            streams.release()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.release_slot()
+
+    async def aclose(self):
+        """Close an async stream left suspended by a cancelled request."""
+        try:
+            await self._stream.aclose()
+        finally:
+            self.release_slot()
+
+
+def format_event(message):
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'], default=str)}\n\n"
+
+
+def _next_chunk(subscription, last_sent):
+    """Wait for the next message or heartbeat; return (chunk or None, last_sent)."""
+    received = subscription.get_message(timeout=POLL_TIMEOUT)
+    now = time.monotonic()
+    if received is not None:
+        _, message = received
+        return format_event(message), now
+    if now - last_sent >= settings.SSE['HEARTBEAT_INTERVAL']:
+        return ': keep-alive\n\n', now
+    return None, last_sent
+
+
+def sync_stream(channels, release):
+    try:
+        subscription = subscribe(*channels)
+        try:
+            last_sent = time.monotonic()
+            yield 'retry: 5000\n\n'
+            while True:
+                chunk, last_sent = _next_chunk(subscription, last_sent)
+                if chunk:
+                    yield chunk
+        finally:
+            subscription.close()
+    finally:
+        release()
+
+
+async def async_stream(channels, release):
+    try:
+        subscription = await asubscribe(*channels)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                received = await subscription.get_message(timeout=settings.SSE['HEARTBEAT_INTERVAL'])
+                yield ': keep-alive\n\n' if received is None else format_event(received[1])
+        finally:
+            await subscription.close()
+    finally:
+        release()
+
+
+def event_stream(request):
+    user = get_user(request)
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    asynchronous = isinstance(request, ASGIRequest)
+    if not streams.acquire(settings.SSE['MAX_STREAMS' if asynchronous else 'MAX_SYNC_STREAMS']):
+        response = JsonResponse({'detail': 'Too many open event streams, please retry shortly.'}, status=503)
+        response['Retry-After'] = str(settings.SSE['RETRY_AFTER'])
+        return response
+
+    try:
+        channels = events.channels_for_user(user)
+    except BaseException:
+        streams.release()
+        raise
+    stream = async_stream if asynchronous else sync_stream
+    response = EventStreamResponse(functools.partial(stream, channels))
+    if asynchronous and CLOSE_KEY in request.scope:
+        request.scope[CLOSE_KEY].append(response.aclose)
+    return response
+
+
+@functools.lru_cache(maxsize=None)
+def _stream_path():
+    return reverse('api:event-stream')
+
+
+class CancelOnDisconnect:
+    """
+    ASGI wrapper: cancel an event stream as soon as its client disconnects.
+
+    Django 4.2 reads the request body and then never calls `receive` again,
+    so a stream to a client that went away would run until the server gives
+    up on it. Once the body is read, this keeps listening and cancels the
+    request when `http.disconnect` arrives; the stream's `finally` blocks
+    then close the subscription and free the slot. A cancellation that lands
+    while a chunk is being sent leaves the stream suspended at its `yield`,
+    so the streams the view opened are closed explicitly afterwards.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != _stream_path():
+            return await self.application(scope, receive, send)
+
+        body_read = asyncio.Event()
+        scope = {**scope, CLOSE_KEY: []}
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] != 'http.request' or not message.get('more_body', False):
+                body_read.set()
+            return message
+
+        async def watch():
+            await body_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            request.cancel()
+
+        request = asyncio.ensure_future(self.application(scope, receive_body, send))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await request
+        except asyncio.CancelledError:
+            if not watcher.done():
+                raise  # cancelled from outside, not by a disconnect
+        finally:
+            watcher.cancel()
+            for close in scope[CLOSE_KEY]:
+                await close()
@@ -1,3 +1,203 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.Course import events, pubsub
+from apps.Course.enrollment import EnrollmentOutcome, enroll
+from apps.Course.models import Course, LiveClass, User, Video
+from . import sse
+from .singleflight import visibility_class
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'async-view-tests'}})
+class AsyncVisibilityTests(TestCase):
+    """Students get the full serializers for their own courses only; everybody else the public ones."""
+
+    PUBLIC_VIDEO = {'id', 'title', 'teacher', 'course'}
+    PUBLIC_LIVE_CLASS = {'id', 'title'}
+
+    def setUp(self):
+        self.student = User.objects.create_user('student', password='secret', role='student')
+        self.enrolled, self.other = Course.objects.create(title='Enrolled'), Course.objects.create(title='Other')
+        self.assertEqual(enroll(self.student, self.enrolled), EnrollmentOutcome.ENROLLED)
+        self.videos = [
+            Video.objects.create(title=course.title, url=f'https://example.com/{course.pk}', course=course)
+            for course in (self.enrolled, self.other)
+        ]
+        now = timezone.now()
+        self.live_classes = [
+            LiveClass.objects.create(title=course.title, course=course, start_time=now, end_time=now, meeting_url='https://meet.example.com/')
+            for course in (self.enrolled, self.other)
+        ]
+        self.addCleanup(cache.clear)
+
+    def get(self, name, *args, user=None):
+        headers = {'HTTP_AUTHORIZATION': f'Token {AccessToken.for_user(user)}'} if user else {}
+        response = self.client.get(reverse(f'api:{name}', args=args), **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_anonymous_clients_get_the_public_serializers(self):
+        self.assertEqual([set(video) for video in self.get('async-video-list')], [self.PUBLIC_VIDEO] * 2)
+        self.assertEqual([set(item) for item in self.get('async-liveclass-list')], [self.PUBLIC_LIVE_CLASS] * 2)
+        self.assertEqual(set(self.get('async-video-detail', self.videos[0].pk)), self.PUBLIC_VIDEO)
+        self.assertEqual(set(self.get('async-liveclass-detail', self.live_classes[0].pk)), self.PUBLIC_LIVE_CLASS)
+
+    def test_lists_split_enrolled_and_other_courses(self):
+        videos = self.get('async-video-list', user=self.student)
+        self.assertEqual([video['id'] for video in videos['enrolled_videos']], [self.videos[0].pk])
+        self.assertIn('url', videos['enrolled_videos'][0])
+        self.assertEqual([set(video) for video in videos['other_videos']], [self.PUBLIC_VIDEO])
+
+        live_classes = self.get('async-liveclass-list', user=self.student)
+        self.assertEqual([item['id'] for item in live_classes['enrolled_live_classes']], [self.live_classes[0].pk])
+        self.assertIn('meeting_url', live_classes['enrolled_live_classes'][0])
+        self.assertEqual([set(item) for item in live_classes['other_live_classes']], [self.PUBLIC_LIVE_CLASS])
+
+    def test_details_are_full_only_for_enrolled_courses(self):
+        self.assertIn('url', self.get('async-video-detail', self.videos[0].pk, user=self.student))
+        self.assertEqual(set(self.get('async-video-detail', self.videos[1].pk, user=self.student)), self.PUBLIC_VIDEO)
+        self.assertIn('meeting_url', self.get('async-liveclass-detail', self.live_classes[0].pk, user=self.student))
+        other = self.get('async-liveclass-detail', self.live_classes[1].pk, user=self.student)
+        self.assertEqual(set(other), self.PUBLIC_LIVE_CLASS)
+
+    def test_unknown_objects_are_404(self):
+        self.assertEqual(self.client.get(reverse('api:async-video-detail', args=[0])).status_code, 404)
+
+
+class SingleFlightTests(TestCase):
+    def test_visibility_class_runs_no_query(self):
+        user = User.objects.create_user('student', password='secret', role='student')
+        request = RequestFactory().get('/api/videos/')
+        with self.assertNumQueries(0):
+            request.user = AnonymousUser()
+            self.assertEqual(visibility_class(request), 'public')
+            request.user = user
+            self.assertEqual(visibility_class(request), f'user:{user.pk}')
+
+
+@override_settings(SSE={**settings.SSE, 'MAX_STREAMS': 1, 'MAX_SYNC_STREAMS': 1})
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='secret', role='student')
+        self.url = reverse('api:event-stream')
+        patcher = mock.patch.object(pubsub, '_backend', pubsub.LocalPubSub())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_stream(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'retry: 5000\n\n')
+        return response, chunks
+
+    def test_anonymous_clients_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(sse.streams.open, 0)
+
+    def test_events_on_the_user_channel_are_streamed(self):
+        self.client.force_login(self.user)
+        response, chunks = self.open_stream()
+        pubsub.publish(events.user_channel(self.user.pk), {'event': events.PAYMENT_VERIFIED, 'data': {'payment_id': 7}})
+        self.assertEqual(next(chunks), b'event: payment_verified\ndata: {"payment_id": 7}\n\n')
+        response.close()
+        self.assertEqual(sse.streams.open, 0)
+        self.assertFalse(any(pubsub.get_pubsub()._subscribers.values()))
+
+    def test_streams_over_the_cap_are_refused(self):
+        self.client.force_login(self.user)
+        response, _ = self.open_stream()
+        refused = self.client.get(self.url)
+        self.assertEqual(refused.status_code, 503)
+        self.assertEqual(refused['Retry-After'], str(settings.SSE['RETRY_AFTER']))
+        response.close()
+        self.open_stream()[0].close()
+
+    def test_async_stream_ends_with_its_subscription(self):
+        released = []
+
+        async def run():
+            stream = sse.async_stream([events.PUBLIC_CHANNEL], lambda: released.append(True))
+            first = await stream.__anext__()
+            pubsub.publish(events.PUBLIC_CHANNEL, {'event': events.LIVE_CLASS_STARTED, 'data': {'live_class_id': 1}})
+            second = await asyncio.wait_for(stream.__anext__(), 1)
+            await stream.aclose()
+            return first, second
+
+        first, second = async_to_sync(run)()
+        self.assertEqual(first, 'retry: 5000\n\n')
+        self.assertEqual(second, 'event: live_class_started\ndata: {"live_class_id": 1}\n\n')
+        self.assertEqual(released, [True])
+        self.assertFalse(any(pubsub.get_pubsub()._subscribers.values()))
+
+    def test_client_disconnect_cancels_the_stream(self):
+        cancelled = []
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}, {'type': 'http.disconnect'}]
+
+        async def application(scope, receive, send):
+            await receive()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            pass
+
+        async_to_sync(sse.CancelOnDisconnect(application))({'type': 'http', 'path': self.url}, receive, send)
+        self.assertEqual(cancelled, [True])
+
+
+@override_settings(SSE={**settings.SSE, 'MAX_STREAMS': 1})
+class AsgiEventStreamTests(TransactionTestCase):
+    def test_stream_is_served_and_stopped_on_disconnect(self):
+        user = User.objects.create_user('student', password='secret', role='student')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': reverse('api:event-stream'), 'raw_path': b'', 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {AccessToken.for_user(user)}'.encode())],
+            'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+        }
+        sent = []
+
+        async def run():
+            disconnected = asyncio.Event()
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if message.get('body') == b'retry: 5000\n\n':
+                    pubsub.publish(events.user_channel(user.pk), {'event': events.PAYMENT_VERIFIED, 'data': {}})
+                elif message.get('body', b'').startswith(b'event:'):
+                    disconnected.set()
+
+            await asyncio.wait_for(sse.CancelOnDisconnect(ASGIHandler())(scope, receive, send), 5)
+
+        with mock.patch.object(pubsub, '_backend', pubsub.LocalPubSub()):
+            async_to_sync(run)()
+            self.assertFalse(any(pubsub.get_pubsub()._subscribers.values()))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(sent[2]['body'], b'event: payment_verified\ndata: {}\n\n')
+        self.assertEqual(sse.streams.open, 0)
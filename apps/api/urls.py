@@ -5,7 +5,8 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from .views import CourseViewSet, AcademicLevelViewSet, PaymentMethodViewSet, UserViewSet,StreamViewSet, LiveClassViewSet, VideoViewSet
+from . import async_views, sse
+from .views import CourseViewSet, AcademicLevelViewSet, PaymentMethodViewSet, UserViewSet,StreamViewSet, LiveClassViewSet, VideoViewSet, WaitlistViewSet
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
@@ -15,10 +16,24 @@ router.register(r'streams', StreamViewSet, basename='stream')
 router.register(r'liveclasses', LiveClassViewSet, basename='liveclass')
 router.register(r'videos', VideoViewSet, basename='video')  
 router.register(r'payment-methods', PaymentMethodViewSet, basename='paymentmethod')
+router.register(r'waitlist', WaitlistViewSet, basename='waitlist')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('token-auth/', obtain_auth_token, name='api-token-auth'),
     path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'), # JWT login
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'), # JWT token refresh
+
+    # Native async read-only endpoints (best served through asgi.py)
+    path('async/courses/', async_views.course_list, name='async-course-list'),
+    path('async/courses/<int:pk>/', async_views.course_detail, name='async-course-detail'),
+    path('async/classes/', async_views.level_list, name='async-academic-level-list'),
+    path('async/classes/<int:pk>/', async_views.level_detail, name='async-academic-level-detail'),
+    path('async/liveclasses/', async_views.liveclass_list, name='async-liveclass-list'),
+    path('async/liveclasses/<int:pk>/', async_views.liveclass_detail, name='async-liveclass-detail'),
+    path('async/videos/', async_views.video_list, name='async-video-list'),
+    path('async/videos/<int:pk>/', async_views.video_detail, name='async-video-detail'),
+
+    # Server-Sent Events for payment verification and live class status
+    path('events/', sse.event_stream, name='event-stream'),
 ] 
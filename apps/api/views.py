@@ -1,10 +1,14 @@
+from django.http import Http404
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from apps.Course.models import Course, PaymentMethod, User, AcademicLevel, Stream, Subject, LiveClass, Video
+from apps.Course import archive, object_cache
+from apps.Course.models import Course, PaymentMethod, User, AcademicLevel, Stream, Subject, LiveClass, Video, WaitlistEntry
+from .singleflight import single_flight
 from .serializer import CourseSerializer, PaymentMethodSerializer, UserSerializer, UserCreateSerializer, AcademicLevelSerializer, \
-    StreamSerializer, SubjectSerializer, LiveClassSerializer, LiveClassPublicSerializer, VideoSerializer, VideoPublicSerializer
+    StreamSerializer, SubjectSerializer, LiveClassSerializer, LiveClassPublicSerializer, VideoSerializer, VideoPublicSerializer, \
+    WaitlistEntrySerializer
 
 
 class UserViewSet(ModelViewSet):
@@ -42,14 +46,32 @@ class UserViewSet(ModelViewSet):
 
 
 
-class CourseViewSet(viewsets.ReadOnlyModelViewSet):
+class CachedObjectMixin:
+    """retrieve() reads the object through the per-object cache (apps/Course/object_cache.py)."""
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = object_cache.get_or_404(self.get_queryset().model, self.kwargs[lookup_url_kwarg])
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class ReferenceListMixin:
+    """list() serves the whole reference table from the in-process cache (apps/Course/reference_cache.py)."""
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_queryset().model.cached.cached_all(), many=True)
+        return Response(serializer.data)
+
+
+class CourseViewSet(CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
     """Basic Course API for beginners: list, retrieve, create, update, delete."""
     queryset = Course.objects.all().order_by('-start_time')
     serializer_class = CourseSerializer
     permission_classes = [AllowAny]
 
 
-class AcademicLevelViewSet(viewsets.ModelViewSet):
+class AcademicLevelViewSet(ReferenceListMixin, CachedObjectMixin, viewsets.ModelViewSet):
     """Basic Academic Level API for beginners: list, retrieve, create, update, delete."""
     queryset = AcademicLevel.objects.all()
     serializer_class = AcademicLevelSerializer
@@ -57,34 +79,42 @@ class AcademicLevelViewSet(viewsets.ModelViewSet):
     http_method_names = ['get']  # Restrict to read-only methods or can use abstraction just like of courseviewset
 
 
-class StreamViewSet(viewsets.ReadOnlyModelViewSet):
+class StreamViewSet(ReferenceListMixin, CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
     """Basic Stream API for beginners: list, retrieve, create, update, delete."""
     queryset = Stream.objects.all()
     serializer_class = StreamSerializer
     permission_classes = [AllowAny]
     # http_method_names = ['get']  # Restrict to read-only methods or can use abstraction just like of courseviewset
 
-class SubjectViewSet(viewsets.ReadOnlyModelViewSet):
+class SubjectViewSet(ReferenceListMixin, CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
     permission_classes = [AllowAny]
 
 
-class LiveClassViewSet(viewsets.ReadOnlyModelViewSet):
+class LiveClassViewSet(CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
     queryset = LiveClass.objects.all() # all live classes 
     permission_classes = [AllowAny]
 
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # Past classes may have been moved to the archive table
+            return archive.get_or_404(LiveClass, self.kwargs[self.lookup_field])
+
     def get_serializer_class(self):
         if self.request.user.is_authenticated:
             return LiveClassSerializer
         return LiveClassPublicSerializer
 
+    @single_flight
     def list(self, request, *args, **kwargs):
         user = request.user
         if user.is_authenticated:
-            enrolled_courses = user.course
-            enrolled_live_classes = LiveClass.objects.filter(course=enrolled_courses)
-            other_live_classes = LiveClass.objects.exclude(course=enrolled_courses)
+            enrolled_courses = user.enrolled_course_ids()
+            enrolled_live_classes = LiveClass.objects.filter(course__in=enrolled_courses)
+            other_live_classes = LiveClass.objects.exclude(course__in=enrolled_courses)
             enrolled_serializer = LiveClassSerializer(enrolled_live_classes, many=True)
             other_serializer = LiveClassPublicSerializer(other_live_classes, many=True)
             
@@ -104,7 +134,7 @@ class LiveClassViewSet(viewsets.ReadOnlyModelViewSet):
         
         if request.user.is_authenticated:
             # Check if user is enrolled in the course that contains this live class
-            if request.user.course == instance.course:
+            if request.user.is_enrolled_in(instance.course_id):
                 serializer = LiveClassSerializer(instance)
             else:
                 serializer = LiveClassPublicSerializer(instance)
@@ -113,7 +143,7 @@ class LiveClassViewSet(viewsets.ReadOnlyModelViewSet):
         
         return Response(serializer.data)
 
-class VideoViewSet(viewsets.ReadOnlyModelViewSet):
+class VideoViewSet(CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Video.objects.all()
     permission_classes = [AllowAny]
 
@@ -123,12 +153,13 @@ class VideoViewSet(viewsets.ReadOnlyModelViewSet):
         return VideoPublicSerializer
 
     # simlar logic as in liveclassviewset is applied here for list and retrieve methods
+    @single_flight
     def list(self, request, *args, **kwargs):
         user = request.user
         if user.is_authenticated:
-            enrolled_courses = user.course
-            enrolled_videos = Video.objects.filter(course=enrolled_courses)
-            other_videos = Video.objects.exclude(course=enrolled_courses)
+            enrolled_courses = user.enrolled_course_ids()
+            enrolled_videos = Video.objects.filter(course__in=enrolled_courses)
+            other_videos = Video.objects.exclude(course__in=enrolled_courses)
             enrolled_serializer = VideoSerializer(enrolled_videos, many=True)
             other_serializer = VideoPublicSerializer(other_videos, many=True)
             
@@ -148,7 +179,7 @@ class VideoViewSet(viewsets.ReadOnlyModelViewSet):
         
         if request.user.is_authenticated:
             # Check if user is enrolled in the course that contains this video
-            if request.user.course == instance.course:
+            if request.user.is_enrolled_in(instance.course_id):
                 serializer = VideoSerializer(instance)
             else:
                 serializer = VideoPublicSerializer(instance)
@@ -157,10 +188,19 @@ class VideoViewSet(viewsets.ReadOnlyModelViewSet):
         
         return Response(serializer.data)
     
-class PaymentMethodViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentMethodViewSet(ReferenceListMixin, CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
     permission_classes = [AllowAny]
+
+
+class WaitlistViewSet(viewsets.ReadOnlyModelViewSet):
+    """The signed-in student's waitlist entries with their current queue position."""
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(user=self.request.user).select_related('course').order_by('-created_at')
     
 
     
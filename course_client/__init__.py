@@ -0,0 +1,12 @@
+"""
+Python client for the Course Management System API (apps/api).
+
+    from course_client import CourseAPIClient
+
+    with CourseAPIClient('https://example.com/api/', 'student', 'secret', cache_dir='.api-cache') as api:
+        videos = api.videos.list()
+        courses = api.courses.get_many([1, 2, 3])
+"""
+from .client import APIError, CourseAPIClient
+
+__all__ = ['APIError', 'CourseAPIClient']
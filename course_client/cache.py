@@ -0,0 +1,44 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class ConditionalGetCache:
+    """
+    On-disk store of GET responses with their validators (ETag / Last-Modified).
+
+    Entries are keyed by the identity making the request as well as the URL,
+    because several endpoints return different data to different users.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, identity, url):
+        digest = hashlib.sha256(f'{identity}|{url}'.encode()).hexdigest()
+        return os.path.join(self.directory, f'{digest}.json')
+
+    def get(self, identity, url):
+        try:
+            with open(self._path(identity, url), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, identity, url, etag, last_modified, body):
+        entry = {'url': url, 'etag': etag, 'last_modified': last_modified, 'body': body}
+        # Write to a temp file and rename so concurrent readers never see half a file.
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+                json.dump(entry, handle)
+            os.replace(tmp_path, self._path(identity, url))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,243 @@
+import base64
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import ConditionalGetCache
+
+
+class APIError(Exception):
+    def __init__(self, status_code, payload):
+        super().__init__(f'API request failed with status {status_code}: {payload}')
+        self.status_code = status_code
+        self.payload = payload
+
+
+def _token_expiry(token):
+    """Read the `exp` claim of a JWT without verifying it (the server does that)."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))['exp']
+    except (IndexError, KeyError, ValueError):
+        return None
+
+
+class Resource:
+    """Accessor for one router resource, e.g. client.courses.list()."""
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+
+    def list(self, **params):
+        return self.client.get_all(self.path, params=params)
+
+    def get(self, pk):
+        return self.client.get(f'{self.path}{pk}/')
+
+    def get_many(self, pks):
+        return self.client.map(lambda pk: self.get(pk), pks)
+
+
+class CourseAPIClient:
+    """
+    Client for the apps/api endpoints.
+
+    - one pooled keep-alive session shared by all calls and threads
+    - JWT login, with the access token refreshed before it expires or after a 401
+    - paginated lists fetched concurrently once the page count is known
+    - optional on-disk cache revalidated with If-None-Match / If-Modified-Since
+    """
+
+    RESOURCES = {
+        'courses': 'courses/',
+        'classes': 'classes/',
+        'streams': 'streams/',
+        'liveclasses': 'liveclasses/',
+        'videos': 'videos/',
+        'payment_methods': 'payment-methods/',
+        'users': 'users/',
+        'waitlist': 'waitlist/',
+    }
+    REFRESH_MARGIN = 30  # seconds before expiry at which the access token is renewed
+
+    def __init__(self, base_url, username=None, password=None, cache_dir=None,
+                 pool_size=10, max_workers=8, timeout=10, retries=3):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cache = ConditionalGetCache(cache_dir) if cache_dir else None
+        self.access_token = None
+        self.refresh_token = None
+        self._token_lock = threading.Lock()
+
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=['GET'],
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        for name, path in self.RESOURCES.items():
+            setattr(self, name, Resource(self, path))
+
+    # Authentication ------------------------------------------------------
+
+    def login(self, username=None, password=None):
+        self.username = username or self.username
+        self.password = password or self.password
+        data = self._send('POST', 'login/', json={'username': self.username, 'password': self.password}, auth=False)
+        self.access_token = data['access']
+        self.refresh_token = data['refresh']
+        return data
+
+    def refresh(self):
+        try:
+            data = self._send('POST', 'token/refresh/', json={'refresh': self.refresh_token}, auth=False)
+        except APIError:
+            if not self.password:
+                raise
+            return self.login()
+        self.access_token = data['access']
+        if 'refresh' in data:
+            self.refresh_token = data['refresh']
+        return data
+
+    def _ensure_token(self):
+        with self._token_lock:
+            if self.access_token is None:
+                if self.username and self.password:
+                    self.login()
+                return
+            expiry = _token_expiry(self.access_token)
+            if expiry and expiry - time.time() < self.REFRESH_MARGIN:
+                self.refresh()
+
+    def _force_refresh(self, stale_token):
+        with self._token_lock:
+            # Another thread may already have refreshed while we were waiting.
+            if self.access_token != stale_token:
+                return
+            if self.refresh_token:
+                self.refresh()
+            else:
+                self.login()
+
+    @property
+    def identity(self):
+        return self.username if self.access_token else 'anonymous'
+
+    # Transport -----------------------------------------------------------
+
+    def _send(self, method, path, auth=True, headers=None, **kwargs):
+        response = self._raw(method, path, auth=auth, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise APIError(response.status_code, self._payload(response))
+        return self._payload(response)
+
+    def _raw(self, method, path, auth=True, headers=None, **kwargs):
+        url = urljoin(self.base_url, path)
+        headers = dict(headers or {})
+        if auth:
+            self._ensure_token()
+        token = self.access_token if auth else None
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+        if response.status_code == 401 and token:
+            self._force_refresh(token)
+            headers['Authorization'] = f'Token {self.access_token}'
+            response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+        return response
+
+    @staticmethod
+    def _payload(response):
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return response.text
+
+    def get(self, path, params=None):
+        if self.cache is None:
+            return self._send('GET', path, params=params)
+
+        url = requests.Request('GET', urljoin(self.base_url, path), params=params).prepare().url
+        cached = self.cache.get(self.identity, url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self._raw('GET', url, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached['body']
+        if response.status_code >= 400:
+            raise APIError(response.status_code, self._payload(response))
+        body = self._payload(response)
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.cache.set(self.identity, url, etag, last_modified, body)
+        return body
+
+    def map(self, func, items):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(func, items))
+
+    def get_all(self, path, params=None):
+        """
+        Fetch every page of a list endpoint.
+
+        Un-paginated endpoints are returned as they are. For paginated ones
+        ({count, next, results}) the first page gives the page size, then the
+        remaining pages are requested concurrently.
+        """
+        params = dict(params or {})
+        first = self.get(path, params=params)
+        if not (isinstance(first, dict) and 'results' in first and 'count' in first):
+            return first
+        results = list(first['results'])
+        if not first.get('next') or not results:
+            return results
+
+        pages = math.ceil(first['count'] / len(results))
+        rest = self.map(lambda page: self.get(path, params={**params, 'page': page}), range(2, pages + 1))
+        for page in rest:
+            results.extend(page['results'])
+        return results
+
+    # Account helpers -----------------------------------------------------
+
+    def signup(self, **fields):
+        return self._send('POST', self.RESOURCES['users'], json=fields, auth=False)
+
+    def me(self):
+        users = self.users.list()
+        return users[0] if users else None
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,181 @@
+import base64
+import json
+import tempfile
+import time
+from collections import namedtuple
+from unittest import TestCase
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from .client import CourseAPIClient
+
+BASE_URL = 'https://api.example.com/api/'
+
+Call = namedtuple('Call', 'method path query headers json')
+
+
+def fake_jwt(expires_in):
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': time.time() + expires_in}).encode()).rstrip(b'=')
+    return f'header.{payload.decode()}.signature'
+
+
+class FakeAdapter(BaseAdapter):
+    """Answers requests with `handler(method, path, query, headers)` -> (status, body, headers), recording each call."""
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.calls = []
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        path = url.path[len(urlsplit(BASE_URL).path):]
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        self.calls.append(Call(request.method, path, query, dict(request.headers), json.loads(request.body or 'null')))
+        status, body, headers = self.handler(request.method, path, query, request.headers)
+        response = requests.Response()
+        response.status_code = status
+        response._content = b'' if body is None else json.dumps(body).encode()
+        response.headers.update(headers or {})
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class ClientTestCase(TestCase):
+    def client_for(self, handler, username='student', password='secret', **kwargs):
+        client = CourseAPIClient(BASE_URL, username, password, **kwargs)
+        self.addCleanup(client.close)
+        self.adapter = FakeAdapter(handler)
+        client.session.mount('https://', self.adapter)
+        return client
+
+    def paths(self):
+        return [(call.method, call.path) for call in self.adapter.calls]
+
+
+class TokenTests(ClientTestCase):
+    def test_logs_in_on_first_use(self):
+        def handler(method, path, query, headers):
+            if path == 'login/':
+                return 200, {'access': fake_jwt(300), 'refresh': 'refresh-1'}, None
+            return 200, [], None
+
+        client = self.client_for(handler)
+        client.courses.list()
+        self.assertEqual(self.paths(), [('POST', 'login/'), ('GET', 'courses/')])
+        self.assertEqual(self.adapter.calls[0].json, {'username': 'student', 'password': 'secret'})
+        self.assertEqual(self.adapter.calls[1].headers['Authorization'], f'Token {client.access_token}')
+
+    def test_token_about_to_expire_is_refreshed_first(self):
+        fresh = fake_jwt(300)
+
+        def handler(method, path, query, headers):
+            if path == 'token/refresh/':
+                return 200, {'access': fresh}, None
+            return 200, [], None
+
+        client = self.client_for(handler)
+        client.access_token, client.refresh_token = fake_jwt(5), 'refresh-1'
+        client.courses.list()
+        self.assertEqual(self.paths(), [('POST', 'token/refresh/'), ('GET', 'courses/')])
+        self.assertEqual(self.adapter.calls[0].json, {'refresh': 'refresh-1'})
+        self.assertNotIn('Authorization', self.adapter.calls[0].headers)
+        self.assertEqual(self.adapter.calls[1].headers['Authorization'], f'Token {fresh}')
+        self.assertEqual(client.refresh_token, 'refresh-1')
+
+    def test_rejected_token_is_refreshed_and_the_request_retried(self):
+        revoked, fresh = fake_jwt(300), fake_jwt(300) + 'x'
+
+        def handler(method, path, query, headers):
+            if path == 'token/refresh/':
+                return 200, {'access': fresh, 'refresh': 'refresh-2'}, None
+            if headers['Authorization'] == f'Token {revoked}':
+                return 401, {'detail': 'Token is invalid or expired'}, None
+            return 200, [{'id': 1}], None
+
+        client = self.client_for(handler)
+        client.access_token, client.refresh_token = revoked, 'refresh-1'
+        self.assertEqual(client.courses.list(), [{'id': 1}])
+        self.assertEqual(self.paths(), [('GET', 'courses/'), ('POST', 'token/refresh/'), ('GET', 'courses/')])
+        self.assertEqual(client.refresh_token, 'refresh-2')
+
+    def test_expired_refresh_token_falls_back_to_logging_in(self):
+        def handler(method, path, query, headers):
+            if path == 'token/refresh/':
+                return 401, {'detail': 'Token is invalid or expired'}, None
+            if path == 'login/':
+                return 200, {'access': fake_jwt(300), 'refresh': 'refresh-2'}, None
+            return 200, [], None
+
+        client = self.client_for(handler)
+        client.access_token, client.refresh_token = fake_jwt(5), 'refresh-1'
+        client.courses.list()
+        self.assertEqual(self.paths(), [('POST', 'token/refresh/'), ('POST', 'login/'), ('GET', 'courses/')])
+
+
+class PaginationTests(ClientTestCase):
+    def handler(self, method, path, query, headers):
+        if path == 'login/':
+            return 200, {'access': fake_jwt(300), 'refresh': 'refresh-1'}, None
+        page = int(query.get('page', 1))
+        items = list(range(1, 6))[(page - 1) * 2:page * 2]
+        next_url = f'{BASE_URL}videos/?page={page + 1}' if page < 3 else None
+        return 200, {'count': 5, 'next': next_url, 'results': [{'id': item} for item in items]}, None
+
+    def test_remaining_pages_are_fetched_from_the_count(self):
+        client = self.client_for(self.handler)
+        self.assertEqual([video['id'] for video in client.videos.list(level='grade-10')], [1, 2, 3, 4, 5])
+        pages = sorted((call.query.get('page', '1'), call.query['level']) for call in self.adapter.calls if call.path == 'videos/')
+        self.assertEqual(pages, [('1', 'grade-10'), ('2', 'grade-10'), ('3', 'grade-10')])
+
+    def test_unpaginated_lists_are_returned_as_they_are(self):
+        client = self.client_for(lambda *args: (200, [{'id': 1}], None), username=None, password=None)
+        self.assertEqual(client.streams.list(), [{'id': 1}])
+        self.assertEqual(self.paths(), [('GET', 'streams/')])
+
+
+class ConditionalGetTests(ClientTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        self.body = [{'id': 1, 'title': 'Algebra'}]
+
+    def handler(self, method, path, query, headers):
+        if path == 'login/':
+            return 200, {'access': fake_jwt(300), 'refresh': 'refresh-1'}, None
+        validators = {'ETag': '"v1"', 'Last-Modified': 'Mon, 19 Oct 2026 08:00:00 GMT'}
+        if headers.get('If-None-Match') == '"v1"':
+            return 304, None, validators
+        return 200, self.body, validators
+
+    def test_unchanged_responses_come_from_the_cache(self):
+        client = self.client_for(self.handler, cache_dir=self.cache_dir)
+        self.assertEqual(client.courses.list(), self.body)
+        self.assertEqual(client.courses.list(), self.body)
+        first, second = [call.headers for call in self.adapter.calls if call.path == 'courses/']
+        self.assertNotIn('If-None-Match', first)
+        self.assertEqual(second['If-None-Match'], '"v1"')
+        self.assertEqual(second['If-Modified-Since'], 'Mon, 19 Oct 2026 08:00:00 GMT')
+
+    def test_entries_are_kept_per_identity(self):
+        client = self.client_for(self.handler, cache_dir=self.cache_dir)
+        client.courses.list()
+        client.username = 'teacher'
+        client.courses.list()
+        second = [call.headers for call in self.adapter.calls if call.path == 'courses/'][1]
+        self.assertNotIn('If-None-Match', second)
+
+    def test_responses_without_validators_are_not_cached(self):
+        client = self.client_for(lambda method, path, query, headers: (
+            (200, {'access': fake_jwt(300), 'refresh': 'r'}, None) if path == 'login/' else (200, self.body, None)
+        ), cache_dir=self.cache_dir)
+        client.courses.list()
+        client.courses.list()
+        self.assertTrue(all('If-None-Match' not in call.headers for call in self.adapter.calls))
@@ -21,9 +21,10 @@ django.setup()
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 from apps.Course.models import (
-    User, AcademicLevel, Stream, Subject, Course, 
-    LiveClass, Video, PaymentMethod, PaymentVerification
+    User, AcademicLevel, Stream, Subject, Course, Enrollment,
+    LiveClass, Video, PaymentMethod, PaymentVerification, ArchivedLiveClass, ArchivedPaymentVerification
 )
+from apps.Course.deletion import delete_in_batches
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 from django.core.files.base import ContentFile
@@ -254,15 +255,22 @@ def populate_all():
     
     # Clear existing data (optional - comment out if you want to keep existing data)
     print("🗑️  Clearing existing data...")
-    PaymentVerification.objects.all().delete()
-    Video.objects.all().delete()
-    LiveClass.objects.all().delete()
-    Course.objects.all().delete()
-    PaymentMethod.objects.all().delete()
-    Subject.objects.all().delete()
-    Stream.objects.all().delete()
-    User.objects.filter(is_superuser=False).delete()
-    AcademicLevel.objects.all().delete()
+    # In batches, so the collector never holds a whole table in memory or the write lock for long
+    for queryset in (
+        ArchivedPaymentVerification.objects.all(),
+        ArchivedLiveClass.objects.all(),
+        PaymentVerification.objects.all(),
+        Video.objects.all(),
+        LiveClass.objects.all(),
+        Course.all_objects.all(),
+        PaymentMethod.objects.all(),
+        Subject.objects.all(),
+        Stream.objects.all(),
+        User.objects.filter(is_superuser=False),
+        AcademicLevel.all_objects.all(),
+    ):
+        deleted = delete_in_batches(queryset, pause=0)
+        print(f"   {queryset.model.__name__}: {deleted} deleted")
     print("✓ Existing data cleared\n")
     
     # Track created objects
@@ -553,8 +561,7 @@ def populate_all():
         # 60% chance of being enrolled
         if random.random() < 0.9:
             course = random.choice(courses)
-            student.course = course
-            student.save()
+            Enrollment.objects.create(user=student, course=course)
             enrollment_count += 1
     
     print(f"✓ Enrolled {enrollment_count} students in courses\n")
@@ -832,7 +839,7 @@ def populate_all():
       - Teachers:          {User.objects.filter(role=User.Role.TEACHER).count()}
       - Students:          {User.objects.filter(role=User.Role.STUDENT).count()}
     Courses:               {Course.objects.count()}
-    Enrolled Students:     {User.objects.filter(course__isnull=False).count()}
+    Enrolled Students:     {Enrollment.objects.active().values('user').distinct().count()}
     Live Classes:          {LiveClass.objects.count()}
     Videos:                {Video.objects.count()}
     Payment Methods:       {PaymentMethod.objects.count()}